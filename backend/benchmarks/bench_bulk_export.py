@@ -0,0 +1,126 @@
+"""
+Пропускная способность и память потоковой выгрузки истории (/export/all).
+
+Создаёт временную SQLite-базу со схемой приложения: один пользователь,
+--sessions сессий по --messages сообщений (каждое второе — ответ ассистента
+с diagnoses_json). Затем прогоняет stream_ndjson и stream_zip и, для сравнения,
+«наивный» вариант: все сессии через get_session → json.dumps в памяти.
+Пик памяти Python считается через tracemalloc.
+
+Запуск (из backend/):
+    uv run python benchmarks/bench_bulk_export.py --sessions 1000 --messages 100
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import aiosqlite
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.database import DDL  # noqa: E402
+from src.services import bulk_export  # noqa: E402
+from src.services.history_service import get_session  # noqa: E402
+
+USER_ID = "bench-user"
+DIAGNOSES = [
+    {"rank": i, "diagnosis": f"Диагноз {i}", "icd10_code": f"J0{i}.9",
+     "explanation": "Обоснование диагноза по симптомам пациента. " * 4}
+    for i in range(1, 4)
+]
+
+
+async def build_db(path: str, sessions: int, messages: int) -> None:
+    rnd = random.Random(0)
+    diagnoses_json = json.dumps(DIAGNOSES, ensure_ascii=False)
+    async with aiosqlite.connect(path) as db:
+        await db.executescript(DDL)
+        await db.execute(
+            "INSERT INTO users (id, email, password_hash) VALUES (?, 'bench@example.com', '-')", (USER_ID,)
+        )
+        for s in range(sessions):
+            session_id = f"{s:032x}"
+            await db.execute(
+                "INSERT INTO diagnosis_sessions (id, user_id, title) VALUES (?, ?, ?)",
+                (session_id, USER_ID, f"Сессия {s}"),
+            )
+            await db.executemany(
+                "INSERT INTO chat_messages (id, session_id, role, content, diagnoses_json, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        f"{s:016x}{m:016x}", session_id,
+                        "assistant" if m % 2 else "user",
+                        "Жалобы пациента: боль, температура, слабость. " * rnd.randint(1, 8),
+                        diagnoses_json if m % 2 else None,
+                        f"2026-01-01 00:{m // 60 % 60:02d}:{m % 60:02d}.{m:06d}",
+                    )
+                    for m in range(messages)
+                ],
+            )
+        await db.commit()
+
+
+async def naive_export(db: aiosqlite.Connection) -> bytes:
+    cursor = await db.execute("SELECT id FROM diagnosis_sessions WHERE user_id = ?", (USER_ID,))
+    sessions = [await get_session(db, row["id"], USER_ID) for row in await cursor.fetchall()]
+    return json.dumps([s.model_dump() for s in sessions], ensure_ascii=False).encode("utf-8")
+
+
+async def measure(name: str, db: aiosqlite.Connection, run, rows: int) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    total = await run(db)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<8} {elapsed:>8.2f} {total / 2**20:>10.1f} {rows / elapsed:>10.0f} {peak / 2**20:>12.1f}")
+
+
+def streamed(stream):
+    async def run(db):
+        total = 0
+        async for chunk in stream(db, USER_ID):
+            total += len(chunk)
+        return total
+    return run
+
+
+async def main_async(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bench.db")
+        start = time.perf_counter()
+        await build_db(path, args.sessions, args.messages)
+        print(f"База: {args.sessions} сессий × {args.messages} сообщений, "
+              f"{Path(path).stat().st_size / 2**20:.0f} МБ, построена за {time.perf_counter() - start:.1f} с\n")
+
+        async with aiosqlite.connect(path) as db:
+            db.row_factory = aiosqlite.Row
+            print(f"{'format':<8} {'sec':>8} {'out MB':>10} {'rows/s':>10} {'peak py MB':>12}")
+            rows = args.sessions * args.messages
+            await measure("ndjson", db, streamed(bulk_export.stream_ndjson), rows)
+            await measure("zip", db, streamed(bulk_export.stream_zip), rows)
+            if not args.skip_naive:
+                async def naive(db):
+                    return len(await naive_export(db))
+                await measure("naive", db, naive, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--skip-naive", action="store_true", help="Не запускать выгрузку целиком в памяти")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
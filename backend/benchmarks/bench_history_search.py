@@ -0,0 +1,112 @@
+"""
+Задержка полнотекстового поиска по истории (/history/search, chat_fts)
+на синтетической базе.
+
+Создаёт временную базу через init_db (схема + FTS5 + триггеры), --users
+пользователей с сессиями по 20 сообщений, всего --messages сообщений
+(каждое второе — ответ с diagnoses_json). Затем замеряет search_messages для
+типичных запросов: частые слова, код МКБ, диагноз, несколько слов.
+
+Запуск (из backend/):
+    uv run python benchmarks/bench_history_search.py --messages 1000000 --users 5000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import src.database as database  # noqa: E402
+from src.services.search_service import search_messages  # noqa: E402
+
+MESSAGES_PER_SESSION = 20
+WORDS = (
+    "боль температура кашель слабость тошнота головокружение сыпь одышка озноб "
+    "горло живот спина давление насморк зуд отёк жжение судороги бессонница"
+).split()
+DIAGNOSES = [
+    ("Острый фарингит", "J02.9"), ("Гастрит", "K29.7"), ("Мигрень", "G43.9"),
+    ("Бронхит", "J20.9"), ("Гипертензия", "I10"), ("Крапивница", "L50.9"),
+]
+QUERIES = ["бессонница", "боль", "J02.9", "гастрит", "горло кашель температура", "аппендицит"]
+
+
+async def build_db(messages: int, users: int) -> None:
+    await database.init_db()
+    rnd = random.Random(0)
+    sessions = messages // MESSAGES_PER_SESSION
+    async with aiosqlite.connect(str(database.DB_PATH)) as db:
+        await db.executemany(
+            "INSERT INTO users (id, email, password_hash) VALUES (?, ?, '-')",
+            [(f"user{u:08d}", f"user{u}@example.com") for u in range(users)],
+        )
+        for s in range(sessions):
+            session_id = f"s{s:010d}"
+            await db.execute(
+                "INSERT INTO diagnosis_sessions (id, user_id, title) VALUES (?, ?, ?)",
+                (session_id, f"user{s % users:08d}", " ".join(rnd.sample(WORDS, 3))),
+            )
+            rows = []
+            for m in range(MESSAGES_PER_SESSION):
+                diagnoses = None
+                if m % 2:
+                    name, code = rnd.choice(DIAGNOSES)
+                    diagnoses = json.dumps(
+                        [{"rank": 1, "diagnosis": name, "icd10_code": code, "explanation": "..."}], ensure_ascii=False
+                    )
+                rows.append((f"{session_id}-{m:02d}", session_id, "assistant" if m % 2 else "user",
+                             " ".join(rnd.choices(WORDS, k=12)), diagnoses))
+            await db.executemany(
+                "INSERT INTO chat_messages (id, session_id, role, content, diagnoses_json) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            if s % 1000 == 999:
+                await db.commit()
+        await db.commit()
+        await db.execute("INSERT INTO chat_fts (chat_fts) VALUES ('optimize')")
+        await db.commit()
+
+
+async def main_async(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = Path(tmp) / "app.db"
+        start = time.perf_counter()
+        await build_db(args.messages, args.users)
+        print(f"{args.messages} сообщений, {args.users} пользователей, "
+              f"{database.DB_PATH.stat().st_size / 2**20:.0f} МБ, построено за {time.perf_counter() - start:.0f} с\n")
+
+        rnd = random.Random(1)
+        async with aiosqlite.connect(str(database.DB_PATH)) as db:
+            db.row_factory = aiosqlite.Row
+            print(f"{'query':<28} {'p50 ms':>8} {'p95 ms':>8} {'hits/page':>10}")
+            for query in QUERIES:
+                latencies, hits = [], 0
+                for _ in range(args.repeat):
+                    user_id = f"user{rnd.randrange(args.users):08d}"
+                    start = time.perf_counter()
+                    result = await search_messages(db, user_id, query)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    hits += len(result.items)
+                p95 = statistics.quantiles(latencies, n=20)[-1]
+                print(f"{query:<28} {statistics.median(latencies):>8.2f} {p95:>8.2f} {hits / args.repeat:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Потоковая загрузка (db.py --pipeline, src/ingest_pipeline.py) против
+пошаговой (load_jsonl → encode_and_cache → upload_from_cache): время от
+начала до конца и пиковый RSS процесса.
+
+Каждый режим запускается в отдельном процессе с нуля: своя временная
+коллекция bench_ingest_<режим>, пустой кэш эмбеддингов во временном каталоге,
+модель грузится заново (время загрузки модели входит в замер обоих режимов).
+Коллекции после замера удаляются.
+
+Без --input корпус собирается из текстов data/test_set. Нужны bge-m3 и Qdrant.
+
+Запуск (из backend/, локальный Qdrant из docker-compose.yml):
+    uv run python benchmarks/bench_ingest.py
+    uv run python benchmarks/bench_ingest.py --input protocols.jsonl --modes pipeline
+"""
+
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+MODES = ("steps", "pipeline")
+
+
+def run_mode(mode: str, input_path: str, cache_path: str, url: str, model_name: str, result) -> None:
+    from qdrant_client import QdrantClient
+    from sentence_transformers import SentenceTransformer
+
+    from src.db import create_collection, encode_and_cache, get_device, load_jsonl, upload_from_cache
+    from src.ingest_pipeline import run_pipeline
+
+    start = time.perf_counter()
+    collection = f"bench_ingest_{mode}"
+    client = QdrantClient(url=url)
+    model = SentenceTransformer(model_name, device=get_device())
+    create_collection(client, collection_name=collection, recreate=True)
+    try:
+        if mode == "pipeline":
+            run_pipeline(input_path, model, cache_path, client, collection)
+        else:
+            encode_and_cache(load_jsonl(input_path), model, cache_path)
+            upload_from_cache(client, cache_path, collection)
+        points = client.count(collection_name=collection, exact=True).count
+    finally:
+        client.delete_collection(collection)
+    result.update(
+        seconds=time.perf_counter() - start,
+        peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        points=points,
+    )
+
+
+def build_corpus(dataset_dir: Path, path: Path) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for case_path in sorted(dataset_dir.glob("*.json")):
+            case = json.loads(case_path.read_text(encoding="utf-8"))
+            record = {k: case[k] for k in ("protocol_id", "source_file", "icd_codes", "text") if k in case}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", type=Path, default=None, help="JSONL с протоколами (как для db.py)")
+    parser.add_argument("--dataset-dir", type=Path, default=BACKEND_DIR / "data" / "test_set")
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    # spawn: у каждого режима свой чистый процесс и свой пиковый RSS
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp, context.Manager() as manager:
+        input_path = args.input
+        if input_path is None:
+            input_path = Path(tmp) / "corpus.jsonl"
+            build_corpus(args.dataset_dir, input_path)
+        size_mb = input_path.stat().st_size / 2**20
+        print(f"Корпус: {input_path} ({size_mb:.1f} МБ)\n")
+
+        rows = []
+        for mode in args.modes:
+            result = manager.dict()
+            cache_path = str(Path(tmp) / f"cache_{mode}.jsonl")
+            process = context.Process(
+                target=run_mode, args=(mode, str(input_path), cache_path, args.url, args.model, result)
+            )
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                print(f"{mode}: процесс завершился с кодом {process.exitcode}")
+                continue
+            rows.append((mode, dict(result)))
+
+    print(f"\n{'режим':<10} {'время, с':>9} {'пиковый RSS, МБ':>16} {'точек':>7}")
+    for mode, r in rows:
+        print(f"{mode:<10} {r['seconds']:>9.1f} {r['peak_rss_mb']:>16.0f} {r['points']:>7}")
+
+
+if __name__ == "__main__":
+    main()
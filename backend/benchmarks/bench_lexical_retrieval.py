@@ -0,0 +1,96 @@
+"""
+Лексический retrieval DiagnoserLight (src/lexical_index.py): время открытия
+индекса, RSS процесса, задержка поиска и точность на data/test_set.
+
+Точность — доля запросов, для которых протокол из разметки (protocol_id)
+есть среди top-1 / top-5 найденных чанков. С --heavy то же считается для
+retrieval тяжёлого пайплайна (bge-m3 + Qdrant + реранкер), нужны модели и
+Qdrant. Итоговую точность диагнозов с ЛЛМ меряет evaluate.py по /diagnose.
+
+Запуск (из backend/, после python -m src.db ... --lexical-only):
+    uv run python benchmarks/bench_lexical_retrieval.py
+    uv run python benchmarks/bench_lexical_retrieval.py --heavy
+"""
+
+import argparse
+import json
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.chunk_store import ChunkStore  # noqa: E402
+from src.diagnose_light import TOP_K  # noqa: E402
+from src.lexical_index import LexicalIndex  # noqa: E402
+
+
+def rss_mb() -> float:
+    # Linux: текущий RSS; иначе — пиковый
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_cases(dataset_dir: Path) -> list[dict]:
+    cases = [json.loads(p.read_text()) for p in sorted(dataset_dir.glob("*.json"))]
+    return [c for c in cases if c.get("query")]
+
+
+def evaluate(name: str, retrieve, cases: list[dict]) -> None:
+    latencies, hit1, hit5 = [], 0, 0
+    for case in cases:
+        start = time.perf_counter()
+        chunks = retrieve(case["query"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        protocols = [c.get("protocol_id") for c in chunks]
+        hit1 += protocols[:1] == [case["protocol_id"]]
+        hit5 += case["protocol_id"] in protocols
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    print(f"{name:<10} {statistics.median(latencies):>8.2f} {p95:>8.2f} "
+          f"{hit1 / len(cases):>7.3f} {hit5 / len(cases):>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", type=Path, default=BACKEND_DIR / "lexical_index.bin")
+    parser.add_argument("--chunk-store", type=Path, default=BACKEND_DIR / "chunk_store.bin")
+    parser.add_argument("--dataset-dir", type=Path, default=BACKEND_DIR / "data" / "test_set")
+    parser.add_argument("--heavy", action="store_true", help="Сравнить с retrieval Diagnoser")
+    args = parser.parse_args()
+
+    cases = load_cases(args.dataset_dir)
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    index = LexicalIndex(str(args.index))
+    store = ChunkStore(str(args.chunk_store))
+    opened_ms = (time.perf_counter() - start) * 1000
+    print(f"Индекс: {len(index)} чанков, {args.index.stat().st_size / 2**20:.0f} МБ, "
+          f"открыт за {opened_ms:.1f} мс, RSS +{rss_mb() - rss_before:.1f} МБ")
+
+    def lexical(query: str) -> list[dict]:
+        return [store.payload_at(row) for row, _ in index.search(query, TOP_K)]
+
+    print(f"Запросов: {len(cases)}\n")
+    print(f"{'retrieval':<10} {'p50 ms':>8} {'p95 ms':>8} {'hit@1':>7} {'hit@5':>7}")
+    evaluate("lexical", lexical, cases)
+    print(f"{'':<10} RSS после поиска +{rss_mb() - rss_before:.1f} МБ")
+
+    if args.heavy:
+        from src.diagnose import Diagnoser
+
+        diagnoser = Diagnoser()
+        diagnoser.warmup()
+        evaluate("heavy", diagnoser._retrieve, cases)
+        print(f"{'':<10} RSS с моделями +{rss_mb() - rss_before:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
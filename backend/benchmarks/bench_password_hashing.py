@@ -0,0 +1,96 @@
+"""
+Задержка event loop во время «шторма логинов»: bcrypt прямо в корутине
+(как было в auth_service) против PasswordHasher (пул потоков + admission control).
+
+Параллельно с --logins одновременными проверками пароля работает «тикер»,
+который каждые 10 мс засыпает и замеряет, насколько позже он проснулся.
+Это та задержка, которую в этот момент получают чат, история и остальные
+запросы воркера.
+
+Запуск (из backend/):
+    uv run python benchmarks/bench_password_hashing.py --logins 50 --rounds 12
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.services.errors import ServiceUnavailableError  # noqa: E402
+from src.services.password_service import PasswordHasher, _hash, _verify  # noqa: E402
+
+TICK = 0.01
+PASSWORD = "correct horse battery staple"
+
+
+async def ticker(lags: list[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(TICK)
+        lags.append((loop.time() - start - TICK) * 1000)
+
+
+async def storm(login, logins: int) -> tuple[list[float], float, int]:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(TICK * 3)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+
+    rejected = sum(isinstance(r, ServiceUnavailableError) for r in results)
+    errors = [r for r in results if isinstance(r, Exception) and not isinstance(r, ServiceUnavailableError)]
+    if errors:
+        raise errors[0]
+    return lags, elapsed, rejected
+
+
+def report(name: str, lags: list[float], elapsed: float, logins: int, rejected: int) -> None:
+    lags = sorted(lags) or [0.0]
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+    print(f"{name:<14} {statistics.median(lags):>9.1f} {p99:>9.1f} {lags[-1]:>9.1f} "
+          f"{elapsed:>8.2f} {(logins - rejected) / elapsed:>9.1f} {rejected:>9}")
+
+
+async def main_async(args) -> None:
+    hashed = _hash(PASSWORD, args.rounds)
+    hasher = PasswordHasher(rounds=args.rounds, workers=args.workers, max_queue=args.max_queue)
+
+    async def blocking_login():
+        # Прежний вариант: bcrypt прямо в корутине
+        return _verify(PASSWORD, hashed)
+
+    async def pooled_login():
+        return await hasher.verify(PASSWORD, hashed)
+
+    print(f"bcrypt rounds={args.rounds}, логинов: {args.logins}, "
+          f"пул: {args.workers} потока, очередь: {args.max_queue}\n")
+    print(f"{'mode':<14} {'lag p50':>9} {'lag p99':>9} {'lag max':>9} {'sec':>8} {'logins/s':>9} {'rejected':>9}")
+    lags, elapsed, rejected = await storm(blocking_login, args.logins)
+    report("on event loop", lags, elapsed, args.logins, rejected)
+    lags, elapsed, rejected = await storm(pooled_login, args.logins)
+    report("PasswordHasher", lags, elapsed, args.logins, rejected)
+    hasher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-queue", type=int, default=64)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Сколько байт и времени уходит на payload'ы при поиске: полный with_payload=True
+против «только id + score» и гидрации из локального chunk store.
+
+Запросы идут напрямую в REST API Qdrant (как у QdrantClient), чтобы посчитать
+размер ответа. Время разбора — json-декодирование ответа, для chunk store —
+плюс чтение 30 записей из mmap.
+
+Запуск (из backend/, после python -m src.db ... — нужны кэш, chunk store и коллекция):
+    uv run python benchmarks/bench_payloads.py --queries 200
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.chunk_store import ChunkStore  # noqa: E402
+
+COLLECTION_NAME = "medical_protocols_v5"
+LIMIT = 30
+
+
+def sample_vectors(cache_path: Path, n: int) -> list[list[float]]:
+    with open(cache_path, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    return [json.loads(line)["vector"] for line in random.Random(0).sample(lines, min(n, len(lines)))]
+
+
+def run(client: httpx.Client, url: str, vectors, with_payload: bool, store: ChunkStore | None):
+    sizes, network, decode = [], [], []
+    for vector in vectors:
+        body = {"query": vector, "limit": LIMIT, "with_payload": with_payload}
+        start = time.perf_counter()
+        response = client.post(f"{url}/collections/{COLLECTION_NAME}/points/query", json=body)
+        received = time.perf_counter()
+        points = response.json()["result"]["points"]
+        if store is not None:
+            payloads = [store.get(p["id"]) for p in points]
+            assert all(p is not None for p in payloads), "chunk store не совпадает с коллекцией"
+        done = time.perf_counter()
+
+        sizes.append(len(response.content))
+        network.append((received - start) * 1000)
+        decode.append((done - received) * 1000)
+    return statistics.mean(sizes), statistics.median(network), statistics.median(decode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--cache", type=Path, default=BACKEND_DIR / "points_cache.jsonl")
+    parser.add_argument("--chunk-store", type=Path, default=BACKEND_DIR / "chunk_store.bin")
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    vectors = sample_vectors(args.cache, args.queries)
+    store = ChunkStore(str(args.chunk_store))
+
+    with httpx.Client(timeout=30) as client:
+        full = run(client, args.url, vectors, True, None)
+        slim = run(client, args.url, vectors, False, store)
+
+    print(f"{'mode':<22} {'bytes/request':>14} {'network p50 ms':>15} {'decode p50 ms':>14}")
+    print(f"{'with_payload=True':<22} {full[0]:>14.0f} {full[1]:>15.2f} {full[2]:>14.3f}")
+    print(f"{'ids + chunk store':<22} {slim[0]:>14.0f} {slim[1]:>15.2f} {slim[2]:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
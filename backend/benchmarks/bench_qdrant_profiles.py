@@ -0,0 +1,135 @@
+"""
+Сравнение профилей коллекции Qdrant (src/qdrant_profiles.py): задержка поиска,
+прирост RAM сервера Qdrant и recall@30 относительно точного поиска.
+
+Для каждого профиля создаётся временная коллекция bench_<profile> из кэша
+эмбеддингов (points_cache.jsonl), после индексации замеряются память
+(memory_resident_bytes из /metrics Qdrant) и поиск, затем коллекция удаляется.
+Точный top-30 считается локально перебором (вектора нормированы → косинус = dot).
+
+Запросы — эмбеддинги data/test_set (нужен bge-m3); с --sample-queries N вместо
+них берутся N случайных векторов из кэша.
+
+Запуск (из backend/, локальный Qdrant из docker-compose.yml):
+    uv run python benchmarks/bench_qdrant_profiles.py --cache points_cache.jsonl
+    uv run python benchmarks/bench_qdrant_profiles.py --profiles default int8 --chunk-types clinical
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import CollectionStatus, FieldCondition, Filter, MatchAny
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.db import create_collection, upload_from_cache  # noqa: E402
+from src.qdrant_profiles import COLLECTION_PROFILES, get_profile  # noqa: E402
+
+LIMIT = 30
+
+
+def load_cache(path: Path) -> tuple[list[str], np.ndarray, list[dict]]:
+    ids, vectors, payloads = [], [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                ids.append(row["id"])
+                vectors.append(row["vector"])
+                payloads.append(row["payload"])
+    return ids, np.asarray(vectors, dtype=np.float32), payloads
+
+
+def load_queries(dataset_dir: Path, vectors: np.ndarray, sample: int) -> np.ndarray:
+    if sample:
+        rows = random.Random(0).sample(range(len(vectors)), sample)
+        return vectors[rows]
+    from src.diagnose import get_device, get_embed_model
+
+    model = get_embed_model(get_device())
+    texts = [
+        f"Клинический случай для диагностики по МКБ-10: {json.loads(p.read_text())['query']}"
+        for p in sorted(dataset_dir.glob("*.json"))
+    ]
+    return model.encode(texts, normalize_embeddings=True, prompt_name="query", batch_size=16)
+
+
+def qdrant_memory_mb(url: str) -> float:
+    for line in httpx.get(f"{url}/metrics", timeout=10).text.splitlines():
+        if line.startswith("memory_resident_bytes"):
+            return float(line.split()[-1]) / 2**20
+    return float("nan")
+
+
+def wait_indexed(client: QdrantClient, name: str) -> None:
+    while client.get_collection(name).status != CollectionStatus.GREEN:
+        time.sleep(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--cache", type=Path, default=BACKEND_DIR / "points_cache.jsonl")
+    parser.add_argument("--dataset-dir", type=Path, default=BACKEND_DIR / "data" / "test_set")
+    parser.add_argument("--profiles", nargs="+", default=list(COLLECTION_PROFILES))
+    parser.add_argument("--sample-queries", type=int, default=0)
+    parser.add_argument("--chunk-types", default="", help="Фильтр по chunk_type, например clinical,sliding")
+    args = parser.parse_args()
+
+    ids, vectors, payloads = load_cache(args.cache)
+    queries = load_queries(args.dataset_dir, vectors, args.sample_queries)
+    chunk_types = [t for t in args.chunk_types.split(",") if t]
+    print(f"Точек: {len(ids)}, запросов: {len(queries)}, фильтр: {chunk_types or 'нет'}")
+
+    # Эталон: точный перебор с тем же фильтром
+    allowed = np.array([not chunk_types or p.get("chunk_type") in chunk_types for p in payloads])
+    scores = queries @ vectors.T
+    scores[:, ~allowed] = -np.inf
+    exact = [set(ids[i] for i in np.argsort(-row)[:LIMIT]) for row in scores]
+
+    query_filter = None
+    if chunk_types:
+        query_filter = Filter(must=[FieldCondition(key="chunk_type", match=MatchAny(any=chunk_types))])
+
+    client = QdrantClient(url=args.url, timeout=120)
+    print(f"\n{'profile':<12} {'RAM +MB':>9} {'p50 ms':>8} {'p95 ms':>8} {'recall@30':>10}")
+    for name in args.profiles:
+        collection = f"bench_{name}"
+        mem_before = qdrant_memory_mb(args.url)
+        create_collection(client, name, collection_name=collection, recreate=True)
+        upload_from_cache(client, str(args.cache), collection_name=collection)
+        wait_indexed(client, collection)
+        mem_delta = qdrant_memory_mb(args.url) - mem_before
+
+        search_params = get_profile(name).search_params()
+        latencies, recalls = [], []
+        for q, truth in zip(queries, exact):
+            start = time.perf_counter()
+            points = client.query_points(
+                collection_name=collection,
+                query=q.tolist(),
+                query_filter=query_filter,
+                search_params=search_params,
+                limit=LIMIT,
+                with_payload=False,
+            ).points
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len({str(p.id) for p in points} & truth) / LIMIT)
+
+        client.delete_collection(collection)
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) >= 4 else max(latencies)
+        print(f"{name:<12} {mem_delta:>9.0f} {statistics.median(latencies):>8.2f} {p95:>8.2f} "
+              f"{statistics.mean(recalls):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Транспорт до Qdrant: REST против gRPC у AsyncQdrantClient (QDRANT_ASYNC=1,
+QDRANT_PREFER_GRPC) и для сравнения синхронный REST-клиент в пуле потоков —
+как поиск шёл до async-режима. Для каждого уровня параллельности: p50/p95
+задержки одного поиска и пропускная способность (запросов/с).
+
+Запросы — случайные вектора точек самой коллекции (модель не нужна), поиск
+с теми же параметрами, что у сервиса: top-30, с payload или без (--no-payload,
+как при chunk store). Клиенты создаются один раз и переиспользуют соединения;
+перед замером каждого уровня — прогрев.
+
+Запуск (из backend/, локальный Qdrant из docker-compose.yml, порты 6333 и 6334):
+    uv run python benchmarks/bench_qdrant_transport.py
+    uv run python benchmarks/bench_qdrant_transport.py --concurrency 1 8 32 --queries 2000 --no-payload
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+LIMIT = 30
+MODES = ("sync-rest", "async-rest", "async-grpc")
+
+
+def sample_queries(client: QdrantClient, collection: str, n: int) -> list[list[float]]:
+    points, _ = client.scroll(collection_name=collection, limit=max(n, 1) * 4, with_vectors=True, with_payload=False)
+    if not points:
+        raise SystemExit(f"Коллекция {collection} пуста — сначала загрузите протоколы (db.py)")
+    return [p.vector for p in random.Random(0).choices(points, k=n)]
+
+
+def summarize(latencies: list[float], seconds: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "qps": len(latencies) / seconds,
+    }
+
+
+async def run_async(client: AsyncQdrantClient, collection: str, queries: list, concurrency: int, payload: bool) -> dict:
+    slots = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(vector):
+        async with slots:
+            start = time.perf_counter()
+            await client.query_points(collection_name=collection, query=vector, limit=LIMIT, with_payload=payload)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(v) for v in queries))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_sync(client: QdrantClient, collection: str, queries: list, concurrency: int, payload: bool) -> dict:
+    def one(vector) -> float:
+        start = time.perf_counter()
+        client.query_points(collection_name=collection, query=vector, limit=LIMIT, with_payload=payload)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(one, queries))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def bench(args) -> list[tuple[str, int, dict]]:
+    sync_client = QdrantClient(host=args.host, port=args.port)
+    queries = sample_queries(sync_client, args.collection, args.queries)
+    warmup = queries[: args.warmup]
+    payload = not args.no_payload
+    rows = []
+    for mode in args.modes:
+        if mode == "sync-rest":
+            for concurrency in args.concurrency:
+                run_sync(sync_client, args.collection, warmup, concurrency, payload)
+                result = run_sync(sync_client, args.collection, queries, concurrency, payload)
+                rows.append((mode, concurrency, result))
+            continue
+        client = AsyncQdrantClient(
+            host=args.host, port=args.port, grpc_port=args.grpc_port, prefer_grpc=mode == "async-grpc"
+        )
+        try:
+            for concurrency in args.concurrency:
+                await run_async(client, args.collection, warmup, concurrency, payload)
+                result = await run_async(client, args.collection, queries, concurrency, payload)
+                rows.append((mode, concurrency, result))
+        finally:
+            await client.close()
+    sync_client.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6333)
+    parser.add_argument("--grpc-port", type=int, default=6334)
+    parser.add_argument("--collection", default="medical_protocols_v5")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--queries", type=int, default=1000, help="запросов на каждый уровень")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--no-payload", action="store_true", help="без payload, как при chunk store")
+    args = parser.parse_args()
+
+    rows = asyncio.run(bench(args))
+
+    print(f"\n{'транспорт':<11} {'параллельно':>11} {'p50, мс':>8} {'p95, мс':>8} {'запросов/с':>11}")
+    for mode, concurrency, r in rows:
+        print(f"{mode:<11} {concurrency:>11} {r['p50']:>8.2f} {r['p95']:>8.2f} {r['qps']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
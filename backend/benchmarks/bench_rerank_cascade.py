@@ -0,0 +1,93 @@
+"""
+Каскадный реранкинг (src/rerank_cascade.py) на data/test_set: recall против
+CPU-времени реранкинга на запрос для сетки настроек — отступ адаптивной
+глубины (--margins) × сколько кандидатов оставляет отсев (--keeps, 0 — без
+отсева). Строка margin=0, keep=0 — прежний режим: большой реранкер на всех 30.
+
+Поиск в Qdrant выполняется один раз на запрос, дальше для каждой настройки
+считаются только глубина, отсев и реранкинг. Recall — доля запросов, для
+которых протокол из разметки (protocol_id) есть в топ-1 / топ-5 чанков после
+реранкинга. CPU-время — time.process_time() процесса (все потоки torch),
+поэтому запускать без INFERENCE_SOCKET: в режиме сайдкара модели считают в
+другом процессе. Нужны модели и Qdrant; ЛЛМ не вызывается.
+
+Запуск (из backend/):
+    uv run python benchmarks/bench_rerank_cascade.py
+    uv run python benchmarks/bench_rerank_cascade.py --margins 0 0.05 0.1 --keeps 0 10 --min-depth 8
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.diagnose import SEARCH_LIMIT, TOP_K, Diagnoser, get_pruner  # noqa: E402
+from src.rerank_cascade import MIN_DEPTH, RerankCascade  # noqa: E402
+
+
+def load_cases(dataset_dir: Path, limit: int | None) -> list[dict]:
+    cases = [json.loads(p.read_text()) for p in sorted(dataset_dir.glob("*.json"))]
+    return [c for c in cases if c.get("query")][:limit]
+
+
+def sweep_one(diagnoser: Diagnoser, searched: list[tuple[dict, object, list]]) -> dict:
+    cpu_ms, wall_ms, hit1, hit5 = [], [], 0, 0
+    for case, plan, found in searched:
+        cpu, wall = time.process_time(), time.perf_counter()
+        ranked = diagnoser._rank_found(case["query"], None, plan, found)
+        cpu_ms.append((time.process_time() - cpu) * 1000)
+        wall_ms.append((time.perf_counter() - wall) * 1000)
+        protocols = [payload.get("protocol_id") for payload, _ in ranked[:TOP_K]]
+        hit1 += protocols[:1] == [case["protocol_id"]]
+        hit5 += case["protocol_id"] in protocols
+    return {
+        "cpu_ms": statistics.mean(cpu_ms),
+        "wall_p50": statistics.median(wall_ms),
+        "hit1": hit1 / len(searched),
+        "hit5": hit5 / len(searched),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", type=Path, default=BACKEND_DIR / "data" / "test_set")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--margins", nargs="+", type=float, default=[0, 0.03, 0.06, 0.1])
+    parser.add_argument("--keeps", nargs="+", type=int, default=[0, 15, 10, 5])
+    parser.add_argument("--min-depth", type=int, default=MIN_DEPTH)
+    args = parser.parse_args()
+
+    cases = load_cases(args.dataset_dir, args.limit)
+    diagnoser = Diagnoser()
+    diagnoser.warmup()
+    pruner = get_pruner(diagnoser.device) if any(args.keeps) else None
+    if pruner is not None:
+        pruner.predict([["прогрев", "прогрев"]])
+
+    searched = []
+    for case in cases:
+        plan = diagnoser._plan_search(case["query"])
+        searched.append((case, plan, diagnoser._search(plan.query_vector, SEARCH_LIMIT)))
+    print(f"Запросов: {len(searched)}, кандидатов из Qdrant: {SEARCH_LIMIT}\n")
+
+    print(f"{'margin':>6} {'keep':>5} {'глубина':>8} {'большим':>8} {'CPU мс':>8} {'p50 мс':>7} "
+          f"{'hit@1':>6} {'hit@5':>6}")
+    for margin in args.margins:
+        for keep in args.keeps:
+            cascade = RerankCascade(
+                diagnoser.reranker, pruner if keep else None, keep=keep, depth_margin=margin, min_depth=args.min_depth
+            )
+            diagnoser.cascade = cascade
+            r = sweep_one(diagnoser, searched)
+            m = cascade.metrics()
+            print(f"{margin:>6.2f} {keep:>5} {m['avg_candidates']:>8.1f} {m['avg_reranked']:>8.1f} "
+                  f"{r['cpu_ms']:>8.0f} {r['wall_p50']:>7.0f} {r['hit1']:>6.3f} {r['hit5']:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
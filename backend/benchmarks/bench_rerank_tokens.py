@@ -0,0 +1,93 @@
+"""
+Токенизация пар для реранкера на запрос: как в CrossEncoder.predict (все пары
+[запрос, документ] токенизируются целиком) против готовых token ids
+документов из rerank_tokens.bin (src/rerank_tokens.py), где токенизируется
+только запрос.
+
+Запросы — data/test_set. Кандидатов на запрос (--candidates, как SEARCH_LIMIT)
+берётся из chunk store случайно: время токенизации зависит от длины
+документов, а не от их релевантности. Заодно проверяется, что входы модели
+(input_ids, attention_mask) совпадают до токена. Расхождения выводятся, код
+выхода при них — 1. Токенизатор и max_length берутся из заголовка файла
+токенов. Нужны только токенизатор и файлы db.py, без модели и Qdrant.
+
+Запуск (из backend/, после python -m src.db ...):
+    uv run python benchmarks/bench_rerank_tokens.py
+    uv run python benchmarks/bench_rerank_tokens.py --candidates 10 --limit 100
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+from transformers import AutoTokenizer
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.chunk_store import ChunkStore  # noqa: E402
+from src.rerank_tokens import PretokenizedReranker, RerankTokens, rerank_document  # noqa: E402
+
+
+def load_queries(dataset_dir: Path, limit: int | None) -> list[str]:
+    cases = [json.loads(p.read_text()) for p in sorted(dataset_dir.glob("*.json"))]
+    return [c["query"] for c in cases if c.get("query")][:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", type=Path, default=BACKEND_DIR / "data" / "test_set")
+    parser.add_argument("--chunk-store", default=str(BACKEND_DIR / "chunk_store.bin"))
+    parser.add_argument("--rerank-tokens", default=str(BACKEND_DIR / "rerank_tokens.bin"))
+    parser.add_argument("--candidates", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    store = ChunkStore(args.chunk_store)
+    tokens = RerankTokens(args.rerank_tokens)
+    tokenizer = AutoTokenizer.from_pretrained(tokens.tokenizer)
+    reranker = PretokenizedReranker(SimpleNamespace(tokenizer=tokenizer, max_length=tokens.max_length), tokens)
+    queries = load_queries(args.dataset_dir, args.limit)
+    print(f"Запросов: {len(queries)}, кандидатов на запрос: {args.candidates}, "
+          f"токенизатор {tokens.tokenizer}, max_length {tokens.max_length}")
+
+    rng = random.Random(0)
+    before_ms, after_ms, mismatches = [], [], 0
+    for query in queries:
+        rows = rng.sample(range(len(store)), min(args.candidates, len(store)))
+        point_ids = [str(uuid.UUID(bytes=bytes(store._id_bytes[row * 16:(row + 1) * 16]))) for row in rows]
+        docs = [rerank_document(store.payload_at(row)) for row in rows]
+
+        start = time.perf_counter()
+        expected = tokenizer(
+            [[query, doc] for doc in docs],
+            padding=True, truncation=True, max_length=tokens.max_length, return_tensors="np",
+        )
+        before_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        features = reranker.encode(query, list(zip(point_ids, docs)))
+        after_ms.append((time.perf_counter() - start) * 1000)
+
+        if any(not np.array_equal(expected[name], features[name]) for name in ("input_ids", "attention_mask")):
+            mismatches += 1
+            print(f"  расхождение: {query[:60]}...")
+
+    print(f"Совпадение входов модели: {len(queries) - mismatches}/{len(queries)}, "
+          f"токенизировано на лету: {reranker.missing}\n")
+    print(f"{'токенизация':<16} {'p50 мс':>7} {'p95 мс':>7} {'mean мс':>8}")
+    for label, latencies in (("все пары", before_ms), ("только запрос", after_ms)):
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        print(f"{label:<16} {statistics.median(latencies):>7.2f} {p95:>7.2f} {statistics.mean(latencies):>8.2f}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Однопроходный разбор секций (src/protocol_sections.py) против прежних
+регулярок db.py: совпадение результата и пропускная способность (МБ/с).
+
+Чанки build_chunks целиком задаются названием протокола и текстами секций,
+поэтому совпадение проверяется по ним. Прежняя реализация скопирована сюда
+как эталон. Расхождения выводятся, код выхода при них — 1.
+
+Тексты — data/test_set; с --input ещё весь корпус протоколов (JSONL, как
+для db.py). В текстах data/test_set нет переводов строк, строк-заголовков в
+них нет, и концы секций задают только ключевые слова; разбор по заголовкам
+проверяет корпус.
+
+Запуск (из backend/):
+    uv run python benchmarks/bench_section_parser.py
+    uv run python benchmarks/bench_section_parser.py --input protocols.jsonl
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.protocol_sections import (  # noqa: E402
+    MAX_CHARS_PER_SECTION,
+    SECTION_KEYS,
+    parse_protocol,
+    section_text,
+)
+
+# ─── Прежняя реализация (db.py до однопроходного разбора) ────────────────────
+
+_SECTION_PATTERNS = {
+    "symptoms": re.compile(
+        r"(?:жалоб[ыи]|ЖАЛОБ[ЫИ]|клинические\s+критерии|КЛИНИЧЕСКИЕ\s+КРИТЕРИИ"
+        r"|критерии\s+диагностики|КРИТЕРИИ\s+ДИАГНОСТИКИ"
+        r"|клиническая\s+картина|КЛИНИЧЕСКАЯ\s+КАРТИНА)(.*?)"
+        r"(?=\n\s*\d+\.\d+\s|\nI{1,3}V?\b|\nVII?\b|\Z)",
+        re.IGNORECASE | re.DOTALL,
+    ),
+    "diagnosis": re.compile(
+        r"(?:диагностик[аи]|ДИАГНОСТИК[АИ]|лабораторн|ЛАБОРАТОРН"
+        r"|инструментальн|ИНСТРУМЕНТАЛЬН)(.*?)"
+        r"(?=\nI{1,3}V?\b|\nVII?\b|лечение|ЛЕЧЕНИЕ|\Z)",
+        re.IGNORECASE | re.DOTALL,
+    ),
+    "treatment": re.compile(
+        r"(?:лечение|ЛЕЧЕНИЕ|медикаментозн|МЕДИКАМЕНТОЗН"
+        r"|хирургическ|ХИРУРГИЧЕСК)(.*?)"
+        r"(?=\nV{1,3}\b|\nVII?\b|профилактика|ПРОФИЛАКТИКА|\Z)",
+        re.IGNORECASE | re.DOTALL,
+    ),
+}
+_NAME_PATTERN = re.compile(r"КЛИНИЧЕСКИЙ ПРОТОКОЛ ДИАГНОСТИКИ И ЛЕЧЕНИЯ\s+([^\n]{5,150})", re.IGNORECASE)
+
+
+def legacy_parse(text: str) -> tuple[str | None, dict[str, str]]:
+    m = _NAME_PATTERN.search(text)
+    name = m.group(1).strip() if m else None
+    sections = {}
+    for key, pat in _SECTION_PATTERNS.items():
+        m = pat.search(text)
+        if m:
+            sections[key] = m.group(1).strip()[:MAX_CHARS_PER_SECTION]
+    return name, sections
+
+
+def single_pass_parse(text: str) -> tuple[str | None, dict[str, str]]:
+    layout = parse_protocol(text)
+    return layout.name, {key: section_text(text, start, end) for key, start, end in layout.spans()}
+
+
+# ─── Замер ───────────────────────────────────────────────────────────────────
+
+def load_texts(dataset_dir: Path, input_path: Path | None) -> list[tuple[str, str]]:
+    texts = []
+    for path in sorted(dataset_dir.glob("*.json")):
+        case = json.loads(path.read_text(encoding="utf-8"))
+        texts.append((path.name, case.get("text", "")))
+    if input_path is not None:
+        with open(input_path, encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if line.strip():
+                    record = json.loads(line)
+                    texts.append((record.get("protocol_id") or f"{input_path.name}:{i}", record.get("text", "")))
+    return [(name, text) for name, text in texts if text]
+
+
+def throughput(parse, texts: list[str], repeat: int) -> tuple[float, float]:
+    """(МБ/с, мс на самый длинный текст)."""
+    size_mb = sum(len(t.encode("utf-8")) for t in texts) / 2**20
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            parse(text)
+    mb_per_s = size_mb * repeat / (time.perf_counter() - start)
+
+    longest = max(texts, key=len)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(longest)
+    return mb_per_s, (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", type=Path, default=BACKEND_DIR / "data" / "test_set")
+    parser.add_argument("--input", type=Path, default=None, help="JSONL с протоколами (как для db.py)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    named = load_texts(args.dataset_dir, args.input)
+    texts = [text for _, text in named]
+    size_mb = sum(len(t.encode("utf-8")) for t in texts) / 2**20
+    print(f"Протоколов: {len(texts)}, {size_mb:.1f} МБ, самый длинный {max(map(len, texts)) / 1000:.0f} тыс. символов")
+
+    mismatches = 0
+    for name, text in named:
+        old, new = legacy_parse(text), single_pass_parse(text)
+        if old != new:
+            mismatches += 1
+            fields = ["name"] * (old[0] != new[0]) + [k for k in SECTION_KEYS if old[1].get(k) != new[1].get(k)]
+            print(f"  расхождение: {name} ({', '.join(fields)})")
+    print(f"Совпадение с прежними регулярками: {len(named) - mismatches}/{len(named)}\n")
+
+    print(f"{'разбор':<12} {'МБ/с':>7} {'самый длинный, мс':>18}")
+    for label, parse in (("regex x4", legacy_parse), ("single-pass", single_pass_parse)):
+        mb_per_s, longest_ms = throughput(parse, texts, args.repeat)
+        print(f"{label:<12} {mb_per_s:>7.1f} {longest_ms:>18.2f}")
+
+    headings = [len(parse_protocol(t).outline()) for t in texts]
+    print(f"\nРимских разделов в оглавлении: в среднем {sum(headings) / len(headings):.1f}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
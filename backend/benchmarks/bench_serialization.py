@@ -0,0 +1,139 @@
+"""
+Сериализация /history/{id} и /chat/{id}/messages: быстрый путь (готовые байты,
+diagnoses_json как есть, orjson при наличии, gzip от порога) против прежнего
+(Pydantic-модели на каждую строку + повторная валидация через response_model).
+
+Прежний путь воспроизводится здесь же отдельными маршрутами /legacy/... поверх
+get_session/get_messages. Запросы идут через TestClient, база — временная
+SQLite с одной сессией на --messages сообщений.
+
+Запуск (из backend/):
+    uv run python benchmarks/bench_serialization.py --messages 200 500 --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src import fastjson  # noqa: E402
+from src.api.deps import get_current_user  # noqa: E402
+from src.api.endpoints import chat, history  # noqa: E402
+from src.database import DDL, get_db  # noqa: E402
+from src.schemas.chat import ChatMessage  # noqa: E402
+from src.schemas.history import SessionDetail  # noqa: E402
+from src.services.chat_service import get_messages  # noqa: E402
+from src.services.history_service import get_session  # noqa: E402
+
+USER_ID = "bench-user"
+SESSION_ID = "bench-session"
+DIAGNOSES = json.dumps([
+    {"rank": i, "diagnosis": f"Диагноз {i}", "icd10_code": f"J0{i}.9",
+     "explanation": "Обоснование диагноза по симптомам пациента. " * 4}
+    for i in range(1, 4)
+], ensure_ascii=False)
+
+
+async def build_db(path: str, messages: int) -> None:
+    async with aiosqlite.connect(path) as db:
+        await db.executescript(DDL)
+        await db.execute("INSERT INTO users (id, email, password_hash) VALUES (?, 'b@example.com', '-')", (USER_ID,))
+        await db.execute(
+            "INSERT INTO diagnosis_sessions (id, user_id, title) VALUES (?, ?, 'Бенчмарк')", (SESSION_ID, USER_ID)
+        )
+        await db.executemany(
+            "INSERT INTO chat_messages (id, session_id, role, content, diagnoses_json, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    f"m{m:06d}", SESSION_ID, "assistant" if m % 2 else "user",
+                    "Жалобы пациента: боль в горле, температура 38, слабость. " * 3,
+                    DIAGNOSES if m % 2 else None, f"2026-01-01 00:00:00.{m:06d}",
+                )
+                for m in range(messages)
+            ],
+        )
+        await db.commit()
+
+
+def make_app(db_path: str) -> FastAPI:
+    app = FastAPI()
+    app.include_router(history.router)
+    app.include_router(chat.router)
+
+    @app.get("/legacy/history/{session_id}", response_model=SessionDetail)
+    async def legacy_history(session_id: str, db: aiosqlite.Connection = Depends(get_db)):
+        return await get_session(db, session_id, USER_ID)
+
+    @app.get("/legacy/chat/{session_id}/messages", response_model=list[ChatMessage])
+    async def legacy_messages(session_id: str, db: aiosqlite.Connection = Depends(get_db)):
+        return await get_messages(db, session_id)
+
+    async def override_db():
+        db = await aiosqlite.connect(db_path)
+        db.row_factory = aiosqlite.Row
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user] = lambda: USER_ID
+    return app
+
+
+def measure(client: TestClient, url: str, requests: int, gzip: bool) -> tuple[float, float, int]:
+    headers = {"Accept-Encoding": "gzip" if gzip else "identity"}
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    wire = int(response.headers.get("content-length", len(response.content)))
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    return statistics.median(latencies), p95, wire
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # httpx логирует каждый запрос TestClient
+
+    print(f"JSON: {'orjson' if fastjson.orjson else 'stdlib json'}\n")
+    print(f"{'messages':>8} {'endpoint':<30} {'p50 ms':>8} {'p95 ms':>8} {'bytes':>10}")
+    for n in args.messages:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = str(Path(tmp) / "bench.db")
+            asyncio.run(build_db(db_path, n))
+            with TestClient(make_app(db_path)) as client:
+                cases = [
+                    ("legacy /history/{id}", f"/legacy/history/{SESSION_ID}", False),
+                    ("/history/{id}", f"/history/{SESSION_ID}", False),
+                    ("/history/{id} gzip", f"/history/{SESSION_ID}", True),
+                    ("legacy /chat/{id}/messages", f"/legacy/chat/{SESSION_ID}/messages", False),
+                    ("/chat/{id}/messages", f"/chat/{SESSION_ID}/messages", False),
+                    ("/chat/{id}/messages gzip", f"/chat/{SESSION_ID}/messages", True),
+                ]
+                for name, url, gzip in cases:
+                    p50, p95, wire = measure(client, url, args.requests, gzip)
+                    print(f"{n:>8} {name:<30} {p50:>8.2f} {p95:>8.2f} {wire:>10}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
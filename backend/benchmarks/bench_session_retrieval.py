@@ -0,0 +1,89 @@
+"""
+Уточнения в чат-сессии: retrieval с пулом кандидатов сессии
+(src/retrieval_cache.py) против полного поиска на каждое сообщение.
+
+Диалоги собираются из data/test_set: запрос делится на предложения, первые
+--first предложений — первое сообщение сессии, каждое следующее —
+уточнение. Для каждого уточнения замеряется _retrieve без сессии (полный
+поиск на 30 кандидатов + реранкинг) и с сессией (FOLLOWUP_SEARCH_LIMIT свежих
++ пул). Также считается, сколько из итоговых TOP_K чанков совпадает. ЛЛМ не
+вызывается.
+
+Нужны модели и Qdrant с коллекцией (как для самого сервиса).
+
+Запуск (из backend/):
+    uv run python benchmarks/bench_session_retrieval.py --limit 50
+"""
+
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.diagnose import TOP_K, Diagnoser  # noqa: E402
+
+_SENTENCE = re.compile(r"(?<=[.!?;])\s+")
+
+
+def load_dialogs(dataset_dir: Path, first: int, limit: int) -> list[list[str]]:
+    dialogs = []
+    for path in sorted(dataset_dir.glob("*.json")):
+        sentences = [s for s in _SENTENCE.split(json.loads(path.read_text())["query"]) if s.strip()]
+        if len(sentences) > first:
+            dialogs.append([" ".join(sentences[:first]), *sentences[first:]])
+        if len(dialogs) == limit:
+            break
+    return dialogs
+
+
+def chunk_keys(chunks: list[dict]) -> set[tuple]:
+    return {(c.get("protocol_id"), c.get("chunk_index")) for c in chunks}
+
+
+def percentiles(values: list[float]) -> str:
+    p95 = statistics.quantiles(values, n=20)[-1] if len(values) >= 4 else max(values)
+    return f"{statistics.median(values) * 1000:>8.1f} {p95 * 1000:>8.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", type=Path, default=BACKEND_DIR / "data" / "test_set")
+    parser.add_argument("--first", type=int, default=2, help="Предложений в первом сообщении")
+    parser.add_argument("--limit", type=int, default=50, help="Сколько диалогов")
+    args = parser.parse_args()
+
+    dialogs = load_dialogs(args.dataset_dir, args.first, args.limit)
+    diagnoser = Diagnoser()
+    diagnoser.warmup()
+
+    full, followup, agreement = [], [], []
+    for n, (opening, *messages) in enumerate(dialogs):
+        session_id = f"bench-{n}"
+        diagnoser._retrieve(opening, session_id)
+        for message in messages:
+            start = time.perf_counter()
+            baseline = diagnoser._retrieve(message)
+            full.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            reused = diagnoser._retrieve(message, session_id)
+            followup.append(time.perf_counter() - start)
+
+            agreement.append(len(chunk_keys(baseline) & chunk_keys(reused)) / TOP_K)
+
+    print(f"Диалогов: {len(dialogs)}, уточнений: {len(full)}\n")
+    print(f"{'retrieval':<12} {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{'full':<12} {percentiles(full)}")
+    print(f"{'session':<12} {percentiles(followup)}")
+    print(f"\nСовпадение top-{TOP_K} с полным поиском: {statistics.mean(agreement):.3f}")
+    print(json.dumps(diagnoser.session_cache.metrics(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Спекулятивный вызов ЛЛМ (src/speculative_llm.py) на data/test_set: доля
+попаданий, лишние вызовы ЛЛМ и сквозная задержка diagnose() без спекуляции
+и с ней.
+
+Быстрый путь на время замера выключен, чтобы каждый запрос доходил до ЛЛМ
+(--with-fast-path — оставить). Accuracy@1 — как в evaluate.py: код первого
+диагноза равен коду из разметки; при попадании спекуляции ЛЛМ видела чанки в
+плотном, а не реранжированном порядке, и точность может сдвинуться.
+
+С --dry-run ЛЛМ не вызывается: для нескольких порогов совпадения считается,
+какая доля запросов попала бы, и сколько длится реранкинг — верхняя граница
+выигрыша на попадании. Нужны модели и Qdrant.
+
+Запуск (из backend/):
+    uv run python benchmarks/bench_speculative_llm.py --dry-run
+    uv run python benchmarks/bench_speculative_llm.py --limit 50
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.diagnose import TOP_K, Diagnoser  # noqa: E402
+from src.speculative_llm import SpeculativeLLM, topk_overlap  # noqa: E402
+
+DRY_RUN_THRESHOLDS = (1.0, 0.8, 0.6)
+
+
+def load_cases(dataset_dir: Path, limit: int | None) -> list[dict]:
+    cases = [json.loads(p.read_text()) for p in sorted(dataset_dir.glob("*.json"))]
+    return [c for c in cases if c.get("query")][:limit]
+
+
+def percentiles(latencies: list[float]) -> tuple[float, float]:
+    return statistics.median(latencies), statistics.quantiles(latencies, n=20)[-1]
+
+
+def dry_run(diagnoser: Diagnoser, cases: list[dict]) -> None:
+    overlaps, rerank_ms = [], []
+    for case in cases:
+        captured = {}
+
+        def capture(dense_top: list[dict]) -> None:
+            captured["dense"] = dense_top
+            captured["at"] = time.perf_counter()
+
+        ranked = diagnoser._retrieve_scored(case["query"], on_candidates=capture)
+        rerank_ms.append((time.perf_counter() - captured["at"]) * 1000)
+        overlaps.append(topk_overlap(captured["dense"], [p for p, _ in ranked[:TOP_K]]))
+
+    p50, p95 = percentiles(rerank_ms)
+    print(f"Реранкинг после плотного поиска: p50 {p50:.0f} мс, p95 {p95:.0f} мс\n")
+    print(f"{'min_overlap':>11} {'hit rate':>9}")
+    for threshold in DRY_RUN_THRESHOLDS:
+        hits = sum(o >= threshold for o in overlaps)
+        print(f"{threshold:>11.1f} {hits / len(overlaps):>9.3f}")
+
+
+def run(diagnoser: Diagnoser, cases: list[dict], name: str) -> list[float]:
+    latencies, correct, errors = [], 0, 0
+    for case in cases:
+        start = time.perf_counter()
+        try:
+            result = diagnoser.diagnose(case["query"])
+        except Exception:
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        diagnoses = result.get("diagnoses") or [{}]
+        correct += diagnoses[0].get("icd10_code") == case["gt"]
+    p50, p95 = percentiles(latencies)
+    print(f"{name:<12} {p50:>8.0f} {p95:>8.0f} {statistics.mean(latencies):>8.0f} "
+          f"{correct / len(cases):>6.3f} {errors:>6}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", type=Path, default=BACKEND_DIR / "data" / "test_set")
+    parser.add_argument("--limit", type=int, default=None, help="Сколько запросов взять (ЛЛМ платная)")
+    parser.add_argument("--min-overlap", type=float, default=None, help="Порог совпадения топ-K")
+    parser.add_argument("--dry-run", action="store_true", help="Без ЛЛМ: только доля попаданий")
+    parser.add_argument("--with-fast-path", action="store_true")
+    args = parser.parse_args()
+
+    cases = load_cases(args.dataset_dir, args.limit)
+    diagnoser = Diagnoser()
+    diagnoser.warmup()
+    if not args.with_fast_path:
+        diagnoser.fast_path = None
+    print(f"Запросов: {len(cases)}")
+
+    if args.dry_run:
+        dry_run(diagnoser, cases)
+        return
+
+    print(f"\n{'режим':<12} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'acc@1':>6} {'errors':>6}")
+    diagnoser.speculative = SpeculativeLLM(enabled=False)
+    baseline = run(diagnoser, cases, "sequential")
+
+    speculative = SpeculativeLLM(enabled=True)
+    if args.min_overlap is not None:
+        speculative.min_overlap = args.min_overlap
+    diagnoser.speculative = speculative
+    latencies = run(diagnoser, cases, "speculative")
+
+    m = speculative.metrics()
+    print(f"\nПорог совпадения: {m['min_overlap']}")
+    print(f"Попаданий: {m['hits']} из {m['hits'] + m['misses']} (hit rate {m['hit_rate']}), "
+          f"ошибок спекуляции: {m['failed']}")
+    print(f"Лишних вызовов ЛЛМ: {m['wasted_llm_calls']}, отменено до старта: {m['cancelled']}")
+    print(f"Выигрыш: p50 {statistics.median(baseline) - statistics.median(latencies):+.0f} мс, "
+          f"mean {statistics.mean(baseline) - statistics.mean(latencies):+.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
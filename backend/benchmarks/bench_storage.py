@@ -0,0 +1,153 @@
+"""
+Размер базы и задержка «горячих» запросов до и после обслуживания
+(src/services/maintenance.py): архив старых сессий, очистка производного
+content ответов, incremental vacuum и checkpoint WAL.
+
+Синтетическая база в старом формате: --sessions сессий по --messages
+сообщений, ответы ассистента хранят и content, и diagnoses_json, updated_at
+равномерно за последний год. Горячие запросы — то, что делает UI: список
+сессий пользователя и сообщения недавней сессии; отдельно — чтение
+архивированной сессии.
+
+Запуск (из backend/):
+    uv run python benchmarks/bench_storage.py --sessions 20000 --messages 20 --archive-after-days 90
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import src.database as database  # noqa: E402
+from src.services.chat_service import get_messages_json  # noqa: E402
+from src.services.history_service import list_sessions  # noqa: E402
+from src.services.maintenance import db_size, run_maintenance  # noqa: E402
+from src.services.message_store import format_diagnoses  # noqa: E402
+
+USERS = 500
+EXPLANATION = "Симптомы пациента (боль в горле, температура 38, слабость) соответствуют клинической картине. "
+
+
+async def build_db(sessions: int, messages: int) -> None:
+    await database.init_db()
+    rnd = random.Random(0)
+    async with aiosqlite.connect(str(database.DB_PATH)) as db:
+        await db.executemany(
+            "INSERT INTO users (id, email, password_hash) VALUES (?, ?, '-')",
+            [(f"user{u:05d}", f"user{u}@example.com") for u in range(USERS)],
+        )
+        for s in range(sessions):
+            session_id = f"s{s:08d}"
+            age = f"-{rnd.randrange(365)} days"
+            await db.execute(
+                "INSERT INTO diagnosis_sessions (id, user_id, title, created_at, updated_at) "
+                "VALUES (?, ?, ?, datetime('now', ?), datetime('now', ?))",
+                (session_id, f"user{s % USERS:05d}", "Боль в горле и температура", age, age),
+            )
+            rows = []
+            for m in range(messages):
+                if m % 2:
+                    diagnoses = [
+                        {"rank": i, "diagnosis": f"Диагноз {i}", "icd10_code": f"J0{i}.9",
+                         "explanation": EXPLANATION * rnd.randint(1, 3)}
+                        for i in range(1, 4)
+                    ]
+                    # Старый формат: текст ответа хранится рядом с diagnoses_json
+                    rows.append((f"{session_id}-{m:03d}", session_id, "assistant", format_diagnoses(diagnoses),
+                                 json.dumps(diagnoses, ensure_ascii=False)))
+                else:
+                    rows.append((f"{session_id}-{m:03d}", session_id, "user",
+                                 "Жалобы: боль в горле, температура, слабость третий день.", None))
+            await db.executemany(
+                "INSERT INTO chat_messages (id, session_id, role, content, diagnoses_json) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            if s % 500 == 499:
+                await db.commit()
+        await db.commit()
+        await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+async def sessions_by_age(archive_after_days: int) -> tuple[list[tuple[str, str]], list[str]]:
+    async with aiosqlite.connect(str(database.DB_PATH)) as db:
+        cursor = await db.execute(
+            "SELECT id, user_id FROM diagnosis_sessions WHERE updated_at >= datetime('now', '-30 days')"
+        )
+        recent = [tuple(row) for row in await cursor.fetchall()]
+        cursor = await db.execute(
+            "SELECT id FROM diagnosis_sessions WHERE updated_at < datetime('now', ?)", (f"-{archive_after_days} days",)
+        )
+        old = [row[0] for row in await cursor.fetchall()]
+    return recent, old
+
+
+async def hot_queries(recent, old, repeat: int) -> dict[str, tuple[float, float]]:
+    rnd = random.Random(1)
+    timings: dict[str, list[float]] = {"list_sessions": [], "recent messages": [], "old messages": []}
+    async with aiosqlite.connect(str(database.DB_PATH)) as db:
+        db.row_factory = aiosqlite.Row
+        for _ in range(repeat):
+            session_id, user_id = rnd.choice(recent)
+            start = time.perf_counter()
+            await list_sessions(db, user_id)
+            timings["list_sessions"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await get_messages_json(db, session_id)
+            timings["recent messages"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await get_messages_json(db, rnd.choice(old))
+            timings["old messages"].append(time.perf_counter() - start)
+    return {
+        name: (statistics.median(values) * 1000, statistics.quantiles(values, n=20)[-1] * 1000)
+        for name, values in timings.items()
+    }
+
+
+def print_state(label: str, timings: dict) -> None:
+    size = db_size(database.DB_PATH)
+    print(f"\n{label}: база {size['db_bytes'] / 2**20:.1f} МБ, WAL {size['wal_bytes'] / 2**20:.1f} МБ")
+    print(f"  {'query':<18} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, (p50, p95) in timings.items():
+        print(f"  {name:<18} {p50:>8.2f} {p95:>8.2f}")
+
+
+async def main_async(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = Path(tmp) / "app.db"
+        start = time.perf_counter()
+        await build_db(args.sessions, args.messages)
+        print(f"{args.sessions} сессий × {args.messages} сообщений, построено за {time.perf_counter() - start:.0f} с")
+
+        recent, old = await sessions_by_age(args.archive_after_days)
+        print_state("До обслуживания", await hot_queries(recent, old, args.repeat))
+
+        report = await asyncio.to_thread(run_maintenance, database.DB_PATH, args.archive_after_days)
+        print(f"\nОбслуживание за {report['seconds']} с: архивировано {report['archived_sessions']} сессий "
+              f"({report['archived_messages']} сообщений), очищен content у {report['compacted_messages']}, "
+              f"освобождено {report['vacuumed_pages']} страниц")
+
+        print_state("После обслуживания", await hot_queries(recent, old, args.repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20_000)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--archive-after-days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=200)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
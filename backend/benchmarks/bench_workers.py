@@ -0,0 +1,153 @@
+"""
+Память и пропускная способность в зависимости от числа воркеров для трёх
+режимов развёртывания:
+
+    per-process  uvicorn --workers N, каждый воркер грузит свои веса (как раньше)
+    preload      python -m src.serve_preload --workers N (общие веса copy-on-write)
+    sidecar      python -m src.inference_server + uvicorn --workers N с INFERENCE_SOCKET
+
+Для каждого воркера печатаются RSS и PSS (/proc/<pid>/smaps_rollup): RSS считает
+общие страницы в каждом процессе, PSS делит их поровну — именно PSS показывает
+реальную экономию. Пропускная способность меряется запросами к /diagnose
+с текстами из data/test_set.
+
+Запуск (из backend/, нужен Qdrant и ключ ЛЛМ):
+    uv run python benchmarks/bench_workers.py --workers 1 2 4 8 --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from src.inference_server import default_socket  # noqa: E402
+
+SIDECAR_SOCKET = str(Path(default_socket()).with_name("bench-inference.sock"))
+
+
+def _children(pid: int) -> list[int]:
+    result = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        children = (task / "children").read_text().split()
+        for child in map(int, children):
+            result.append(child)
+            result.extend(_children(child))
+    return result
+
+
+def _memory_kb(pid: int) -> tuple[int, int]:
+    rss = pss = 0
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        if line.startswith("Rss:"):
+            rss = int(line.split()[1])
+        elif line.startswith("Pss:"):
+            pss = int(line.split()[1])
+    return rss, pss
+
+
+def _start(mode: str, workers: int, port: int) -> list[subprocess.Popen]:
+    env = dict(os.environ)
+    procs = []
+    if mode == "sidecar":
+        env["INFERENCE_SOCKET"] = SIDECAR_SOCKET
+        env.setdefault("INFERENCE_AUTHKEY", secrets.token_hex(32))
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "src.inference_server", "--socket", SIDECAR_SOCKET],
+            cwd=BACKEND_DIR, env=env,
+        ))
+        while not os.path.exists(SIDECAR_SOCKET):
+            time.sleep(0.5)
+    if mode == "preload":
+        cmd = [sys.executable, "-m", "src.serve_preload", "--workers", str(workers),
+               "--port", str(port), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    procs.append(subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env))
+    return procs
+
+
+def _stop(procs: list[subprocess.Popen]) -> None:
+    for p in reversed(procs):
+        p.send_signal(signal.SIGTERM)
+        try:
+            p.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            p.kill()
+    if os.path.exists(SIDECAR_SOCKET):
+        os.unlink(SIDECAR_SOCKET)
+
+
+async def _wait_ready(base_url: str, workers: int) -> None:
+    # /ready отвечает тот воркер, которому достался запрос — ждём, пока ready ответят подряд все
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        streak = 0
+        while streak < workers * 3:
+            try:
+                r = await client.get(f"{base_url}/ready")
+                streak = streak + 1 if r.status_code == 200 else 0
+                if r.json().get("status") == "degraded":
+                    raise SystemExit("Воркер перешёл на заглушку вместо пайплайна — мерить нечего")
+            except httpx.HTTPError:
+                streak = 0
+            await asyncio.sleep(0.2)
+
+
+async def _throughput(base_url: str, queries: list[str], n_requests: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        async def one(i: int):
+            async with sem:
+                await client.post(f"{base_url}/diagnose", json={"symptoms": queries[i % len(queries)]})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n_requests)))
+        return n_requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["per-process", "preload", "sidecar"])
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dataset-dir", type=Path, default=BACKEND_DIR / "data" / "test_set")
+    args = parser.parse_args()
+
+    queries = [json.loads(p.read_text())["query"] for p in sorted(args.dataset_dir.glob("*.json"))]
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    print(f"{'mode':<12} {'workers':>7} {'max RSS MB':>14} {'PSS total MB':>13} {'req/s':>8}")
+    for mode in args.modes:
+        for workers in args.workers:
+            procs = _start(mode, workers, args.port)
+            try:
+                asyncio.run(_wait_ready(base_url, workers))
+                pids = []
+                for p in procs:
+                    pids.append(p.pid)
+                    pids.extend(_children(p.pid))
+                mem = [_memory_kb(pid) for pid in pids]
+                rps = asyncio.run(_throughput(base_url, queries, args.requests, args.concurrency))
+            finally:
+                _stop(procs)
+            rss_max = max(r for r, _ in mem) / 1024
+            pss_total = sum(p for _, p in mem) / 1024
+            print(f"{mode:<12} {workers:>7} {rss_max:>14.0f} {pss_total:>13.0f} {rps:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from src.database import get_db
 from src.api.deps import get_current_user
 from src.schemas.auth import LoginRequest, LoginResponse, RegisterRequest, UserProfile
-from src.services.auth_service import create_access_token, hash_password, verify_password
+from src.services.auth_service import create_access_token
+from src.services.password_service import password_hasher
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -18,7 +19,7 @@ async def register(body: RegisterRequest, db: aiosqlite.Connection = Depends(get
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered")
 
     user_id = uuid4().hex
-    pw_hash = hash_password(body.password)
+    pw_hash = await password_hasher.hash(body.password)
     await db.execute(
         "INSERT INTO users (id, email, password_hash, full_name) VALUES (?, ?, ?, ?)",
         (user_id, body.email, pw_hash, body.full_name),
@@ -35,8 +36,15 @@ async def login(body: LoginRequest, db: aiosqlite.Connection = Depends(get_db)):
         "SELECT id, password_hash FROM users WHERE email = ?", (body.email,)
     )
     row = await cursor.fetchone()
-    if not row or not verify_password(body.password, row["password_hash"]):
+    if not row:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    valid, new_hash = await password_hasher.verify(body.password, row["password_hash"])
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    if new_hash:
+        # BCRYPT_ROUNDS изменился — сохраняем хэш с новой стоимостью
+        await db.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_hash, row["id"]))
+        await db.commit()
 
     token = create_access_token(row["id"])
     return LoginResponse(access_token=token)
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Request, Response
 
 import aiosqlite
 
 from src.database import get_db
 from src.api.deps import get_current_user
+from src.api.responses import report_diagnosis_path
 from src.schemas.body_map import BodyMapDiagnoseRequest, BodyZone
 from src.schemas.chat import ChatMessageResponse
+from src.services.body_map_answers import BodyMapAnswers
 from src.services.body_map_service import BODY_ZONES, zones_to_symptoms_text
 from src.services.chat_service import process_chat_message
 from src.services.ml_service import MedicalDiagnosisService
@@ -22,12 +24,20 @@ async def get_zones():
 async def diagnose_by_body_map(
     body: BodyMapDiagnoseRequest,
     request: Request,
+    response: Response,
     user_id: str = Depends(get_current_user),
     db: aiosqlite.Connection = Depends(get_db),
 ):
     symptoms_text = zones_to_symptoms_text(body.zone_ids, body.lang)
+    diagnoses = None
     if body.additional_symptoms:
         symptoms_text += f", {body.additional_symptoms}"
+    else:
+        # Только зоны — ответ мог быть посчитан заранее
+        answers: BodyMapAnswers = request.app.state.body_map_answers
+        diagnoses = answers.lookup(body.zone_ids, body.lang)
 
     ml_service: MedicalDiagnosisService = request.app.state.ml_service
-    return await process_chat_message(db, ml_service, user_id, None, symptoms_text)
+    result = await process_chat_message(db, ml_service, user_id, None, symptoms_text, diagnoses)
+    report_diagnosis_path(response, "precomputed" if diagnoses is not None else None)
+    return result
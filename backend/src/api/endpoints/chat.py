@@ -1,10 +1,11 @@
 import aiosqlite
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 
 from src.database import get_db
 from src.api.deps import get_current_user
+from src.api.responses import json_bytes_response, report_diagnosis_path
 from src.schemas.chat import ChatMessage, ChatMessageRequest, ChatMessageResponse
-from src.services.chat_service import get_messages, process_chat_message
+from src.services.chat_service import get_messages_json, process_chat_message
 from src.services.ml_service import MedicalDiagnosisService
 
 router = APIRouter(prefix="/chat", tags=["chat"])
@@ -18,12 +19,17 @@ async def send_message(
     db: aiosqlite.Connection = Depends(get_db),
 ):
     ml_service: MedicalDiagnosisService = request.app.state.ml_service
-    return await process_chat_message(db, ml_service, user_id, body.session_id, body.message)
+    result = await process_chat_message(db, ml_service, user_id, body.session_id, body.message)
+    # Модель уже собрана и провалидирована — сериализуем её один раз, минуя response_model
+    response = json_bytes_response(request, result.model_dump_json().encode("utf-8"))
+    report_diagnosis_path(response)
+    return response
 
 
 @router.get("/{session_id}/messages", response_model=list[ChatMessage])
 async def list_messages(
     session_id: str,
+    request: Request,
     user_id: str = Depends(get_current_user),
     db: aiosqlite.Connection = Depends(get_db),
 ):
@@ -32,7 +38,6 @@ async def list_messages(
         (session_id, user_id),
     )
     if not await cursor.fetchone():
-        from fastapi import HTTPException, status
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
 
-    return await get_messages(db, session_id)
+    return json_bytes_response(request, await get_messages_json(db, session_id))
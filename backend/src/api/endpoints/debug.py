@@ -0,0 +1,91 @@
+import asyncio
+import os
+import secrets
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse
+
+from src.services.profiling import TorchCapture, collapsed, sample_stacks, trace_allocations
+
+# Профилирование воркера (src/services/profiling.py). Без токена маршруты не подключаются
+DEBUG_PROFILE_TOKEN = os.getenv("DEBUG_PROFILE_TOKEN", "")
+ENABLED = bool(DEBUG_PROFILE_TOKEN)
+MAX_SECONDS = 120
+
+
+async def require_admin(x_admin_token: str = Header("")) -> None:
+    if not secrets.compare_digest(x_admin_token.encode(), DEBUG_PROFILE_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
+
+
+router = APIRouter(prefix="/debug/profile", tags=["debug"], dependencies=[Depends(require_admin)])
+
+# Сэмплер и tracemalloc — по одному замеру на воркер за раз
+_capture_lock = asyncio.Lock()
+
+
+@asynccontextmanager
+async def _exclusive():
+    if _capture_lock.locked():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another capture is running")
+    async with _capture_lock:
+        yield
+
+
+@router.get("/cpu")
+async def cpu_profile(
+    seconds: float = Query(10, gt=0, le=MAX_SECONDS),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    idle: bool = Query(False, description="Include threads that are only waiting"),
+):
+    async with _exclusive():
+        stacks = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000, idle)
+    return PlainTextResponse(
+        collapsed(stacks),
+        headers={"Content-Disposition": f'attachment; filename="cpu-{os.getpid()}.folded"'},
+    )
+
+
+@router.get("/memory")
+async def memory_diff(
+    seconds: float = Query(10, gt=0, le=MAX_SECONDS),
+    top: int = Query(30, ge=1, le=500),
+    frames: int = Query(1, ge=1, le=25),
+):
+    async with _exclusive():
+        report = await asyncio.to_thread(trace_allocations, seconds, top, frames)
+    return {"pid": os.getpid(), **report}
+
+
+@router.post("/torch")
+async def start_torch_capture(request: Request, diagnoses: int = Query(5, ge=1, le=100)):
+    ml_service = request.app.state.ml_service
+    capture = ml_service.torch_capture
+    if capture is not None and not capture.complete:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Torch capture is already armed")
+    try:
+        import torch.profiler  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="torch is not installed")
+    ml_service.torch_capture = TorchCapture(diagnoses)
+    return {"pid": os.getpid(), "armed": diagnoses}
+
+
+@router.get("/torch")
+async def torch_capture_report(request: Request, top: int = Query(30, ge=1, le=500)):
+    ml_service = request.app.state.ml_service
+    capture = ml_service.torch_capture
+    if capture is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No torch capture")
+    report = capture.report(top)
+    if capture.complete:
+        # Результат забран — путь диагноза снова без проверок замера
+        ml_service.torch_capture = None
+    return report
+
+
+@router.delete("/torch")
+async def cancel_torch_capture(request: Request):
+    request.app.state.ml_service.torch_capture = None
+    return {"pid": os.getpid(), "armed": 0}
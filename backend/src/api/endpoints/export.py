@@ -1,31 +1,52 @@
+from typing import Literal
+
 import aiosqlite
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse, StreamingResponse
 
 from src.database import get_db
 from src.api.deps import get_current_user
-from src.services.export_service import generate_json_export, generate_pdf
-from src.services.history_service import get_session
+from src.services import bulk_export, export_cache
+from src.services.chat_service import get_messages
+from src.services.history_service import get_session_meta
 
 router = APIRouter(prefix="/export", tags=["export"])
 
 
+async def _export(session_id: str, user_id: str, db: aiosqlite.Connection, fmt: str) -> FileResponse:
+    meta = await get_session_meta(db, session_id, user_id)
+    if not meta:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+
+    async def load():
+        return meta["title"], await get_messages(db, session_id)
+
+    path = await export_cache.get_or_render(session_id, export_cache.session_version(meta), fmt, load)
+    media_type, suffix = export_cache.FORMATS[fmt]
+    return FileResponse(path, media_type=media_type, filename=f"freaxlab-{session_id[:8]}{suffix}")
+
+
+@router.get("/all")
+async def export_all(
+    format: Literal["ndjson", "zip"] = Query("ndjson"),
+    user_id: str = Depends(get_current_user),
+    db: aiosqlite.Connection = Depends(get_db),
+):
+    stream = bulk_export.stream_zip if format == "zip" else bulk_export.stream_ndjson
+    return StreamingResponse(
+        stream(db, user_id),
+        media_type=bulk_export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="freaxlab-history.{format}"'},
+    )
+
+
 @router.get("/{session_id}/pdf")
 async def export_pdf(
     session_id: str,
     user_id: str = Depends(get_current_user),
     db: aiosqlite.Connection = Depends(get_db),
 ):
-    session = await get_session(db, session_id, user_id)
-    if not session:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-
-    pdf_bytes = generate_pdf(session.title, session.messages)
-    return Response(
-        content=pdf_bytes,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="freaxlab-{session_id[:8]}.pdf"'},
-    )
+    return await _export(session_id, user_id, db, "pdf")
 
 
 @router.get("/{session_id}/json")
@@ -34,13 +55,4 @@ async def export_json(
     user_id: str = Depends(get_current_user),
     db: aiosqlite.Connection = Depends(get_db),
 ):
-    session = await get_session(db, session_id, user_id)
-    if not session:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-
-    json_str = generate_json_export(session.title, session.messages)
-    return Response(
-        content=json_str,
-        media_type="application/json",
-        headers={"Content-Disposition": f'attachment; filename="freaxlab-{session_id[:8]}.json"'},
-    )
+    return await _export(session_id, user_id, db, "json")
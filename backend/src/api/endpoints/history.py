@@ -1,10 +1,12 @@
 import aiosqlite
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 
 from src.database import get_db
 from src.api.deps import get_current_user
-from src.schemas.history import PaginatedResponse, SessionDetail
-from src.services.history_service import delete_session, get_session, list_sessions
+from src.api.responses import json_bytes_response
+from src.schemas.history import PaginatedResponse, SearchResponse, SessionDetail
+from src.services.history_service import delete_session, get_session_json, list_sessions
+from src.services.search_service import search_messages
 
 router = APIRouter(prefix="/history", tags=["history"])
 
@@ -19,16 +21,28 @@ async def get_history(
     return await list_sessions(db, user_id, page, per_page)
 
 
+@router.get("/search", response_model=SearchResponse)
+async def search_history(
+    q: str = Query(..., min_length=1, max_length=200),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    user_id: str = Depends(get_current_user),
+    db: aiosqlite.Connection = Depends(get_db),
+):
+    return await search_messages(db, user_id, q, page, per_page)
+
+
 @router.get("/{session_id}", response_model=SessionDetail)
 async def get_history_detail(
     session_id: str,
+    request: Request,
     user_id: str = Depends(get_current_user),
     db: aiosqlite.Connection = Depends(get_db),
 ):
-    session = await get_session(db, session_id, user_id)
-    if not session:
+    body = await get_session_json(db, session_id, user_id)
+    if body is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-    return session
+    return json_bytes_response(request, body)
 
 
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
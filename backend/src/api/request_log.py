@@ -0,0 +1,104 @@
+import logging
+import os
+import random
+import re
+import secrets
+import time
+
+from src.logger import RequestTrace, logger, request_id, request_trace
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Доля запросов, о которых пишется итоговая строка. Частые служебные пути —
+# отдельно: "префикс=доля" через запятую, побеждает самый длинный префикс
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+LOG_SAMPLE_PATHS = os.getenv("LOG_SAMPLE_PATHS", "/health=0,/ready=0,/metrics=0,/assets=0")
+# Ошибки и медленные запросы пишутся всегда, независимо от доли
+LOG_SLOW_MS = float(os.getenv("LOG_SLOW_MS", "2000"))
+# Ожидаемые отказы (ServiceUnavailableError: перегрузка 429 и «не готов» 503,
+# а также 503 от /ready при загрузке и заглушке) — не ошибки: WARNING и общая
+# доля по пути, иначе каждая проба оркестратора давала бы строку ERROR
+EXPECTED_STATUSES = (429, 503)
+
+# Входящий id принимаем, только если он похож на id (трассировка с прокси)
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+
+
+def _parse_rates(spec: str) -> list[tuple[str, float]]:
+    rates = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        prefix, _, rate = item.partition("=")
+        rates.append((prefix.strip(), float(rate)))
+    return sorted(rates, key=lambda r: len(r[0]), reverse=True)
+
+
+SAMPLE_PATHS = _parse_rates(LOG_SAMPLE_PATHS)
+
+
+def sample_rate(path: str) -> float:
+    return next((rate for prefix, rate in SAMPLE_PATHS if path.startswith(prefix)), LOG_SAMPLE_RATE)
+
+
+class RequestLogMiddleware:
+    """
+    ASGI-middleware: id запроса и RequestTrace в contextvars, в конце — одна строка лога.
+
+    Строка: метод, путь, статус, время, время стадий (<стадия>_ms, из
+    src.logger.stage) и флаги (путь диагноза, попадания в кэши). id берётся из
+    X-Request-ID или генерируется и возвращается в том же заголовке.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = next((v for k, v in scope["headers"] if k == b"x-request-id"), b"").decode("latin-1")
+        rid = incoming if _VALID_REQUEST_ID.fullmatch(incoming) else secrets.token_hex(8)
+        trace = RequestTrace()
+        # Без reset: у каждого запроса своя задача и свой контекст, а обработчик
+        # необработанных ошибок (снаружи middleware) тоже должен видеть id
+        request_id.set(rid)
+        request_trace.set(trace)
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", rid.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self._summary(scope, status, time.perf_counter() - started, trace)
+
+    @staticmethod
+    def _summary(scope, status: int, elapsed: float, trace: RequestTrace) -> None:
+        ms = elapsed * 1000
+        path = scope["path"]
+        rate = sample_rate(path)
+        error = status >= 500 and status not in EXPECTED_STATUSES
+        if not error and ms < LOG_SLOW_MS and random.random() >= rate:
+            return
+        fields = {"method": scope["method"], "path": path, "status": status, "duration_ms": round(ms, 1)}
+        fields.update((f"{name}_ms", round(seconds * 1000, 1)) for name, seconds in trace.stages.items())
+        fields.update(trace.flags)
+        fields["sample_rate"] = rate
+        if error:
+            level = logging.ERROR
+        elif status in EXPECTED_STATUSES:
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        logger.log(
+            level,
+            f"{scope['method']} {path} {status} {ms:.0f}ms",
+            extra={"fields": fields},
+        )
@@ -0,0 +1,28 @@
+import gzip
+import os
+
+from fastapi import Request, Response
+
+from src.services.ml_service import diagnosis_path
+
+# Ответы меньше порога не сжимаем: выигрыш не окупает CPU
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "16384"))
+COMPRESS_LEVEL = 5
+
+DIAGNOSIS_PATH_HEADER = "X-Diagnosis-Path"
+
+
+def json_bytes_response(request: Request, body: bytes, status_code: int = 200) -> Response:
+    """Готовый JSON без повторной валидации response_model; крупные ответы — в gzip."""
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= COMPRESS_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def report_diagnosis_path(response: Response, path: str | None = None) -> None:
+    """Каким путём посчитан диагноз запроса (fast, llm, stub, precomputed) — в заголовок ответа."""
+    path = path or diagnosis_path.get()
+    if path:
+        response.headers[DIAGNOSIS_PATH_HEADER] = path
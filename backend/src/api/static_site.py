@@ -0,0 +1,123 @@
+"""
+Статика SPA (сборка фронтенда в backend/static) из манифеста в памяти.
+
+Манифест строится один раз при старте: путь → тип, ETag и варианты
+(исходный файл, .br, .gz). Готовые .br/.gz кладёт сборка Vite (плагин
+precompress в frontend/vite.config.ts), воркер статику не сжимает. Вариант
+выбирается по Accept-Encoding. Файлы до STATIC_INLINE_MAX_BYTES, включая
+index.html, отдаются из памяти, остальные — с диска, но по тому же манифесту.
+На запрос нет ни одного обращения к файловой системе для проверки пути.
+
+Кэширование:
+- assets/ — имена с хэшем содержимого от Vite, поэтому Cache-Control immutable на год;
+- остальное (index.html, favicon) — no-cache: браузер каждый раз
+  переспрашивает с If-None-Match и получает 304 без тела, пока сборка та же.
+
+Неизвестный путь вне assets/ — маршрут SPA, отдаётся index.html. Неизвестный
+файл в assets/ — 404, а не index.html под видом скрипта.
+"""
+
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+STATIC_INLINE_MAX_BYTES = int(os.getenv("STATIC_INLINE_MAX_BYTES", str(1024 * 1024)))
+
+ASSETS_PREFIX = "assets/"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Порядок предпочтения: brotli меньше gzip
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+@dataclass
+class Variant:
+    path: Path
+    etag: str
+    body: bytes | None      # None — больше STATIC_INLINE_MAX_BYTES, отдаётся с диска
+
+
+@dataclass
+class StaticFile:
+    media_type: str
+    cache_control: str
+    variants: dict[str, Variant]    # "identity" | "br" | "gzip"
+
+
+def accepted_encodings(header: str) -> set[str]:
+    """Кодировки из Accept-Encoding, кроме явно запрещённых q=0."""
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        params = params.strip()
+        try:
+            q = float(params.removeprefix("q=")) if params.startswith("q=") else 1.0
+        except ValueError:
+            q = 1.0
+        if q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in header.split(","))
+
+
+class StaticSite:
+    def __init__(self, root: Path):
+        self.root = root
+        self.files: dict[str, StaticFile] = {}
+        for path in sorted(p for p in root.rglob("*") if p.is_file()):
+            if path.suffix in (".br", ".gz") and path.with_suffix("").is_file():
+                continue
+            name = path.relative_to(root).as_posix()
+            media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            cache_control = IMMUTABLE if name.startswith(ASSETS_PREFIX) else REVALIDATE
+            self.files[name] = StaticFile(media_type, cache_control, self._variants(path))
+        self.index = self.files.get("index.html")
+
+    def _variants(self, path: Path) -> dict[str, Variant]:
+        variants = {}
+        for encoding, suffix in (("identity", ""), *ENCODINGS):
+            file = path.with_name(path.name + suffix)
+            if not file.is_file():
+                continue
+            data = file.read_bytes()
+            # У каждого варианта свой ETag: байты тела разные
+            etag = f'"{hashlib.blake2b(data, digest_size=12).hexdigest()}"'
+            body = data if len(data) <= STATIC_INLINE_MAX_BYTES else None
+            variants[encoding] = Variant(file, etag, body)
+        return variants
+
+    def lookup(self, full_path: str) -> StaticFile | None:
+        found = self.files.get(full_path)
+        if found is None and not full_path.startswith(ASSETS_PREFIX):
+            return self.index
+        return found
+
+    def response(self, request: Request, full_path: str) -> Response:
+        found = self.lookup(full_path)
+        if found is None:
+            return Response(status_code=404)
+
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((e for e, _ in ENCODINGS if e in accepted and e in found.variants), "identity")
+        variant = found.variants[encoding]
+        headers = {"ETag": variant.etag, "Cache-Control": found.cache_control}
+        if len(found.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if _etag_matches(request.headers.get("if-none-match", ""), variant.etag):
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+        if variant.body is None:
+            return FileResponse(variant.path, media_type=found.media_type, headers=headers)
+        return Response(content=variant.body, media_type=found.media_type, headers=headers)
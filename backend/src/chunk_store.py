@@ -0,0 +1,180 @@
+"""
+Локальное хранилище текстов чанков, отображаемое в память (mmap).
+
+Qdrant при поиске возвращает только id и score, а title/text/icd_codes
+берутся отсюда — без передачи 30 payload'ов по сети на каждый запрос.
+Файл строит db.py из кэша эмбеддингов.
+
+Формат файла (little-endian):
+    b"FXCHUNK1" | u32 длина JSON-заголовка | JSON-заголовок | секции (выровнены по 8 байт)
+
+Секции (смещения и размеры — в заголовке):
+    ids       n × 16 байт    UUID точек, отсортированы (поиск — бинарный)
+    records   n × RECORD     ссылки на текст, строки и коды, в том же порядке
+    codes     m × u32        id строк ICD-кодов; у записи — срез [codes_off, +codes_len)
+    str_offs  (k+1) × u64    границы интернированных строк (title, source, коды...)
+    str_blob  UTF-8
+    text_blob UTF-8          тексты чанков
+"""
+
+import json
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b"FXCHUNK1"
+
+RECORD_DTYPE = np.dtype([
+    ("text_off", "<u8"),
+    ("text_len", "<u4"),
+    ("title", "<u4"),
+    ("source_file", "<u4"),
+    ("protocol_id", "<u4"),
+    ("chunk_type", "<u4"),
+    ("chunk_index", "<u4"),
+    ("codes_off", "<u4"),
+    ("codes_len", "<u4"),
+])
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+# ─── Построение ──────────────────────────────────────────────────────────────
+
+def build_chunk_store(cache_path: str, store_path: str) -> int:
+    """Строит хранилище из points_cache.jsonl (db.py). Возвращает число записей."""
+    rows: list[tuple[bytes, dict]] = []
+    with open(cache_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                rows.append((uuid.UUID(row["id"]).bytes, row["payload"]))
+    rows.sort(key=lambda r: r[0])
+
+    strings: dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    records = np.zeros(len(rows), dtype=RECORD_DTYPE)
+    codes: list[int] = []
+    text_parts: list[bytes] = []
+    text_off = 0
+    for i, (_, payload) in enumerate(rows):
+        text = payload.get("text", "").encode("utf-8")
+        icd = [intern(c) for c in payload.get("icd_codes", [])]
+        records[i] = (
+            text_off, len(text),
+            intern(payload.get("title", "")),
+            intern(payload.get("source_file", "")),
+            intern(payload.get("protocol_id", "")),
+            intern(payload.get("chunk_type", "")),
+            payload.get("chunk_index", 0),
+            len(codes), len(icd),
+        )
+        codes.extend(icd)
+        text_parts.append(text)
+        text_off += len(text)
+
+    encoded = [s.encode("utf-8") for s in strings]
+    str_offs = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(s) for s in encoded], out=str_offs[1:])
+
+    sections = {
+        "ids": b"".join(r[0] for r in rows),
+        "records": records.tobytes(),
+        "codes": np.asarray(codes, dtype="<u4").tobytes(),
+        "str_offs": str_offs.tobytes(),
+        "str_blob": b"".join(encoded),
+        "text_blob": b"".join(text_parts),
+    }
+
+    # Заголовок содержит смещения секций, которые зависят от длины самого заголовка —
+    # резервируем под смещения фиксированную ширину
+    layout = {name: [0, len(data)] for name, data in sections.items()}
+    header = {"count": len(rows), "sections": layout}
+    header_len = len(json.dumps(header).encode()) + 16 * len(sections)
+    offset = _align(len(MAGIC) + 4 + header_len)
+    for name, data in sections.items():
+        layout[name][0] = offset
+        offset = _align(offset + len(data))
+    header_bytes = json.dumps(header).encode().ljust(header_len)
+
+    with open(store_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(4, "little"))
+        f.write(header_bytes)
+        for name, data in sections.items():
+            f.seek(layout[name][0])
+            f.write(data)
+    return len(rows)
+
+
+# ─── Чтение ──────────────────────────────────────────────────────────────────
+
+class ChunkStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._mm[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path}: не похоже на chunk store")
+        header_len = int.from_bytes(bytes(self._mm[8:12]), "little")
+        header = json.loads(bytes(self._mm[12:12 + header_len]))
+        self.count = header["count"]
+        sec = {name: self._mm[off:off + size] for name, (off, size) in header["sections"].items()}
+
+        self._id_bytes = sec["ids"]
+        self._ids = sec["ids"].view("S16")
+        self._records = sec["records"].view(RECORD_DTYPE)
+        self._codes = sec["codes"].view("<u4")
+        self._str_offs = sec["str_offs"].view("<u8")
+        self._str_blob = sec["str_blob"]
+        self._text_blob = sec["text_blob"]
+        # Интернированных строк немного (названия, коды) — декодируем один раз по требованию
+        self._strings: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    @classmethod
+    def open_if_exists(cls, path: str) -> "ChunkStore | None":
+        return cls(path) if path and Path(path).is_file() else None
+
+    def _string(self, idx: int) -> str:
+        value = self._strings.get(idx)
+        if value is None:
+            start, end = int(self._str_offs[idx]), int(self._str_offs[idx + 1])
+            value = bytes(self._str_blob[start:end]).decode("utf-8")
+            self._strings[idx] = value
+        return value
+
+    def row_of(self, point_id: str) -> int | None:
+        key = uuid.UUID(point_id).bytes
+        row = int(np.searchsorted(self._ids, key))
+        # Сравниваем сырые байты: элемент S16 теряет хвостовые нули
+        if row < self.count and bytes(self._id_bytes[row * 16:(row + 1) * 16]) == key:
+            return row
+        return None
+
+    def payload_at(self, row: int) -> dict:
+        rec = self._records[row]
+        text_off, text_len = int(rec["text_off"]), int(rec["text_len"])
+        codes_off, codes_len = int(rec["codes_off"]), int(rec["codes_len"])
+        return {
+            "title": self._string(int(rec["title"])),
+            "source_file": self._string(int(rec["source_file"])),
+            "protocol_id": self._string(int(rec["protocol_id"])),
+            "icd_codes": [self._string(int(c)) for c in self._codes[codes_off:codes_off + codes_len]],
+            "chunk_type": self._string(int(rec["chunk_type"])),
+            "chunk_index": int(rec["chunk_index"]),
+            "text": bytes(self._text_blob[text_off:text_off + text_len]).decode("utf-8"),
+        }
+
+    def get(self, point_id: str) -> dict | None:
+        row = self.row_of(point_id)
+        return None if row is None else self.payload_at(row)
@@ -0,0 +1,98 @@
+"""
+Чанкинг протоколов для индексации: общий для пошаговой загрузки db.py и
+потоковой src/ingest_pipeline.py. Без torch и Qdrant.
+"""
+
+import hashlib
+
+from src.protocol_sections import parse_protocol, section_text
+
+# bge-m3 поддерживает до 8192 токенов, берём ~3000 символов на чанк (~900 токенов)
+MAX_CHARS_PER_CHUNK = 5000
+
+
+# ─── Извлечение клинических секций ───────────────────────────────────────────
+
+def build_chunks(record: dict) -> list[tuple[str, dict]]:
+    """
+    Улучшенная стратегия чанкинга:
+    1. Маленькие чанки (до 1000 симв) для четких векторов.
+    2. Обязательное включение названия протокола в текст чанка.
+    3. Привязка ICD-10 кодов к каждому чанку для LLM.
+    """
+    raw_text  = record.get("text", "")
+    source    = record.get("source_file", "unknown")
+    protocol  = record.get("protocol_id", "")
+    icd_codes = record.get("icd_codes", [])
+    # Один проход по тексту: название протокола и смещения секций (src/protocol_sections.py)
+    layout    = parse_protocol(raw_text)
+    real_name = layout.name if layout.name is not None else source.replace(".pdf", "").strip()
+
+    # Метаданные, которые полетят в Qdrant
+    base_payload = {
+        "title":       real_name,
+        "source_file": source,
+        "protocol_id": protocol,
+        "icd_codes":   icd_codes,
+    }
+
+    sections = {
+        key: section_text(raw_text, start, end, MAX_CHARS_PER_CHUNK) for key, start, end in layout.spans()
+    }
+    chunks: list[tuple[str, dict]] = []
+
+    # Лимит символов для более точного фокуса вектора
+    CHUNK_LIMIT = 1000 
+
+    # 1. Секция КЛИНИКА (симптомы + диагностика) - самая важная для поиска по жалобам
+    clinical_text = " ".join(filter(None, [
+        sections.get("symptoms", ""),
+        sections.get("diagnosis", ""),
+    ])).strip()
+
+    if clinical_text:
+        # Разбиваем длинную клиническую картину на части, если она огромная
+        parts = [clinical_text[i:i+CHUNK_LIMIT] for i in range(0, len(clinical_text), CHUNK_LIMIT)]
+        for i, part in enumerate(parts):
+            # В текст для эмбеддинга добавляем название, чтобы вектор "знал" о чем речь
+            text_for_embedding = f"Протокол: {real_name}. Клиническая картина: {part}"
+            
+            payload = {**base_payload, "chunk_type": "clinical", "chunk_index": i, "text": part}
+            chunks.append((text_for_embedding, payload))
+
+    # 2. Секция ЛЕЧЕНИЕ
+    treatment_text = sections.get("treatment", "").strip()
+    if treatment_text:
+        parts = [treatment_text[i:i+CHUNK_LIMIT] for i in range(0, len(treatment_text), CHUNK_LIMIT)]
+        for i, part in enumerate(parts):
+            text_for_embedding = f"Протокол: {real_name}. Лечение и тактика: {part}"
+            
+            payload = {**base_payload, "chunk_type": "treatment", "chunk_index": i, "text": part}
+            chunks.append((text_for_embedding, payload))
+
+    # 3. Фолбек (если регексы не сработали)
+    if not chunks:
+        body = raw_text[600:] # Пропуск бюрократии
+        step = 800
+        for i, start in enumerate(range(0, min(len(body), 5000), step)):
+            part = body[start : start + CHUNK_LIMIT].strip()
+            if len(part) < 150: continue
+            
+            text_for_embedding = f"Протокол: {real_name}. Содержание: {part}"
+            payload = {**base_payload, "chunk_type": "sliding", "chunk_index": i, "text": part}
+            chunks.append((text_for_embedding, payload))
+
+    return chunks
+
+# ─── Утилиты ─────────────────────────────────────────────────────────────────
+
+def make_id(key: str) -> str:
+    h = hashlib.md5(key.encode()).hexdigest()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}"
+
+
+def point_id(record: dict, payload: dict) -> str:
+    """Стабильный id точки: тот же чанк того же протокола — тот же id (для докачки)."""
+    source = record.get("source_file", "unknown")
+    protocol = record.get("protocol_id", "")
+    return make_id(f"{source}__{protocol}__{payload['chunk_index']}__{payload['chunk_type']}")
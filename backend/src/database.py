@@ -1,6 +1,8 @@
 import aiosqlite
 from pathlib import Path
 
+from src.logger import request_trace, stage
+
 DB_PATH = Path(__file__).resolve().parent.parent / "data" / "app.db"
 
 DDL = """
@@ -30,22 +32,165 @@ CREATE TABLE IF NOT EXISTS chat_messages (
     created_at TEXT NOT NULL DEFAULT (datetime('now')),
     FOREIGN KEY (session_id) REFERENCES diagnosis_sessions(id) ON DELETE CASCADE
 );
+
+-- Сообщения старых сессий, перенесённые maintenance.py: zlib(JSON) на сессию
+CREATE TABLE IF NOT EXISTS message_archive (
+    session_id TEXT PRIMARY KEY,
+    message_count INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    archived_at TEXT NOT NULL DEFAULT (datetime('now')),
+    FOREIGN KEY (session_id) REFERENCES diagnosis_sessions(id) ON DELETE CASCADE
+);
+
+-- Поиск по архивированным сообщениям: строка chat_fts с rowid = fts_rowid
+-- (отрицательный, не пересекается с rowid chat_messages) и данные для выдачи
+CREATE TABLE IF NOT EXISTS archived_messages (
+    fts_rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY (session_id) REFERENCES diagnosis_sessions(id) ON DELETE CASCADE
+);
+
+-- Готовые ответы для комбинаций зон карты тела (body_map_answers.py)
+CREATE TABLE IF NOT EXISTS body_map_answers (
+    zones TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    pipeline_version TEXT NOT NULL,
+    diagnoses_json TEXT NOT NULL,
+    computed_at TEXT NOT NULL DEFAULT (datetime('now')),
+    PRIMARY KEY (zones, lang)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON diagnosis_sessions(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON chat_messages(session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_archived_messages_session ON archived_messages(session_id);
+"""
+
+# ─── Полнотекстовый поиск по истории ─────────────────────────────────────────
+#
+# Одна строка chat_fts на сообщение (rowid = chat_messages.rowid): текст,
+# заголовок сессии, названия диагнозов и коды МКБ из diagnoses_json. owner —
+# user_id, по нему запрос сразу ограничивается пользователем внутри MATCH.
+# unicode61 приводит к нижнему регистру кириллицу, включая казахские буквы
+# (ә, ғ, қ, ң, ө, ұ, ү, һ, і), но не трогает «ё» — её сводим к «е» сами.
+# Текст ответа ассистента не хранится (message_store.py), поэтому в diagnoses
+# попадают и объяснения.
+#
+# Архивация (maintenance.py) удаляет сообщения из chat_messages, и триггер
+# удаляет их строки chat_fts. Поэтому архивированные сообщения индексируются
+# заново под отрицательными rowid из archived_messages. Эти строки удаляются
+# только вместе с archived_messages, то есть при настоящем удалении сессии
+# или пользователя (каскад).
+
+
+def _fts_text(expr: str) -> str:
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _fts_diagnoses(expr: str) -> str:
+    return _fts_text(
+        f"CASE WHEN json_valid({expr}) THEN coalesce(("
+        f"SELECT group_concat(json_extract(d.value, '$.diagnosis') || ' ' || "
+        f"json_extract(d.value, '$.icd10_code') || ' ' || "
+        f"coalesce(json_extract(d.value, '$.explanation'), ''), ' ') FROM json_each({expr}) d), '') ELSE '' END"
+    )
+
+
+def _fts_columns(msg: str) -> str:
+    """Значения строки chat_fts для сообщения msg (алиас или NEW) и его сессии s."""
+    return (
+        f"{msg}.rowid, {_fts_text(f'{msg}.content')}, {_fts_text('s.title')}, "
+        f"{_fts_diagnoses(f'{msg}.diagnoses_json')}, s.user_id"
+    )
+
+
+_FTS_INSERT = "INSERT INTO chat_fts (rowid, content, title, diagnoses, owner)"
+_FTS_INSERT_NEW = f"{_FTS_INSERT} SELECT {_fts_columns('NEW')} FROM diagnosis_sessions s WHERE s.id = NEW.session_id"
+# Параметры: fts_rowid, content, diagnoses_json, session_id
+FTS_INSERT_ARCHIVED = (
+    f"{_FTS_INSERT} SELECT {_fts_columns('m')} "
+    "FROM (SELECT ? AS rowid, ? AS content, ? AS diagnoses_json) m JOIN diagnosis_sessions s ON s.id = ?"
+)
+
+# Триггеры пересоздаются при каждом запуске, чтобы совпадать с текущим кодом
+FTS_DDL = f"""
+DROP TRIGGER IF EXISTS chat_fts_insert;
+DROP TRIGGER IF EXISTS chat_fts_delete;
+DROP TRIGGER IF EXISTS chat_fts_update;
+DROP TRIGGER IF EXISTS chat_fts_title;
+DROP TRIGGER IF EXISTS chat_fts_archived_delete;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_fts USING fts5(
+    content, title, diagnoses, owner,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER chat_fts_insert AFTER INSERT ON chat_messages BEGIN
+    {_FTS_INSERT_NEW};
+END;
+
+CREATE TRIGGER chat_fts_delete AFTER DELETE ON chat_messages BEGIN
+    DELETE FROM chat_fts WHERE rowid = OLD.rowid;
+END;
+
+CREATE TRIGGER chat_fts_update AFTER UPDATE OF content, diagnoses_json ON chat_messages BEGIN
+    DELETE FROM chat_fts WHERE rowid = OLD.rowid;
+    {_FTS_INSERT_NEW};
+END;
+
+CREATE TRIGGER chat_fts_title AFTER UPDATE OF title ON diagnosis_sessions BEGIN
+    UPDATE chat_fts SET title = {_fts_text("NEW.title")}
+    WHERE rowid IN (
+        SELECT rowid FROM chat_messages WHERE session_id = NEW.id
+        UNION ALL SELECT fts_rowid FROM archived_messages WHERE session_id = NEW.id
+    );
+END;
+
+CREATE TRIGGER chat_fts_archived_delete AFTER DELETE ON archived_messages BEGIN
+    DELETE FROM chat_fts WHERE rowid = OLD.fts_rowid;
+END;
 """
 
+FTS_BACKFILL = (
+    f"{_FTS_INSERT} SELECT {_fts_columns('m')} "
+    "FROM chat_messages m JOIN diagnosis_sessions s ON s.id = m.session_id"
+)
+
+
+async def _ensure_fts(db: aiosqlite.Connection) -> None:
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_fts'")
+    exists = await cursor.fetchone() is not None
+    await db.executescript(FTS_DDL)
+    if not exists:
+        # Первый запуск с поиском: индексируем уже накопленную историю
+        await db.execute(FTS_BACKFILL)
+        await db.execute("INSERT INTO chat_fts (chat_fts) VALUES ('optimize')")
+
 
 async def init_db():
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     async with aiosqlite.connect(str(DB_PATH)) as db:
+        # Для новой базы; существующую переводит в incremental один раз maintenance.py
+        await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
         await db.execute("PRAGMA journal_mode=WAL")
         await db.execute("PRAGMA foreign_keys=ON")
         await db.executescript(DDL)
+        await _ensure_fts(db)
         await db.commit()
 
 
 async def get_db():
-    db = await aiosqlite.connect(str(DB_PATH))
+    with stage("db_connect"):
+        db = await aiosqlite.connect(str(DB_PATH))
     db.row_factory = aiosqlite.Row
     await db.execute("PRAGMA foreign_keys=ON")
+    trace = request_trace.get()
+    if trace is not None:
+        # Число SQL-запросов — в итоговую строку лога запроса (src/api/request_log.py).
+        # Колбэк идёт в потоке aiosqlite, поэтому трасса захвачена здесь, а не из contextvar
+        await db.set_trace_callback(lambda _: trace.count("db_queries"))
     try:
         yield db
     finally:
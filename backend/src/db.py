@@ -9,38 +9,53 @@
 Запуск Qdrant:
     docker run -p 6333:6333 qdrant/qdrant
 
-Использование:
-    python setup_qdrant.py --input protocols.jsonl              # всё сразу
-    python setup_qdrant.py --input protocols.jsonl --encode-only
-    python setup_qdrant.py --input protocols.jsonl --upload-only
-    python setup_qdrant.py --input protocols.jsonl --query "боль в животе желтуха"
+Использование (из backend/):
+    python -m src.db --input protocols.jsonl              # всё сразу
+    python -m src.db --input protocols.jsonl --encode-only
+    python -m src.db --input protocols.jsonl --upload-only
+    python -m src.db --input protocols.jsonl --query "боль в животе желтуха"
+    python -m src.db --input protocols.jsonl --upload-only --profile int8 --recreate
+    python -m src.db --input protocols.jsonl --lexical-only   # индекс для DiagnoserLight из готового кэша
+    python -m src.db --input protocols.jsonl --pipeline   # этапы одновременно, с докачкой (src/ingest_pipeline.py)
 """
 
 import json
-import re
 import argparse
-import hashlib
 from pathlib import Path
 
 import torch
 from tqdm import tqdm
 from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, OptimizersConfigDiff
+from qdrant_client.models import PointStruct, OptimizersConfigDiff, PayloadSchemaType
 from qdrant_client.models import QueryRequest
 
+from src.chunk_store import build_chunk_store
+from src.chunking import build_chunks, point_id
+from src.ingest_pipeline import CHUNK_WORKERS, UPLOAD_WORKERS, run_pipeline
+from src.lexical_index import build_lexical_index
+from src.qdrant_profiles import COLLECTION_PROFILES, get_profile
+from src.rerank_tokens import build_rerank_tokens
+
 # ─── Конфигурация ────────────────────────────────────────────────────────────
 
 COLLECTION_NAME = "medical_protocols_v5"
 EMBEDDING_MODEL  = "BAAI/bge-m3"
+RERANKER_MODEL   = "BAAI/bge-reranker-v2-m3"
+RERANKER_MAX_LENGTH = 512
 VECTOR_SIZE      = 1024
 
-# bge-m3 поддерживает до 8192 токенов, берём ~3000 символов на чанк (~900 токенов)
-MAX_CHARS_PER_CHUNK = 5000
 BATCH_SIZE          = 16   # bge-m3 тяжелее чем e5-base
 
 QDRANT_URL  = "http://localhost:6333"
 CACHE_FILE  = "points_cache.jsonl"
+CHUNK_STORE_FILE = "chunk_store.bin"   # локальные тексты чанков для поиска без payload
+LEXICAL_INDEX_FILE = "lexical_index.bin"  # BM25 по n-граммам для DiagnoserLight (без torch)
+LEXICAL_CHUNK_TYPES = "clinical,sliding"  # жалобы ищем по клинике, не по лечению
+RERANK_TOKENS_FILE = "rerank_tokens.bin"  # token ids документов для реранкера
+
+# Поля payload, по которым фильтруем при поиске — для них строим keyword-индексы
+PAYLOAD_INDEXES = ("chunk_type", "protocol_id")
 
 
 # ─── Определение устройства (MPS / CUDA / CPU) ───────────────────────────────
@@ -56,125 +71,8 @@ def get_device() -> str:
     return "cpu"
 
 
-# ─── Извлечение клинических секций ───────────────────────────────────────────
-
-_SECTION_PATTERNS = {
-    "symptoms": re.compile(
-        r"(?:жалоб[ыи]|ЖАЛОБ[ЫИ]|клинические\s+критерии|КЛИНИЧЕСКИЕ\s+КРИТЕРИИ"
-        r"|критерии\s+диагностики|КРИТЕРИИ\s+ДИАГНОСТИКИ"
-        r"|клиническая\s+картина|КЛИНИЧЕСКАЯ\s+КАРТИНА)(.*?)"
-        r"(?=\n\s*\d+\.\d+\s|\nI{1,3}V?\b|\nVII?\b|\Z)",
-        re.IGNORECASE | re.DOTALL,
-    ),
-    "diagnosis": re.compile(
-        r"(?:диагностик[аи]|ДИАГНОСТИК[АИ]|лабораторн|ЛАБОРАТОРН"
-        r"|инструментальн|ИНСТРУМЕНТАЛЬН)(.*?)"
-        r"(?=\nI{1,3}V?\b|\nVII?\b|лечение|ЛЕЧЕНИЕ|\Z)",
-        re.IGNORECASE | re.DOTALL,
-    ),
-    "treatment": re.compile(
-        r"(?:лечение|ЛЕЧЕНИЕ|медикаментозн|МЕДИКАМЕНТОЗН"
-        r"|хирургическ|ХИРУРГИЧЕСК)(.*?)"
-        r"(?=\nV{1,3}\b|\nVII?\b|профилактика|ПРОФИЛАКТИКА|\Z)",
-        re.IGNORECASE | re.DOTALL,
-    ),
-}
-
-
-def extract_protocol_name(text: str, source_file: str) -> str:
-    """Реальное название протокола, не 'Одобрен'."""
-    m = re.search(
-        r"КЛИНИЧЕСКИЙ ПРОТОКОЛ ДИАГНОСТИКИ И ЛЕЧЕНИЯ\s+([^\n]{5,150})",
-        text, re.IGNORECASE,
-    )
-    if m:
-        return m.group(1).strip()
-    return source_file.replace(".pdf", "").strip()
-
-
-def extract_sections(text: str) -> dict[str, str]:
-    sections = {}
-    for key, pat in _SECTION_PATTERNS.items():
-        m = pat.search(text)
-        if m:
-            sections[key] = m.group(1).strip()[:MAX_CHARS_PER_CHUNK]
-    return sections
-
-
-def build_chunks(record: dict) -> list[tuple[str, dict]]:
-    """
-    Улучшенная стратегия чанкинга:
-    1. Маленькие чанки (до 1000 симв) для четких векторов.
-    2. Обязательное включение названия протокола в текст чанка.
-    3. Привязка ICD-10 кодов к каждому чанку для LLM.
-    """
-    raw_text  = record.get("text", "")
-    source    = record.get("source_file", "unknown")
-    protocol  = record.get("protocol_id", "")
-    icd_codes = record.get("icd_codes", [])
-    real_name = extract_protocol_name(raw_text, source)
-
-    # Метаданные, которые полетят в Qdrant
-    base_payload = {
-        "title":       real_name,
-        "source_file": source,
-        "protocol_id": protocol,
-        "icd_codes":   icd_codes,
-    }
-
-    sections = extract_sections(raw_text)
-    chunks: list[tuple[str, dict]] = []
-
-    # Лимит символов для более точного фокуса вектора
-    CHUNK_LIMIT = 1000 
-
-    # 1. Секция КЛИНИКА (симптомы + диагностика) - самая важная для поиска по жалобам
-    clinical_text = " ".join(filter(None, [
-        sections.get("symptoms", ""),
-        sections.get("diagnosis", ""),
-    ])).strip()
-
-    if clinical_text:
-        # Разбиваем длинную клиническую картину на части, если она огромная
-        parts = [clinical_text[i:i+CHUNK_LIMIT] for i in range(0, len(clinical_text), CHUNK_LIMIT)]
-        for i, part in enumerate(parts):
-            # В текст для эмбеддинга добавляем название, чтобы вектор "знал" о чем речь
-            text_for_embedding = f"Протокол: {real_name}. Клиническая картина: {part}"
-            
-            payload = {**base_payload, "chunk_type": "clinical", "chunk_index": i, "text": part}
-            chunks.append((text_for_embedding, payload))
-
-    # 2. Секция ЛЕЧЕНИЕ
-    treatment_text = sections.get("treatment", "").strip()
-    if treatment_text:
-        parts = [treatment_text[i:i+CHUNK_LIMIT] for i in range(0, len(treatment_text), CHUNK_LIMIT)]
-        for i, part in enumerate(parts):
-            text_for_embedding = f"Протокол: {real_name}. Лечение и тактика: {part}"
-            
-            payload = {**base_payload, "chunk_type": "treatment", "chunk_index": i, "text": part}
-            chunks.append((text_for_embedding, payload))
-
-    # 3. Фолбек (если регексы не сработали)
-    if not chunks:
-        body = raw_text[600:] # Пропуск бюрократии
-        step = 800
-        for i, start in enumerate(range(0, min(len(body), 5000), step)):
-            part = body[start : start + CHUNK_LIMIT].strip()
-            if len(part) < 150: continue
-            
-            text_for_embedding = f"Протокол: {real_name}. Содержание: {part}"
-            payload = {**base_payload, "chunk_type": "sliding", "chunk_index": i, "text": part}
-            chunks.append((text_for_embedding, payload))
-
-    return chunks
-
 # ─── Утилиты ─────────────────────────────────────────────────────────────────
 
-def make_id(key: str) -> str:
-    h = hashlib.md5(key.encode()).hexdigest()
-    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}"
-
-
 def load_jsonl(path: str) -> list[dict]:
     records = []
     with open(path, encoding="utf-8") as f:
@@ -208,15 +106,11 @@ def encode_and_cache(records: list[dict], model: SentenceTransformer, cache_path
             skipped += 1
             continue
 
-        source   = record.get("source_file", "unknown")
-        protocol = record.get("protocol_id", "")
-
         for text, payload in build_chunks(record):
-            id_key   = f"{source}__{protocol}__{payload['chunk_index']}__{payload['chunk_type']}"
-            point_id = make_id(id_key)
-            if point_id in cached_ids:
+            chunk_id = point_id(record, payload)
+            if chunk_id in cached_ids:
                 continue
-            all_items.append((text, point_id, payload))
+            all_items.append((text, chunk_id, payload))
 
     if skipped:
         print(f"Пропущено (невалидных): {skipped}")
@@ -241,8 +135,8 @@ def encode_and_cache(records: list[dict], model: SentenceTransformer, cache_path
                 prompt_name="document"
             )
 
-            for (_, point_id, payload), vector in zip(batch, vectors):
-                row = {"id": point_id, "vector": vector.tolist(), "payload": payload}
+            for (_, chunk_id, payload), vector in zip(batch, vectors):
+                row = {"id": chunk_id, "vector": vector.tolist(), "payload": payload}
                 cache_f.write(json.dumps(row, ensure_ascii=False) + "\n")
 
     total = len(cached_ids) + len(all_items)
@@ -251,7 +145,7 @@ def encode_and_cache(records: list[dict], model: SentenceTransformer, cache_path
 
 # ─── Шаг 2: кэш → Qdrant ─────────────────────────────────────────────────────
 
-def upload_from_cache(client: QdrantClient, cache_path: str) -> None:
+def upload_from_cache(client: QdrantClient, cache_path: str, collection_name: str = COLLECTION_NAME) -> None:
     if not Path(cache_path).exists():
         raise FileNotFoundError(f"Кэш не найден: {cache_path}. Запустите --encode-only сначала.")
 
@@ -260,7 +154,7 @@ def upload_from_cache(client: QdrantClient, cache_path: str) -> None:
     offset = None
     while True:
         result, offset = client.scroll(
-            collection_name=COLLECTION_NAME,
+            collection_name=collection_name,
             limit=1000, offset=offset,
             with_payload=False, with_vectors=False,
         )
@@ -284,12 +178,12 @@ def upload_from_cache(client: QdrantClient, cache_path: str) -> None:
             continue
         batch.append(PointStruct(id=row["id"], vector=row["vector"], payload=row["payload"]))
         if len(batch) >= 256:
-            client.upsert(collection_name=COLLECTION_NAME, points=batch)
+            client.upsert(collection_name=collection_name, points=batch)
             total_uploaded += len(batch)
             batch = []
 
     if batch:
-        client.upsert(collection_name=COLLECTION_NAME, points=batch)
+        client.upsert(collection_name=collection_name, points=batch)
         total_uploaded += len(batch)
 
     print(f"✅ Загружено: {total_uploaded} новых точек (пропущено: {skipped})")
@@ -297,24 +191,48 @@ def upload_from_cache(client: QdrantClient, cache_path: str) -> None:
 
 # ─── Коллекция ───────────────────────────────────────────────────────────────
 
-def create_collection(client: QdrantClient) -> None:
+def create_collection(
+    client: QdrantClient,
+    profile_name: str = "default",
+    collection_name: str = COLLECTION_NAME,
+    recreate: bool = False,
+) -> None:
+    profile = get_profile(profile_name)
     existing = {c.name for c in client.get_collections().collections}
-    if COLLECTION_NAME in existing:
-        info = client.get_collection(COLLECTION_NAME)
+    if collection_name in existing:
+        info = client.get_collection(collection_name)
         size = info.config.params.vectors.size
-        if size != VECTOR_SIZE:
+        if recreate:
+            print(f"  ⚠️  Пересоздаём коллекцию (профиль '{profile_name}')...")
+            client.delete_collection(collection_name)
+        elif size != VECTOR_SIZE:
             print(f"  ⚠️  Пересоздаём коллекцию (dim={size} → {VECTOR_SIZE})...")
-            client.delete_collection(COLLECTION_NAME)
+            client.delete_collection(collection_name)
         else:
-            print(f"Коллекция '{COLLECTION_NAME}' уже существует (dim={size}).")
+            print(f"Коллекция '{collection_name}' уже существует (dim={size}). "
+                  f"Профиль применяется только при создании — используйте --recreate.")
+            create_payload_indexes(client, collection_name)
             return
 
     client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE),
+        collection_name=collection_name,
+        vectors_config=profile.vectors_config(VECTOR_SIZE),
+        hnsw_config=profile.hnsw_config(),
+        quantization_config=profile.quantization_config(),
         optimizers_config=OptimizersConfigDiff(indexing_threshold=20_000),
     )
-    print(f"Коллекция '{COLLECTION_NAME}' создана (dim={VECTOR_SIZE}).")
+    create_payload_indexes(client, collection_name)
+    print(f"Коллекция '{collection_name}' создана (dim={VECTOR_SIZE}, профиль '{profile_name}': "
+          f"{profile.description}).")
+
+
+def create_payload_indexes(client: QdrantClient, collection_name: str = COLLECTION_NAME) -> None:
+    for field_name in PAYLOAD_INDEXES:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=PayloadSchemaType.KEYWORD,
+        )
 
 
 # ─── Поиск ───────────────────────────────────────────────────────────────────
@@ -352,18 +270,39 @@ def main():
     parser.add_argument("--url",         default=QDRANT_URL,      help="URL Qdrant сервера")
     parser.add_argument("--api-key",     default=None,            help="API ключ Qdrant Cloud")
     parser.add_argument("--cache",       default=CACHE_FILE,      help="Путь к кэшу эмбеддингов")
+    parser.add_argument("--chunk-store", default=CHUNK_STORE_FILE, help="Куда сохранить mmap-хранилище текстов чанков")
+    parser.add_argument("--lexical-index", default=LEXICAL_INDEX_FILE, help="Куда сохранить лексический индекс")
+    parser.add_argument("--lexical-chunk-types", default=LEXICAL_CHUNK_TYPES,
+                        help="Типы чанков в лексическом индексе; пусто — все")
+    parser.add_argument("--rerank-tokens", default=RERANK_TOKENS_FILE,
+                        help="Куда сохранить token ids документов для реранкера")
+    parser.add_argument("--skip-rerank-tokens", action="store_true",
+                        help="Не строить token ids для реранкера (с --lexical-only не строятся всегда)")
+    parser.add_argument("--lexical-only", action="store_true",
+                        help="Только chunk store и лексический индекс из готового кэша, без модели и Qdrant")
     parser.add_argument("--query",       default=None,            help="Тестовый запрос после загрузки")
     parser.add_argument("--encode-only", action="store_true",     help="Только эмбеддинги, без Qdrant")
     parser.add_argument("--upload-only", action="store_true",     help="Только загрузка из кэша")
     parser.add_argument("--model",       default=EMBEDDING_MODEL, help="Модель эмбеддингов")
+    parser.add_argument("--profile",     default="default", choices=list(COLLECTION_PROFILES),
+                        help="Профиль коллекции (квантизация, HNSW, on_disk)")
+    parser.add_argument("--recreate",    action="store_true",     help="Пересоздать коллекцию с новым профилем")
+    parser.add_argument("--pipeline",    action="store_true",
+                        help="Чтение, чанкинг, эмбеддинги и загрузка одновременно (src/ingest_pipeline.py)")
+    parser.add_argument("--chunk-workers", type=int, default=CHUNK_WORKERS, help="Потоков чанкинга в --pipeline")
+    parser.add_argument("--upload-workers", type=int, default=UPLOAD_WORKERS, help="Потоков загрузки в --pipeline")
     args = parser.parse_args()
 
     if not Path(args.input).exists():
         raise FileNotFoundError(f"Файл не найден: {args.input}")
 
     model = None
+    # С --upload-only и --lexical-only всё строится из готового кэша, модель не нужна
+    encode = not (args.upload_only or args.lexical_only)
+    # Потоковый режим сам грузит в Qdrant
+    streamed = args.pipeline and encode
 
-    if not args.upload_only:
+    if encode:
         device = get_device()
         print(f"Загрузка модели: {args.model}")
         model = SentenceTransformer(args.model, device=device)
@@ -372,17 +311,50 @@ def main():
             print("Прогрев MPS...")
             model.encode(["тест"], show_progress_bar=False)
 
-        records = load_jsonl(args.input)
-        encode_and_cache(records, model, args.cache)
+        if streamed:
+            qdrant_client = None
+            if not args.encode_only:
+                print(f"\nПодключение к Qdrant: {args.url}")
+                qdrant_client = QdrantClient(url=args.url, api_key=args.api_key or None)
+                create_collection(qdrant_client, args.profile, recreate=args.recreate)
+            stats = run_pipeline(
+                args.input, model, args.cache, qdrant_client, COLLECTION_NAME,
+                chunk_workers=args.chunk_workers, upload_workers=args.upload_workers,
+            )
+            print(f"✅ Потоковая загрузка: {stats}")
+        else:
+            records = load_jsonl(args.input)
+            encode_and_cache(records, model, args.cache)
+
+    if not Path(args.cache).exists():
+        raise FileNotFoundError(f"Кэш не найден: {args.cache}. Запустите --encode-only сначала.")
+    count = build_chunk_store(args.cache, args.chunk_store)
+    print(f"✅ Chunk store: {args.chunk_store} ({count} чанков)")
 
+    chunk_types = [t for t in args.lexical_chunk_types.split(",") if t]
+    count = build_lexical_index(args.chunk_store, args.lexical_index, chunk_types or None)
+    print(f"✅ Лексический индекс: {args.lexical_index} ({count} чанков)")
+
+    # DiagnoserLight реранкер не нужен, а загрузка токенизатора — лишняя сеть и секунды
+    if not (args.lexical_only or args.skip_rerank_tokens):
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(RERANKER_MODEL)
+        count = build_rerank_tokens(args.chunk_store, args.rerank_tokens, tokenizer, RERANKER_MAX_LENGTH)
+        print(f"✅ Токены реранкера: {args.rerank_tokens} ({count} чанков)")
+
+    if args.lexical_only:
+        print(f"\nРежим --lexical-only завершён. Индекс: {args.lexical_index}, chunk store: {args.chunk_store}")
+        return
     if args.encode_only:
         print(f"\nРежим --encode-only завершён. Кэш: {args.cache}")
         return
 
-    print(f"\nПодключение к Qdrant: {args.url}")
-    qdrant_client = QdrantClient(url=args.url, api_key=args.api_key or None)
-    create_collection(qdrant_client)
-    upload_from_cache(qdrant_client, args.cache)
+    if not streamed:
+        print(f"\nПодключение к Qdrant: {args.url}")
+        qdrant_client = QdrantClient(url=args.url, api_key=args.api_key or None)
+        create_collection(qdrant_client, args.profile, recreate=args.recreate)
+        upload_from_cache(qdrant_client, args.cache)
     print(f"\n✅ Готово! Коллекция: {COLLECTION_NAME}")
 
     if model is None:
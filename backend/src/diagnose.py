@@ -10,32 +10,90 @@ RAG-пайплайн: симптомы → Qdrant → ЛЛМ → диагноз
     uv run uvicorn diagnose:app --host 0.0.0.0 --port 8000
 """
 
+import asyncio
+import contextvars
+import hashlib
 import json
 import os
 import re
+import time
+from dataclasses import asdict, dataclass
 from functools import lru_cache
+from typing import Awaitable, Callable
 
-import torch
+import numpy as np
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from openai import OpenAI
 from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
-from sentence_transformers import CrossEncoder
+from qdrant_client.models import FieldCondition, Filter, MatchAny
 
+from src.chunk_store import ChunkStore
 from src.config import API_KEY, HUB_URL, MODEL, settings
+from src.fast_path import FastPathThresholds, fast_answer
+from src.logger import logger, note, stage
+from src.qdrant_profiles import get_profile
+from src.rerank_cascade import (
+    DEPTH_MARGIN,
+    MIN_DEPTH,
+    PRUNE_KEEP,
+    PRUNE_MAX_LENGTH,
+    PRUNE_MODEL,
+    RERANK_CASCADE,
+    RerankCascade,
+)
+from src.rerank_tokens import PretokenizedReranker, RerankTokens, rerank_document
+from src.retrieval_cache import SessionRetrieval, SessionRetrievalCache
+from src.speculative_llm import SpeculativeLLM
 
 # ─── Конфигурация ────────────────────────────────────────────────────────────
 
 COLLECTION_NAME = "medical_protocols_v5"
 EMBEDDING_MODEL = "BAAI/bge-m3"
+RERANKER_MODEL  = "BAAI/bge-reranker-v2-m3"
+RERANKER_MAX_LENGTH = 512
 VECTOR_SIZE     = 1024
 TOP_K           = 5   # сколько чанков тянуть из Qdrant
 TOP_N_DIAGNOSES = 3        # сколько диагнозов возвращать
+SEARCH_LIMIT    = 30  # кандидатов для реранкера при полном поиске
 
 QDRANT_URL  = settings.QDRANT_URL
 QDRANT_API_KEY = settings.QDRANT_API_KEY
 
+# Транспорт и ограничения запросов к Qdrant. QDRANT_ASYNC=1 — в сервисе поиск
+# идёт через AsyncQdrantClient в event loop и не держит поток пула на время
+# ожидания сети; одновременно не больше QDRANT_MAX_CONCURRENCY запросов.
+# QDRANT_TIMEOUT — секунды на один вызов (поиск или дозагрузка payload).
+QDRANT_ASYNC = os.getenv("QDRANT_ASYNC", "0") == "1"
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "0") == "1"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = float(os.getenv("QDRANT_TIMEOUT", "5"))
+QDRANT_MAX_CONCURRENCY = int(os.getenv("QDRANT_MAX_CONCURRENCY", "8"))
+
+# Профиль, с которым построена коллекция (db.py --profile): задаёт hnsw_ef и rescoring
+QDRANT_PROFILE = os.getenv("QDRANT_PROFILE", "default")
+# Искать только по этим типам чанков, например "clinical,sliding"; пусто — по всем
+RETRIEVAL_CHUNK_TYPES = [t for t in os.getenv("RETRIEVAL_CHUNK_TYPES", "").split(",") if t]
+
+# Локальное хранилище текстов чанков (db.py --chunk-store). Если файл есть,
+# Qdrant отдаёт только id и score, а payload читается отсюда.
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "chunk_store.bin")
+# Token ids документов для реранкера (db.py --rerank-tokens, src/rerank_tokens.py)
+RERANK_TOKENS_PATH = os.getenv("RERANK_TOKENS_PATH", "rerank_tokens.bin")
+
+# Уточнения в чат-сессии (src/retrieval_cache.py): сколько лучших кандидатов
+# запоминать, сколько брать свежим поиском и с какой близости запроса к
+# предыдущему (косинус) сообщение считается уточнением, а не новой темой
+SESSION_POOL_SIZE = int(os.getenv("SESSION_POOL_SIZE", "12"))
+FOLLOWUP_SEARCH_LIMIT = int(os.getenv("FOLLOWUP_SEARCH_LIMIT", "10"))
+FOLLOWUP_MIN_SIMILARITY = float(os.getenv("FOLLOWUP_MIN_SIMILARITY", "0.6"))
+
+# Если задан — эмбеддинги и реранкинг считает общий inference-сайдкар (src/inference_server.py)
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "")
+
+# Запрос для прогрева моделей при старте (первый инференс torch заметно медленнее)
+WARMUP_QUERY = "кашель, температура 38, боль в груди"
+
 # ─── Промпт ──────────────────────────────────────────────────────────────────
 
 SYSTEM_PROMPT = """Ты — главный медицинский эксперт. Твоя задача — классификация по протоколам.
@@ -91,27 +149,178 @@ def build_user_prompt(symptoms: str, chunks: list[dict]) -> str:
 Для каждого диагноза обязательно укажи точный код МКБ-10 из списка допустимых кодов этого протокола."""
 
 
+# ─── Модели ──────────────────────────────────────────────────────────────────
+#
+# Веса держим в модульном кэше: один экземпляр на процесс. В preload-режиме
+# (src/serve_preload.py) их загружает родитель до fork, и воркеры делят
+# страницы памяти copy-on-write. torch импортируется лениво, чтобы воркеры
+# в режиме сайдкара вообще его не загружали.
+
+_MODELS: dict[str, object] = {}
+
+
+def get_device() -> str:
+    import torch
+
+    if torch.backends.mps.is_available():
+        return "mps"
+    if torch.cuda.is_available():
+        return "cuda"
+    return "cpu"
+
+
+def get_embed_model(device: str):
+    if "embedder" not in _MODELS:
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Загрузка модели эмбеддингов: {EMBEDDING_MODEL}")
+        _MODELS["embedder"] = SentenceTransformer(EMBEDDING_MODEL, device=device)
+    return _MODELS["embedder"]
+
+
+def get_reranker(device: str):
+    if "reranker" not in _MODELS:
+        from sentence_transformers import CrossEncoder
+
+        logger.info(f"Загрузка реранкера: {RERANKER_MODEL}")
+        _MODELS["reranker"] = CrossEncoder(RERANKER_MODEL, max_length=RERANKER_MAX_LENGTH, device=device)
+    return _MODELS["reranker"]
+
+
+def get_pruner(device: str):
+    """Маленький cross-encoder для отсева кандидатов перед большим реранкером (src/rerank_cascade.py)."""
+    if "pruner" not in _MODELS:
+        from sentence_transformers import CrossEncoder
+
+        logger.info(f"Загрузка реранкера для отсева: {PRUNE_MODEL}")
+        _MODELS["pruner"] = CrossEncoder(PRUNE_MODEL, max_length=PRUNE_MAX_LENGTH, device=device)
+    return _MODELS["pruner"]
+
+
+def preload_models(device: str = "cpu") -> None:
+    """Загружает веса в текущий процесс заранее (без инференса — он ломает OpenMP после fork)."""
+    _MODELS["device"] = device
+    get_embed_model(device)
+    get_reranker(device)
+    if RERANK_CASCADE:
+        get_pruner(device)
+
+
 # ─── Основной класс ──────────────────────────────────────────────────────────
 
-class Diagnoser:
-    def __init__(self):
-        self.device = self._get_device()
-        print(f"Загрузка модели эмбеддингов: {EMBEDDING_MODEL}")
-        self.embed_model = SentenceTransformer(EMBEDDING_MODEL, device=self.device)
+@dataclass
+class SearchPlan:
+    """Что искать в Qdrant. Считается до поиска, чтобы сам поиск мог идти через async-клиент."""
+    query_vector: list[float]
+    limit: int
+    path: str                           # full | followup | topic_change
+    state: SessionRetrieval | None      # пул сессии, если есть
+    started: float
 
-        print(f"Подключение к Qdrant: {QDRANT_URL}")
-        self.qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY or None)
 
-        print(f"Подключение к ЛЛМ: {HUB_URL}")
-        self.llm = OpenAI(base_url=HUB_URL, api_key=API_KEY)
-        self.reranker = CrossEncoder('BAAI/bge-reranker-v2-m3', max_length=512, device=self.device)
+def _fill_fetched(missing: list, fetched: list) -> None:
+    by_id = {str(r.id): r.payload for r in fetched}
+    for p in missing:
+        p.payload = by_id.get(str(p.id), {})
 
-    def _get_device(self) -> str:
-        if torch.backends.mps.is_available():
-            return "mps"
-        if torch.cuda.is_available():
-            return "cuda"
-        return "cpu"
+
+class Diagnoser:
+    def __init__(self, on_ready: Callable[[str], None] | None = None):
+        # on_ready(component) сообщает сервису о готовности каждого компонента (для /ready)
+        notify = on_ready or (lambda component: None)
+
+        if INFERENCE_SOCKET:
+            from src.inference_server import InferenceClient
+
+            logger.info(f"Подключение к inference-сайдкару: {INFERENCE_SOCKET}")
+            remote = InferenceClient(INFERENCE_SOCKET)
+            self.device = "remote"
+            self.embed_model = remote.embedder()
+        else:
+            self.device = _MODELS.get("device") or get_device()
+            self.embed_model = get_embed_model(self.device)
+        notify("embedder")
+
+        logger.info(f"Подключение к Qdrant: {QDRANT_URL}")
+        self.qdrant = QdrantClient(
+            url=QDRANT_URL,
+            api_key=QDRANT_API_KEY or None,
+            prefer_grpc=QDRANT_PREFER_GRPC,
+            grpc_port=QDRANT_GRPC_PORT,
+            timeout=max(1, int(QDRANT_TIMEOUT)),
+        )
+        # Async-клиент создаёт connect_async() в event loop сервиса
+        self.aqdrant = None
+        self._search_slots: asyncio.Semaphore | None = None
+
+        logger.info(f"Подключение к ЛЛМ: {HUB_URL}")
+        self.llm = OpenAI(base_url=HUB_URL, api_key=API_KEY)
+        notify("llm")
+
+        self.reranker = remote.reranker() if INFERENCE_SOCKET else get_reranker(self.device)
+        pruner = None
+        if RERANK_CASCADE:
+            pruner = remote.pruner() if INFERENCE_SOCKET else get_pruner(self.device)
+        # Адаптивная глубина и отсев перед большим реранкером (src/rerank_cascade.py)
+        self.cascade = RerankCascade(self.reranker, pruner)
+        # В режиме сайдкара пары токенизирует сайдкар
+        self.rerank_tokens = None
+        tokens = None if INFERENCE_SOCKET else RerankTokens.open_if_exists(RERANK_TOKENS_PATH)
+        if tokens is not None:
+            if PretokenizedReranker.compatible(self.reranker, tokens):
+                self.rerank_tokens = PretokenizedReranker(self.reranker, tokens)
+                logger.info(f"Токены реранкера: {RERANK_TOKENS_PATH} ({len(tokens)} чанков)")
+            else:
+                logger.info(f"Токены реранкера {RERANK_TOKENS_PATH} построены для {tokens.tokenizer} (max_length {tokens.max_length}) — не используются")
+        notify("reranker")
+
+        self.chunk_store = ChunkStore.open_if_exists(CHUNK_STORE_PATH)
+        if self.chunk_store is not None:
+            logger.info(f"Chunk store: {CHUNK_STORE_PATH} ({len(self.chunk_store)} чанков)")
+
+        self.session_cache = SessionRetrievalCache()
+        # Вызов ЛЛМ по плотному топ-K параллельно с реранкингом (src/speculative_llm.py)
+        self.speculative = SpeculativeLLM()
+
+        # Быстрый путь без ЛЛМ — только если есть откалиброванные пороги (src/fast_path.py)
+        self.fast_path = FastPathThresholds.load()
+        if self.fast_path is not None:
+            logger.info(f"Быстрый путь: score ≥ {self.fast_path.min_score:.3f}, отрыв ≥ {self.fast_path.min_margin:.3f}")
+
+        self.search_params = get_profile(QDRANT_PROFILE).search_params()
+        self.query_filter = None
+        if RETRIEVAL_CHUNK_TYPES:
+            self.query_filter = Filter(
+                must=[FieldCondition(key="chunk_type", match=MatchAny(any=RETRIEVAL_CHUNK_TYPES))]
+            )
+
+        self.pipeline_tag = self._pipeline_tag()
+
+    def _pipeline_tag(self) -> str:
+        """Хэш настроек, от которых зависят ответы (ключ кэшей ответов, см. ml_service.pipeline_version).
+
+        Модели и промпт покрывает PIPELINE_VERSION; здесь — то, что меняется
+        без правки кода: ЛЛМ, профиль и фильтр поиска, каскад реранкинга, пороги
+        быстрого пути и содержимое chunk store.
+        """
+        chunk_store = None
+        if self.chunk_store is not None:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(CHUNK_STORE_PATH, "rb") as f:
+                while block := f.read(1 << 24):
+                    digest.update(block)
+            chunk_store = digest.hexdigest()
+        settings_used = {
+            "collection": COLLECTION_NAME,
+            "llm": MODEL,
+            "qdrant_profile": QDRANT_PROFILE,
+            "chunk_types": RETRIEVAL_CHUNK_TYPES,
+            "cascade": [RERANK_CASCADE, PRUNE_MODEL, PRUNE_MAX_LENGTH, PRUNE_KEEP, DEPTH_MARGIN, MIN_DEPTH],
+            "fast_path": asdict(self.fast_path) if self.fast_path is not None else None,
+            "chunk_store": chunk_store,
+        }
+        key = json.dumps(settings_used, sort_keys=True, ensure_ascii=False)
+        return f"Diagnoser:{hashlib.blake2b(key.encode(), digest_size=6).hexdigest()}"
 
     def _embed_query(self, text: str) -> list[float]:
         enriched = f"Клинический случай для диагностики по МКБ-10: {text}"
@@ -124,48 +333,194 @@ class Diagnoser:
         except Exception:
             return self.embed_model.encode(enriched, normalize_embeddings=True).tolist()
 
-    def _retrieve(self, symptoms: str) -> list[dict]:
-        # 1. Расширяем запрос (Query Expansion)
-        query_vector = self._embed_query(symptoms)
-        
-        # 2. Берем побольше кандидатов для реранкера
-        results = self.qdrant.query_points(
-            collection_name=COLLECTION_NAME,
-            query=query_vector,
-            limit=30, # Реранкеру нужно из чего выбирать
-            with_payload=True,
-        ).points
-
-        # 3. РЕРАНЖИРОВАНИЕ: скармливаем связку [Симптомы, Название + Текст]
-        # Это "чит", чтобы реранкер видел заголовок протокола (например, "Остеомиелит")
-        pairs = []
-        for r in results:
-            title = r.payload.get('title', 'Неизвестный протокол')
-            text = r.payload.get('text', '')
-            pairs.append([symptoms, f"ПРОТОКОЛ: {title}. СОДЕРЖАНИЕ: {text}"])
-        
-        scores = self.reranker.predict(pairs)
-        
-        for i in range(len(results)):
-            results[i].score = scores[i]
-        
-        results.sort(key=lambda x: x.score, reverse=True)
-        
+    def _search(self, query_vector: list[float], limit: int) -> list[tuple[str, dict, float]]:
+        with stage("search"):
+            results = self.qdrant.query_points(
+                collection_name=COLLECTION_NAME,
+                query=query_vector,
+                query_filter=self.query_filter,
+                search_params=self.search_params,
+                limit=limit,
+                with_payload=self.chunk_store is None,
+            ).points
+            if self.chunk_store is not None:
+                self._hydrate(results)
+        return [(str(r.id), r.payload, r.score) for r in results]
+
+    def _rerank(self, symptoms: str, candidates: list[tuple[str, dict]]) -> list[tuple[str, dict, float]]:
+        pairs = [[symptoms, rerank_document(payload)] for _, payload in candidates]
+
+        # Документы уже токенизированы — токенизируется только запрос
+        rerank = (
+            (lambda survivors: self.rerank_tokens.predict(
+                symptoms, [(candidates[i][0], pairs[i][1]) for i in survivors]
+            ))
+            if self.rerank_tokens is not None
+            else None
+        )
+
+        with stage("rerank"):
+            return [(*candidates[i], score) for i, score in self.cascade.rank(pairs, rerank)]
+
+    def _retrieve(self, symptoms: str, session_id: str | None = None) -> list[dict]:
         # Топ-K теперь реально самые релевантные по смыслу, а не по частоте слов
-        return [r.payload for r in results[:TOP_K]]
+        return [payload for payload, _ in self._retrieve_scored(symptoms, session_id)[:TOP_K]]
+
+    def _retrieve_scored(
+        self,
+        symptoms: str,
+        session_id: str | None = None,
+        on_candidates: Callable[[list[dict]], None] | None = None,
+    ) -> list[tuple[dict, float]]:
+        """Все кандидаты после реранкинга: [(payload, счёт реранкера)] по убыванию.
+
+        on_candidates получает плотный топ-K до реранкинга (для спекулятивного вызова ЛЛМ).
+        """
+        plan = self._plan_search(symptoms, session_id)
+        found = self._search(plan.query_vector, plan.limit)
+        return self._rank_found(symptoms, session_id, plan, found, on_candidates)
+
+    def _plan_search(self, symptoms: str, session_id: str | None = None) -> SearchPlan:
+        started = time.perf_counter()
+        # 1. Расширяем запрос (Query Expansion)
+        with stage("embed"):
+            query_vector = self._embed_query(symptoms)
+
+        # 2. Уточнение в сессии: свежий поиск поменьше + пул прошлого сообщения.
+        #    Иначе берем побольше кандидатов для реранкера
+        state = self.session_cache.get(session_id) if session_id else None
+        path = "full"
+        if state is not None:
+            similarity = float(np.dot(state.query_vector, query_vector))
+            path = "followup" if similarity >= FOLLOWUP_MIN_SIMILARITY else "topic_change"
+        if session_id:
+            note(session_path=path)
+        limit = FOLLOWUP_SEARCH_LIMIT if path == "followup" else SEARCH_LIMIT
+        return SearchPlan(query_vector, limit, path, state, started)
+
+    def _rank_found(
+        self,
+        symptoms: str,
+        session_id: str | None,
+        plan: SearchPlan,
+        found: list[tuple[str, dict, float]],
+        on_candidates: Callable[[list[dict]], None] | None = None,
+    ) -> list[tuple[dict, float]]:
+        # Крутой верх плотных оценок — меньше кандидатов для реранкинга
+        depth = self.cascade.depth([score for _, _, score in found])
+        candidates = [(point_id, payload) for point_id, payload, _ in found[:depth]]
+        overlap = None
+        if plan.path == "followup":
+            fresh = {point_id for point_id, _, _ in found}
+            overlap = len(fresh & plan.state.ids) / len(fresh) if fresh else 0.0
+            candidates += [c for c in plan.state.pool if c[0] not in fresh]
+
+        if on_candidates is not None:
+            on_candidates([payload for _, payload in candidates[:TOP_K]])
+
+        # 3. РЕРАНЖИРОВАНИЕ
+        ranked = self._rerank(symptoms, candidates)
+        if session_id:
+            pool = [(point_id, payload) for point_id, payload, _ in ranked[:SESSION_POOL_SIZE]]
+            self.session_cache.put(session_id, np.asarray(plan.query_vector, dtype=np.float32), pool)
+            self.session_cache.record(plan.path, time.perf_counter() - plan.started, overlap)
+
+        return [(payload, score) for _, payload, score in ranked]
+
+    def _fill_from_store(self, points: list) -> list:
+        """Подставляет payload из локального chunk store; возвращает точки, которых там нет."""
+        missing = []
+        for p in points:
+            p.payload = self.chunk_store.get(str(p.id))
+            if p.payload is None:
+                missing.append(p)
+        return missing
+
+    def _hydrate(self, points: list) -> None:
+        """Подставляет payload из локального chunk store; чего там нет — добираем из Qdrant."""
+        missing = self._fill_from_store(points)
+        if missing:
+            fetched = self.qdrant.retrieve(
+                collection_name=COLLECTION_NAME,
+                ids=[p.id for p in missing],
+                with_payload=True,
+            )
+            _fill_fetched(missing, fetched)
+
+    # ─── Async-поиск (сервис) ────────────────────────────────────────────────
+
+    def connect_async(self) -> None:
+        """Создаёт AsyncQdrantClient. Вызывать из event loop сервиса: к нему привязываются соединения."""
+        if not QDRANT_ASYNC:
+            return
+        from qdrant_client import AsyncQdrantClient
+
+        self.aqdrant = AsyncQdrantClient(
+            url=QDRANT_URL,
+            api_key=QDRANT_API_KEY or None,
+            prefer_grpc=QDRANT_PREFER_GRPC,
+            grpc_port=QDRANT_GRPC_PORT,
+            timeout=max(1, int(QDRANT_TIMEOUT)),
+        )
+        self._search_slots = asyncio.Semaphore(QDRANT_MAX_CONCURRENCY)
+        logger.info(f"Async Qdrant: {'gRPC' if QDRANT_PREFER_GRPC else 'REST'}, до {QDRANT_MAX_CONCURRENCY} запросов")
+
+    async def close_async(self) -> None:
+        if self.aqdrant is not None:
+            await self.aqdrant.close()
+            self.aqdrant = None
+
+    async def _asearch(self, query_vector: list[float], limit: int) -> list[tuple[str, dict, float]]:
+        # При всплеске запросы ждут слота здесь, а не копятся в Qdrant
+        with stage("search"):
+            async with self._search_slots:
+                response = await asyncio.wait_for(
+                    self.aqdrant.query_points(
+                        collection_name=COLLECTION_NAME,
+                        query=query_vector,
+                        query_filter=self.query_filter,
+                        search_params=self.search_params,
+                        limit=limit,
+                        with_payload=self.chunk_store is None,
+                    ),
+                    QDRANT_TIMEOUT,
+                )
+                results = response.points
+                if self.chunk_store is not None:
+                    missing = self._fill_from_store(results)
+                    if missing:
+                        fetched = await asyncio.wait_for(
+                            self.aqdrant.retrieve(
+                                collection_name=COLLECTION_NAME,
+                                ids=[p.id for p in missing],
+                                with_payload=True,
+                            ),
+                            QDRANT_TIMEOUT,
+                        )
+                        _fill_fetched(missing, fetched)
+        return [(str(r.id), r.payload, r.score) for r in results]
+
+    def warmup(self) -> None:
+        """Прогоняет эмбеддер, реранкер и поиск на тестовом запросе (без вызова ЛЛМ)."""
+        self._embed_query(WARMUP_QUERY)
+        self.reranker.predict([[WARMUP_QUERY, "ПРОТОКОЛ: прогрев. СОДЕРЖАНИЕ: прогрев"]])
+        if self.cascade.pruner is not None:
+            self.cascade.pruner.predict([[WARMUP_QUERY, "ПРОТОКОЛ: прогрев. СОДЕРЖАНИЕ: прогрев"]])
+        self._retrieve(WARMUP_QUERY)
 
     def _call_llm(self, symptoms: str, chunks: list[dict]) -> dict:
         user_prompt = build_user_prompt(symptoms, chunks)
 
-        response = self.llm.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user",   "content": user_prompt},
-            ],
-            temperature=0.1,
-            max_tokens=2048,  
-        )
+        with stage("llm"):
+            response = self.llm.chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user",   "content": user_prompt},
+                ],
+                temperature=0.1,
+                max_tokens=2048,
+            )
 
         raw = response.choices[0].message.content.strip()
 
@@ -186,26 +541,83 @@ class Diagnoser:
                     pass
             raise ValueError(f"ЛЛМ вернула невалидный JSON:\n{raw[:300]}")
 
-    def diagnose(self, symptoms: str) -> dict:
+    def diagnose(self, symptoms: str, session_id: str | None = None) -> dict:
         """
         Основной метод: симптомы → диагнозы.
-        Возвращает dict с ключом 'diagnoses'.
+        Возвращает dict с ключом 'diagnoses' и 'path': "fast" (без ЛЛМ) или "llm".
+        session_id — чат-сессия: уточнения переиспользуют её кандидатов.
         """
         if not symptoms or not symptoms.strip():
             raise ValueError("Симптомы не могут быть пустыми")
 
         # Шаг 1: Retrieval
-        chunks = self._retrieve(symptoms)
-        if not chunks:
+        plan = self._plan_search(symptoms, session_id)
+        return self._answer(symptoms, session_id, plan, self._search(plan.query_vector, plan.limit))
+
+    async def adiagnose(
+        self,
+        symptoms: str,
+        session_id: str | None,
+        run: Callable[..., Awaitable],
+    ) -> dict:
+        """
+        То же, что diagnose, но поиск в Qdrant идёт через async-клиент в event loop.
+        run(fn, *args) выполняет блокирующие шаги (эмбеддинг, реранкинг, ЛЛМ) в пуле сервиса.
+        """
+        if self.aqdrant is None:
+            return await run(self.diagnose, symptoms, session_id)
+        if not symptoms or not symptoms.strip():
+            raise ValueError("Симптомы не могут быть пустыми")
+
+        plan = await run(self._plan_search, symptoms, session_id)
+        found = await self._asearch(plan.query_vector, plan.limit)
+        return await run(self._answer, symptoms, session_id, plan, found)
+
+    def _answer(
+        self, symptoms: str, session_id: str | None, plan: SearchPlan, found: list[tuple[str, dict, float]]
+    ) -> dict:
+        """Реранкинг найденного, затем быстрый путь или ЛЛМ."""
+        # В спекулятивном режиме ЛЛМ стартует до реранкинга
+        speculation = None
+
+        def speculate(dense_top: list[dict]) -> None:
+            nonlocal speculation
+            # Пул спекуляции свой — контекст запроса (id, тайминги) передаём явно
+            context = contextvars.copy_context()
+            speculation = self.speculative.start(
+                lambda chunks: context.run(self._call_llm, symptoms, chunks), dense_top
+            )
+
+        try:
+            ranked = self._rank_found(
+                symptoms, session_id, plan, found, speculate if self.speculative.enabled else None
+            )
+        except Exception:
+            self.speculative.discard(speculation)
+            raise
+        if not ranked:
+            self.speculative.discard(speculation)
             raise RuntimeError("Qdrant вернул 0 результатов — проверь что коллекция заполнена")
 
-        # Шаг 2: Generation
-        result = self._call_llm(symptoms, chunks)
+        # Реранкер уверен в одном протоколе — ЛЛМ не нужна
+        diagnoses = fast_answer(self.fast_path, symptoms, ranked)
+        if diagnoses is not None:
+            self.speculative.discard(speculation)
+            return {"diagnoses": diagnoses, "path": "fast"}
+        chunks = [payload for payload, _ in ranked[:TOP_K]]
+
+        # Шаг 2: Generation — ответ спекуляции, если её топ-K совпал с реранжированным
+        result = self.speculative.resolve(speculation, chunks)
+        if speculation is not None:
+            note(speculative_hit=result is not None)
+        if result is None:
+            result = self._call_llm(symptoms, chunks)
 
         # Валидация структуры
         if "diagnoses" not in result:
             raise ValueError(f"ЛЛМ вернула неожиданный формат: {result}")
 
+        result["path"] = "llm"
         return result
 
 
@@ -1,16 +1,34 @@
 """
 Лёгкий пайплайн для Railway (без torch/sentence-transformers).
 Напрямую вызывает LLM (oss-120b) для диагностики.
+
+С LIGHT_LEXICAL_RAG=1 и лексическим индексом и chunk store рядом (db.py)
+сначала ищет протоколы BM25 по n-граммам (src/lexical_index.py) и строит тот
+же промпт с протоколами и допустимыми кодами МКБ, что и Diagnoser. По
+умолчанию выключено: этот промпт ограничивает коды найденными протоколами, а
+hit@5 протокола у лексического поиска ниже, чем у bge-m3. Включать, только
+если evaluate.py показывает, что точность не хуже, чем у промпта с одними
+симптомами.
 """
 
 import json
+import os
 import re
+from typing import Callable
 
 from openai import OpenAI
 
+from src.chunk_store import ChunkStore
 from src.config import API_KEY, HUB_URL, MODEL
+from src.lexical_index import LexicalIndex
+from src.logger import logger
 
 TOP_N_DIAGNOSES = 3
+TOP_K = 5  # сколько чанков протоколов в промпт, как в Diagnoser
+
+LIGHT_LEXICAL_RAG = os.getenv("LIGHT_LEXICAL_RAG", "0") == "1"
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "lexical_index.bin")
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "chunk_store.bin")
 
 SYSTEM_PROMPT = """Ты — главный медицинский эксперт Казахстана. Классифицируй симптомы пациента по МКБ-10.
 
@@ -35,17 +53,48 @@ SYSTEM_PROMPT = """Ты — главный медицинский эксперт
 class DiagnoserLight:
     """LLM-only диагностика (без RAG, без torch)."""
 
-    def __init__(self):
-        print(f"[Light] Подключение к ЛЛМ: {HUB_URL}")
+    def __init__(self, on_ready: Callable[[str], None] | None = None):
+        logger.info(f"[Light] Подключение к ЛЛМ: {HUB_URL}")
         self.llm = OpenAI(base_url=HUB_URL, api_key=API_KEY)
+        if on_ready:
+            on_ready("llm")
+
+        self.index = self.chunk_store = None
+        chunk_store = ChunkStore.open_if_exists(CHUNK_STORE_PATH) if LIGHT_LEXICAL_RAG else None
+        if chunk_store is not None and os.path.isfile(LEXICAL_INDEX_PATH):
+            self.index = LexicalIndex(LEXICAL_INDEX_PATH)
+            self.chunk_store = chunk_store
+            logger.info(f"[Light] Лексический индекс: {LEXICAL_INDEX_PATH} ({len(self.index)} чанков)")
+            if on_ready:
+                on_ready("vector_store")
+
+    @property
+    def pipeline_tag(self) -> str:
+        # Ответы с протоколами и без них — разные пайплайны для кэшей ответов
+        return "DiagnoserLight+lexical" if self.index is not None else "DiagnoserLight"
+
+    def _retrieve(self, symptoms: str) -> list[dict]:
+        return [self.chunk_store.payload_at(row) for row, _ in self.index.search(symptoms, TOP_K)]
+
+    def _messages(self, symptoms: str) -> list[dict]:
+        chunks = self._retrieve(symptoms) if self.index is not None else []
+        if chunks:
+            # Промпт и правила Diagnoser: коды только из найденных протоколов
+            from src.diagnose import SYSTEM_PROMPT as RAG_SYSTEM_PROMPT, build_user_prompt
+
+            return [
+                {"role": "system", "content": RAG_SYSTEM_PROMPT},
+                {"role": "user", "content": build_user_prompt(symptoms, chunks)},
+            ]
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"Симптомы пациента: {symptoms}\n\nДай топ-{TOP_N_DIAGNOSES} диагноза."},
+        ]
 
     def _call_llm(self, symptoms: str) -> dict:
         response = self.llm.chat.completions.create(
             model=MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": f"Симптомы пациента: {symptoms}\n\nДай топ-{TOP_N_DIAGNOSES} диагноза."},
-            ],
+            messages=self._messages(symptoms),
             temperature=0.1,
             max_tokens=2048,
         )
@@ -63,7 +112,8 @@ class DiagnoserLight:
                     pass
             raise ValueError(f"ЛЛМ вернула невалидный JSON:\n{raw[:300]}")
 
-    def diagnose(self, symptoms: str) -> dict:
+    def diagnose(self, symptoms: str, session_id: str | None = None) -> dict:
+        # session_id — для совместимости с Diagnoser: без retrieval переиспользовать нечего
         if not symptoms or not symptoms.strip():
             raise ValueError("Симптомы не могут быть пустыми")
         result = self._call_llm(symptoms)
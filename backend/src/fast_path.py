@@ -0,0 +1,174 @@
+"""
+Быстрый путь без ЛЛМ: ответ прямо из протоколов после реранкинга.
+
+Если кросс-энкодер уверенно ставит один протокол впереди (счёт лучшего чанка
+не ниже min_score и отрыв от лучшего чанка другого протокола не меньше
+min_margin), ЛЛМ почти всегда просто переписывает его название и первый код
+МКБ. Тогда топ-3 диагноза собираются из первых трёх разных протоколов
+рейтинга: название, первый допустимый код и предложение из текста чанка,
+больше всего похожее на жалобы.
+
+Пороги подбираются офлайн на data/test_set под целевую точность (accuracy@1
+как в evaluate.py) и сохраняются в FAST_PATH_THRESHOLDS. Нет файла — быстрого
+пути нет. Пороги действительны только для модели реранкера и чанков, на
+которых подобраны: после их смены калибровку нужно повторить.
+
+Калибровка (из backend/, нужны модели и Qdrant, ЛЛМ не вызывается):
+    uv run python -m src.fast_path --target-accuracy 0.9
+"""
+
+import argparse
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+FAST_PATH_THRESHOLDS = os.getenv("FAST_PATH_THRESHOLDS", "fast_path.json")
+
+TOP_N_DIAGNOSES = 3
+EXPLANATION_MAX_CHARS = 300
+# Меньше стольких запросов выше порогов — точности на них не верим
+MIN_CALIBRATION_SUPPORT = 10
+
+_SENTENCE = re.compile(r"(?<=[.!?;])\s+")
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class FastPathThresholds:
+    min_score: float
+    min_margin: float
+    # Что показала калибровка — для отчёта, в решении не участвует
+    target_accuracy: float = 0.0
+    accuracy: float = 0.0
+    coverage: float = 0.0
+
+    @classmethod
+    def load(cls, path: str = FAST_PATH_THRESHOLDS) -> "FastPathThresholds | None":
+        if not path or not Path(path).is_file():
+            return None
+        return cls(**json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def save(self, path: str) -> None:
+        Path(path).write_text(json.dumps(asdict(self), indent=2), encoding="utf-8")
+
+
+def _stems(text: str) -> set[str]:
+    # Грубая основа слова: первые 5 букв — хватает, чтобы «болит» совпало с «боли»
+    return {w[:5] for w in _WORD.findall(text.lower()) if len(w) > 2}
+
+
+def explanation_snippet(symptoms: str, text: str) -> str:
+    """Предложение чанка с наибольшим пересечением с жалобами (экстрактивное объяснение)."""
+    query = _stems(symptoms)
+    best, best_overlap = "", -1
+    for sentence in _SENTENCE.split(text):
+        overlap = len(query & _stems(sentence))
+        if overlap > best_overlap:
+            best, best_overlap = sentence, overlap
+    best = " ".join(best.split())
+    if len(best) > EXPLANATION_MAX_CHARS:
+        best = best[:EXPLANATION_MAX_CHARS].rsplit(" ", 1)[0] + "…"
+    return best
+
+
+def confidence(ranked: list[tuple[dict, float]]) -> tuple[float, float]:
+    """(счёт лучшего чанка, отрыв от лучшего чанка другого протокола)."""
+    top_payload, top_score = ranked[0]
+    runner_up = next(
+        (score for payload, score in ranked[1:] if payload.get("protocol_id") != top_payload.get("protocol_id")),
+        None,
+    )
+    # Все кандидаты из одного протокола — конкурента нет
+    return top_score, top_score - runner_up if runner_up is not None else float("inf")
+
+
+def build_diagnoses(symptoms: str, ranked: list[tuple[dict, float]]) -> list[dict]:
+    diagnoses, seen = [], set()
+    for payload, _ in ranked:
+        protocol = payload.get("protocol_id")
+        if protocol in seen or not payload.get("icd_codes"):
+            continue
+        seen.add(protocol)
+        diagnoses.append({
+            "rank": len(diagnoses) + 1,
+            "diagnosis": payload.get("title", ""),
+            "icd10_code": payload["icd_codes"][0],
+            "explanation": explanation_snippet(symptoms, payload.get("text", "")),
+        })
+        if len(diagnoses) == TOP_N_DIAGNOSES:
+            break
+    return diagnoses
+
+
+def fast_answer(
+    thresholds: FastPathThresholds | None, symptoms: str, ranked: list[tuple[dict, float]]
+) -> list[dict] | None:
+    """Диагнозы без ЛЛМ или None, если реранкер недостаточно уверен."""
+    if thresholds is None or not ranked:
+        return None
+    score, margin = confidence(ranked)
+    if score < thresholds.min_score or margin < thresholds.min_margin:
+        return None
+    return build_diagnoses(symptoms, ranked) or None
+
+
+# ─── Калибровка ──────────────────────────────────────────────────────────────
+
+def calibrate(samples: list[tuple[float, float, bool]], target_accuracy: float) -> FastPathThresholds | None:
+    """Пороги с наибольшим покрытием, при которых точность на покрытых ≥ target_accuracy.
+
+    samples — (счёт, отрыв, верен ли первый код лучшего протокола) по запросам.
+    """
+    scores = sorted({s for s, _, _ in samples})
+    margins = sorted({m for _, m, _ in samples if m != float("inf")}) + [float("inf")]
+    best = None
+    for min_score in scores:
+        for min_margin in [0.0, *margins]:
+            covered = [ok for s, m, ok in samples if s >= min_score and m >= min_margin]
+            if len(covered) < MIN_CALIBRATION_SUPPORT:
+                continue
+            accuracy = sum(covered) / len(covered)
+            coverage = len(covered) / len(samples)
+            if accuracy >= target_accuracy and (best is None or coverage > best.coverage):
+                best = FastPathThresholds(min_score, min_margin, target_accuracy, round(accuracy, 4), round(coverage, 4))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", type=Path, default=Path("data/test_set"))
+    parser.add_argument("--target-accuracy", type=float, default=0.9)
+    parser.add_argument("--output", default=FAST_PATH_THRESHOLDS)
+    args = parser.parse_args()
+
+    from src.diagnose import Diagnoser
+
+    diagnoser = Diagnoser()
+    diagnoser.warmup()
+    samples = []
+    for path in sorted(args.dataset_dir.glob("*.json")):
+        case = json.loads(path.read_text(encoding="utf-8"))
+        if not case.get("query"):
+            continue
+        ranked = diagnoser._retrieve_scored(case["query"])
+        if not ranked:
+            continue
+        score, margin = confidence(ranked)
+        diagnoses = build_diagnoses(case["query"], ranked)
+        samples.append((score, margin, bool(diagnoses) and diagnoses[0]["icd10_code"] == case["gt"]))
+
+    overall = sum(ok for _, _, ok in samples) / len(samples)
+    print(f"Запросов: {len(samples)}, accuracy@1 быстрого пути на всех: {overall:.3f}")
+    thresholds = calibrate(samples, args.target_accuracy)
+    if thresholds is None:
+        print(f"Нет порогов с точностью ≥ {args.target_accuracy} хотя бы на {MIN_CALIBRATION_SUPPORT} запросах")
+        return
+    thresholds.save(args.output)
+    print(f"min_score={thresholds.min_score:.4f} min_margin={thresholds.min_margin:.4f}: "
+          f"покрытие {thresholds.coverage:.1%}, точность {thresholds.accuracy:.3f} → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
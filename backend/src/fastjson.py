@@ -0,0 +1,34 @@
+"""
+Быстрая JSON-сериализация ответов.
+
+Если установлен orjson, используется он, иначе stdlib json. Вывод в обоих
+случаях — компактный UTF-8 без ASCII-экранирования. splice() вставляет в
+объект уже готовый JSON-фрагмент (например, diagnoses_json из базы) без
+повторного разбора и сериализации.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # окружение без зависимостей проекта (скрипты, старый образ)
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def splice(obj: dict, key: str, raw: bytes | str | None, default: bytes = b"[]") -> bytes:
+    """dumps(obj) с дополнительным полем key, значение которого — готовый JSON."""
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    head = dumps(obj)
+    sep = b"," if len(head) > 2 else b""
+    return head[:-1] + sep + b'"' + key.encode() + b'":' + (raw or default) + b"}"
+
+
+def join_array(items) -> bytes:
+    return b"[" + b",".join(items) + b"]"
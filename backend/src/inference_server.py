@@ -0,0 +1,182 @@
+"""
+Inference-сайдкар: один процесс держит bge-m3 и реранкер, веб-воркеры
+ходят к нему через Unix-сокет вместо того, чтобы грузить веса сами.
+
+Запуск (ключ общий для сайдкара и воркеров):
+    export INFERENCE_AUTHKEY=$(openssl rand -hex 32)
+    uv run python -m src.inference_server
+    INFERENCE_SOCKET=$XDG_RUNTIME_DIR/freaxlab/inference.sock uv run uvicorn src.main:app --workers 8
+
+Протокол — multiprocessing.connection (pickle поверх AF_UNIX с HMAC-авторизацией):
+запрос (op, args, kwargs) → ответ ("ok", result) | ("error", message).
+
+pickle исполняет код при разборе, поэтому сокет должен быть доступен только
+владельцу. Ключ INFERENCE_AUTHKEY обязателен, значения по умолчанию нет.
+Сокет лежит в каталоге с правами 0700 этого пользователя: $XDG_RUNTIME_DIR/freaxlab,
+без него — <tmp>/freaxlab-<uid>. Сайдкар и клиент отказываются работать,
+если каталог чужой или доступен группе или остальным. Сокет создаётся сразу
+с umask 077, а не получает права chmod после bind.
+"""
+
+import argparse
+import os
+import stat
+import tempfile
+import threading
+from multiprocessing.connection import Client, Listener
+
+
+def default_socket() -> str:
+    runtime = os.getenv("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "freaxlab", "inference.sock")
+    return os.path.join(tempfile.gettempdir(), f"freaxlab-{os.getuid()}", "inference.sock")
+
+
+def authkey() -> bytes:
+    key = os.getenv("INFERENCE_AUTHKEY", "")
+    if not key:
+        raise RuntimeError("INFERENCE_AUTHKEY не задан: без общего секрета сайдкар и воркеры не запускаются")
+    return key.encode()
+
+
+def check_private_dir(path: str) -> None:
+    """Каталог сокета: наш, не символическая ссылка, без прав для группы и остальных."""
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f"{path}: каталог сокета должен принадлежать uid {os.getuid()} и иметь права 0700")
+
+
+# ─── Клиент (веб-воркеры) ────────────────────────────────────────────────────
+
+class InferenceClient:
+    """Соединение на поток: Connection не потокобезопасен, а диагнозы идут из пула потоков."""
+
+    def __init__(self, address: str):
+        self.address = address
+        self.authkey = authkey()
+        # Ответы распаковываются pickle — сокет в чужом каталоге мог подменить кто угодно
+        check_private_dir(os.path.dirname(os.path.abspath(address)))
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def call(self, op: str, *args, **kwargs):
+        conn = self._conn()
+        try:
+            conn.send((op, args, kwargs))
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            # Сайдкар перезапустился — переподключаемся один раз
+            self._local.conn = None
+            conn = self._conn()
+            conn.send((op, args, kwargs))
+            status, result = conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Inference server error: {result}")
+        return result
+
+    def embedder(self) -> "RemoteEmbedder":
+        return RemoteEmbedder(self)
+
+    def reranker(self) -> "RemoteReranker":
+        return RemoteReranker(self)
+
+    def pruner(self) -> "RemoteReranker":
+        return RemoteReranker(self, op="prune")
+
+
+class RemoteEmbedder:
+    """Повторяет интерфейс SentenceTransformer.encode, который использует Diagnoser."""
+
+    def __init__(self, client: InferenceClient):
+        self.client = client
+
+    def encode(self, sentences, **kwargs):
+        return self.client.call("encode", sentences, **kwargs)
+
+
+class RemoteReranker:
+    """Повторяет интерфейс CrossEncoder.predict."""
+
+    def __init__(self, client: InferenceClient, op: str = "predict"):
+        self.client = client
+        self.op = op
+
+    def predict(self, pairs, **kwargs):
+        return self.client.call(self.op, pairs, **kwargs)
+
+
+# ─── Сервер (сайдкар) ────────────────────────────────────────────────────────
+
+def _serve_connection(conn, embed_model, reranker, pruner) -> None:
+    handlers = {"encode": embed_model.encode, "predict": reranker.predict}
+    if pruner is not None:
+        handlers["prune"] = pruner.predict
+    with conn:
+        while True:
+            try:
+                op, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                handler = handlers[op]
+                conn.send(("ok", handler(*args, **kwargs)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def serve(address: str) -> None:
+    key = authkey()
+    directory = os.path.dirname(os.path.abspath(address))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    check_private_dir(directory)
+
+    from src.diagnose import get_device, get_embed_model, get_pruner, get_reranker
+    from src.rerank_cascade import RERANK_CASCADE
+
+    device = get_device()
+    embed_model = get_embed_model(device)
+    reranker = get_reranker(device)
+    pruner = get_pruner(device) if RERANK_CASCADE else None
+
+    if os.path.exists(address):
+        os.unlink(address)
+    # Права задаются при создании сокета: между bind и chmod к нему уже можно подключиться
+    umask = os.umask(0o077)
+    try:
+        listener = Listener(address, family="AF_UNIX", authkey=key)
+    finally:
+        os.umask(umask)
+    print(f"Inference server слушает {address} (device={device})")
+
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # Неудачная авторизация одного клиента не должна ронять сайдкар
+                print(f"Отклонено соединение: {e}")
+                continue
+            threading.Thread(
+                target=_serve_connection, args=(conn, embed_model, reranker, pruner), daemon=True
+            ).start()
+    finally:
+        listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Общий inference-процесс для эмбеддингов и реранкинга")
+    parser.add_argument("--socket", default=os.getenv("INFERENCE_SOCKET") or default_socket(),
+                        help="Путь к Unix-сокету (каталог — только для владельца, 0700)")
+    args = parser.parse_args()
+    serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Потоковая загрузка протоколов в Qdrant (db.py --pipeline).
+
+Обычный режим db.py идёт шагами: весь JSONL в память, все чанки и
+эмбеддинги в кэш, затем кэш перечитывается и грузится в Qdrant. Здесь этапы
+работают одновременно и связаны ограниченными очередями:
+
+    чтение JSONL ─▶ пул чанкинга ─▶ энкодер ─▶ потоки загрузки
+                    (CHUNK_WORKERS)  (главный    (UPLOAD_WORKERS)
+                                      поток)
+
+Пока энкодер считает батч, следующие протоколы читаются и режутся на чанки,
+а готовые точки уже летят в Qdrant. В памяти одновременно только содержимое
+очередей, а не весь корпус.
+
+Пул чанкинга — потоки, а не процессы: torch отпускает GIL на время
+инференса, и чанкинг идёт параллельно с ним, а разбор секций
+(src/protocol_sections.py) — десятки МБ/с на ядро, на порядки быстрее
+энкодера. Процессы при spawn заново импортировали бы db.py вместе с torch.
+
+Докачка. Кэш эмбеддингов (--cache) дописывается после каждого батча и
+остаётся контрольной точкой кодирования: чанки с id из кэша повторно не
+считаются. Id загруженных точек дописываются в <кэш>.uploaded после каждого
+upsert. При перезапуске точки из кэша, которых нет в .uploaded, догружаются
+параллельно с новым кодированием. Оборванная последняя строка кэша
+отрезается. Если коллекция пересоздана (точек в ней меньше, чем в
+.uploaded), отметки о загрузке сбрасываются.
+
+Сравнение с пошаговым режимом (время и пиковый RSS) —
+benchmarks/bench_ingest.py.
+"""
+
+import json
+import os
+import queue
+import resource
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from src.chunking import build_chunks, point_id
+
+CHUNK_WORKERS = min(4, os.cpu_count() or 1)
+UPLOAD_WORKERS = 2
+ENCODE_BATCH_SIZE = 16
+UPLOAD_BATCH_SIZE = 256
+
+# Размеры очередей между этапами: протоколов в работе у пула,
+# чанков перед энкодером, батчей точек перед загрузкой
+CHUNK_WINDOW = 4 * CHUNK_WORKERS
+CHUNK_QUEUE_SIZE = 8 * ENCODE_BATCH_SIZE
+UPLOAD_QUEUE_SIZE = 2 * UPLOAD_WORKERS
+
+_DONE = object()
+
+
+def read_records(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def chunk_record(record: dict) -> list[tuple[str, str, dict]] | None:
+    """[(текст для эмбеддинга, id точки, payload)]; None — запись без текста или кодов МКБ."""
+    if not record.get("text", "").strip() or not record.get("icd_codes"):
+        return None
+    return [(text, point_id(record, payload), payload) for text, payload in build_chunks(record)]
+
+
+def bounded_map(executor: Executor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """executor.map с порядком результатов, но не больше window задач в работе.
+
+    Executor.map сразу отправляет все задачи — весь корпус оказался бы в памяти.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def uploaded_path(cache_path: str) -> str:
+    return f"{cache_path}.uploaded"
+
+
+def load_cache_ids(cache_path: str) -> set[str]:
+    """Id точек в кэше эмбеддингов; оборванную последнюю строку отрезает."""
+    ids: set[str] = set()
+    if not Path(cache_path).exists():
+        return ids
+    with open(cache_path, "rb+") as f:
+        good = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            if line.strip():
+                ids.add(json.loads(line)["id"])
+            good += len(line)
+        f.truncate(good)
+    return ids
+
+
+def load_uploaded_ids(client: QdrantClient, cache_path: str, collection_name: str) -> set[str]:
+    path = Path(uploaded_path(cache_path))
+    if not path.exists():
+        return set()
+    ids = {line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip()}
+    if client.count(collection_name=collection_name, exact=True).count < len(ids):
+        print("  Коллекция пересоздана после прошлой загрузки — отметки о загрузке сброшены.")
+        path.unlink()
+        return set()
+    return ids
+
+
+class IngestPipeline:
+    def __init__(
+        self,
+        model,
+        cache_path: str,
+        client: QdrantClient | None,
+        collection_name: str,
+        chunk_workers: int = CHUNK_WORKERS,
+        upload_workers: int = UPLOAD_WORKERS,
+    ):
+        self.model = model
+        self.cache_path = cache_path
+        self.client = client
+        self.collection_name = collection_name
+        self.chunk_workers = chunk_workers
+        self.upload_workers = upload_workers
+
+        self.chunk_q: queue.Queue = queue.Queue(CHUNK_QUEUE_SIZE)
+        self.upload_q: queue.Queue = queue.Queue(UPLOAD_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._errors: list[BaseException] = []
+        # Главный поток упал — чтение и догрузка останавливаются
+        self._stop = threading.Event()
+        self.stats = {
+            "records": 0, "skipped": 0, "chunks": 0, "cached": 0,
+            "encoded": 0, "uploaded": 0, "resumed_uploads": 0,
+            "encode_seconds": 0.0, "upload_seconds": 0.0,
+        }
+
+    # ─── Этапы ───────────────────────────────────────────────────────────────
+
+    def _produce(self, input_path: str, cached_ids: set[str]) -> None:
+        """Чтение и чанкинг: поток кладёт в chunk_q чанки, которых нет в кэше."""
+        try:
+            with ThreadPoolExecutor(self.chunk_workers, thread_name_prefix="ingest-chunk") as pool:
+                for chunks in bounded_map(pool, chunk_record, read_records(input_path), CHUNK_WINDOW):
+                    if self._stop.is_set():
+                        break
+                    self.stats["records"] += 1
+                    if chunks is None:
+                        self.stats["skipped"] += 1
+                        continue
+                    for item in chunks:
+                        self.stats["chunks"] += 1
+                        if item[1] in cached_ids:
+                            self.stats["cached"] += 1
+                            continue
+                        self.chunk_q.put(item)
+        except BaseException as e:
+            self._errors.append(e)
+        finally:
+            self.chunk_q.put(_DONE)
+
+    def _backfill(self, pending: set[str]) -> None:
+        """Точки из кэша, которые закодированы, но не загружены в прошлый раз.
+
+        Энкодер в это время дописывает кэш: берём только id, известные до старта.
+        """
+        if not pending:
+            return
+        batch = []
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                for line in f:
+                    if not pending or self._stop.is_set():
+                        break
+                    row = json.loads(line)
+                    if row["id"] not in pending:
+                        continue
+                    pending.discard(row["id"])
+                    batch.append(PointStruct(id=row["id"], vector=row["vector"], payload=row["payload"]))
+                    if len(batch) >= UPLOAD_BATCH_SIZE:
+                        self._enqueue_upload(batch, resumed=True)
+                        batch = []
+            if batch:
+                self._enqueue_upload(batch, resumed=True)
+        except BaseException as e:
+            self._errors.append(e)
+
+    def _enqueue_upload(self, points: list[PointStruct], resumed: bool = False) -> None:
+        if resumed:
+            self.stats["resumed_uploads"] += len(points)
+        self.upload_q.put(points)
+
+    def _upload(self) -> None:
+        with open(uploaded_path(self.cache_path), "a", encoding="utf-8") as checkpoint:
+            while True:
+                points = self.upload_q.get()
+                if points is _DONE:
+                    return
+                if self._errors:
+                    continue  # дочитываем очередь, чтобы не встали остальные этапы
+                try:
+                    start = time.perf_counter()
+                    self.client.upsert(collection_name=self.collection_name, points=points)
+                    with self._lock:
+                        self.stats["upload_seconds"] += time.perf_counter() - start
+                        self.stats["uploaded"] += len(points)
+                        checkpoint.write("".join(f"{p.id}\n" for p in points))
+                        checkpoint.flush()
+                except Exception as e:
+                    self._errors.append(e)
+
+    def _encode(self, cache_f) -> None:
+        """Главный поток: батчи чанков → эмбеддинги → кэш и очередь загрузки."""
+        batch: list[tuple[str, str, dict]] = []
+        points: list[PointStruct] = []
+        done = False
+        while not done:
+            item = self.chunk_q.get()
+            if item is _DONE:
+                done = True
+            else:
+                batch.append(item)
+            if batch and (done or len(batch) >= ENCODE_BATCH_SIZE):
+                start = time.perf_counter()
+                # bge-m3 не требует префиксов "passage:" при индексировании
+                vectors = self.model.encode(
+                    [text for text, _, _ in batch],
+                    show_progress_bar=False,
+                    normalize_embeddings=True,
+                    batch_size=ENCODE_BATCH_SIZE,
+                    prompt_name="document",
+                )
+                self.stats["encode_seconds"] += time.perf_counter() - start
+                for (_, chunk_id, payload), vector in zip(batch, vectors):
+                    vector = vector.tolist()
+                    row = {"id": chunk_id, "vector": vector, "payload": payload}
+                    cache_f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    # Без загрузчика (--encode-only, --lexical-only) точки не копим — только кэш
+                    if self.client is not None:
+                        points.append(PointStruct(id=chunk_id, vector=vector, payload=payload))
+                # Сначала кэш на диск, потом загрузка: в .uploaded не попадёт то, чего нет в кэше
+                cache_f.flush()
+                self.stats["encoded"] += len(batch)
+                batch = []
+            if self.client is not None and points and (done or len(points) >= UPLOAD_BATCH_SIZE):
+                self._enqueue_upload(points)
+                points = []
+            if self._errors:
+                raise self._errors[0]
+
+    # ─── Запуск ──────────────────────────────────────────────────────────────
+
+    def run(self, input_path: str) -> dict:
+        started = time.perf_counter()
+        cached_ids = load_cache_ids(self.cache_path)
+        if cached_ids:
+            print(f"Найден кэш: {len(cached_ids)} точек, докодируем остальные...")
+
+        threads = [threading.Thread(target=self._produce, args=(input_path, cached_ids), daemon=True)]
+        uploaders = []
+        if self.client is not None:
+            uploaded_ids = load_uploaded_ids(self.client, self.cache_path, self.collection_name)
+            threads.append(threading.Thread(target=self._backfill, args=(cached_ids - uploaded_ids,), daemon=True))
+            uploaders = [threading.Thread(target=self._upload, daemon=True) for _ in range(self.upload_workers)]
+        for t in threads + uploaders:
+            t.start()
+
+        try:
+            with open(self.cache_path, "a", encoding="utf-8") as cache_f:
+                self._encode(cache_f)
+        except BaseException:
+            # Чтение могло встать на полной очереди — разгружаем её, пока поток не выйдет
+            self._stop.set()
+            while threads[0].is_alive():
+                try:
+                    self.chunk_q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            raise
+        finally:
+            for t in threads:
+                t.join()
+            for _ in uploaders:
+                self.upload_q.put(_DONE)
+            for t in uploaders:
+                t.join()
+        if self._errors:
+            raise self._errors[0]
+
+        return {
+            **{k: round(v, 1) if isinstance(v, float) else v for k, v in self.stats.items()},
+            "seconds": round(time.perf_counter() - started, 1),
+            # Linux: ru_maxrss в КБ
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        }
+
+
+def run_pipeline(
+    input_path: str,
+    model,
+    cache_path: str,
+    client: QdrantClient | None,
+    collection_name: str,
+    chunk_workers: int = CHUNK_WORKERS,
+    upload_workers: int = UPLOAD_WORKERS,
+) -> dict:
+    """Чтение, чанкинг, эмбеддинги и загрузка одновременно. client=None — только кэш."""
+    pipeline = IngestPipeline(model, cache_path, client, collection_name, chunk_workers, upload_workers)
+    return pipeline.run(input_path)
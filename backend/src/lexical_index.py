@@ -0,0 +1,182 @@
+"""
+Лексический индекс по чанкам протоколов (BM25 по символьным n-граммам),
+отображаемый в память (mmap). Поиск без torch и эмбеддингов — для
+DiagnoserLight.
+
+Термы — n-граммы символов внутри слов (с границами слова, как char_wb в
+sklearn): у «болит» и «боль» общая « бол», так что падежи и казахские
+окончания не мешают совпадению. Длину n-граммы, порог df и число термов
+запроса подобрали на data/test_set (benchmarks/bench_lexical_retrieval.py). N-грамма хранится как crc32 от
+UTF-8, редкие коллизии только чуть смешивают веса. BM25-вес каждого вхождения
+посчитан при построении, поиск — сумма весов по спискам документов:
+np.bincount по склеенным спискам и argpartition.
+
+Файл строит db.py из chunk store (документ = строка chunk store), формат
+(little-endian):
+    b"FXLEXIX1" | u32 длина JSON-заголовка | JSON-заголовок | секции (выровнены по 8 байт)
+
+Секции:
+    terms     t × u32        crc32 термов, отсортированы (поиск — бинарный)
+    ptr       (t+1) × u64    границы списков документов терма
+    docs      p × u32        номера документов в списках
+    weights   p × f16        BM25-вес терма в документе
+    rows      n × u32        номер документа → строка chunk store
+"""
+
+import json
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from src.chunk_store import ChunkStore, _align
+
+MAGIC = b"FXLEXIX1"
+
+NGRAM_SIZES = (4,)
+K1 = 1.2
+B = 0.75
+# Термы, которые есть больше чем в такой доле документов, почти не различают
+# протоколы, а их списки — самые длинные; в индекс не попадают
+MAX_DF_RATIO = 0.05
+# Из очень длинного запроса берутся самые редкие термы: частые дороги
+# и почти не влияют на порядок
+MAX_QUERY_TERMS = 400
+
+_WORD = re.compile(r"\w+")
+
+
+def ngrams(text: str) -> list[str]:
+    grams = []
+    for word in _WORD.findall(text.replace("ё", "е").replace("Ё", "Е").casefold()):
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            if len(padded) <= n:
+                grams.append(padded)
+                break
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def term_hash(gram: str) -> int:
+    return zlib.crc32(gram.encode("utf-8"))
+
+
+def document_text(payload: dict) -> str:
+    # Как в паре для реранкера: название протокола + текст чанка
+    return f"{payload.get('title', '')} {payload.get('text', '')}"
+
+
+# ─── Построение ──────────────────────────────────────────────────────────────
+
+def build_lexical_index(chunk_store_path: str, index_path: str, chunk_types: list[str] | None = None) -> int:
+    """Строит индекс по чанкам из chunk store (db.py). Возвращает число документов."""
+    store = ChunkStore(chunk_store_path)
+    rows: list[int] = []
+    lengths: list[int] = []
+    postings: dict[int, list[tuple[int, int]]] = {}
+    for row in range(len(store)):
+        payload = store.payload_at(row)
+        if chunk_types and payload.get("chunk_type") not in chunk_types:
+            continue
+        doc = len(rows)
+        grams = ngrams(document_text(payload))
+        rows.append(row)
+        lengths.append(len(grams))
+        for term, tf in Counter(term_hash(g) for g in grams).items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    n_docs = len(rows)
+    avg_len = (sum(lengths) / n_docs) if n_docs else 1.0
+    norm = K1 * (1 - B + B * np.asarray(lengths, dtype=np.float64) / avg_len)
+    max_df = max(1, int(MAX_DF_RATIO * n_docs))
+
+    terms = sorted(t for t, plist in postings.items() if len(plist) <= max_df)
+    ptr = np.zeros(len(terms) + 1, dtype="<u8")
+    doc_parts, weight_parts = [], []
+    for i, term in enumerate(terms):
+        plist = np.asarray(postings[term], dtype=np.int64)
+        docs, tf = plist[:, 0], plist[:, 1].astype(np.float64)
+        df = len(docs)
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        doc_parts.append(docs.astype("<u4"))
+        weight_parts.append((idf * tf * (K1 + 1) / (tf + norm[docs])).astype("<f2"))
+        ptr[i + 1] = ptr[i] + df
+
+    sections = {
+        "terms": np.asarray(terms, dtype="<u4").tobytes(),
+        "ptr": ptr.tobytes(),
+        "docs": (np.concatenate(doc_parts) if doc_parts else np.zeros(0, "<u4")).tobytes(),
+        "weights": (np.concatenate(weight_parts) if weight_parts else np.zeros(0, "<f2")).tobytes(),
+        "rows": np.asarray(rows, dtype="<u4").tobytes(),
+    }
+
+    # Та же раскладка, что у chunk store: ширина под смещения зарезервирована в заголовке
+    layout = {name: [0, len(data)] for name, data in sections.items()}
+    header = {"count": n_docs, "terms": len(terms), "ngrams": list(NGRAM_SIZES), "sections": layout}
+    header_len = len(json.dumps(header).encode()) + 16 * len(sections)
+    offset = _align(len(MAGIC) + 4 + header_len)
+    for name, data in sections.items():
+        layout[name][0] = offset
+        offset = _align(offset + len(data))
+    header_bytes = json.dumps(header).encode().ljust(header_len)
+
+    with open(index_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(4, "little"))
+        f.write(header_bytes)
+        for name, data in sections.items():
+            f.seek(layout[name][0])
+            f.write(data)
+    return n_docs
+
+
+# ─── Чтение ──────────────────────────────────────────────────────────────────
+
+class LexicalIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._mm[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path}: не похоже на лексический индекс")
+        header_len = int.from_bytes(bytes(self._mm[8:12]), "little")
+        header = json.loads(bytes(self._mm[12:12 + header_len]))
+        if tuple(header["ngrams"]) != NGRAM_SIZES:
+            raise ValueError(f"{path}: индекс построен с n-граммами {header['ngrams']}, нужно {NGRAM_SIZES}")
+        self.count = header["count"]
+        sec = {name: self._mm[off:off + size] for name, (off, size) in header["sections"].items()}
+
+        self._terms = sec["terms"].view("<u4")
+        self._ptr = sec["ptr"].view("<u8")
+        self._docs = sec["docs"].view("<u4")
+        self._weights = sec["weights"].view("<f2")
+        self._rows = sec["rows"].view("<u4")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        """Top-k документов по BM25: [(строка chunk store, счёт)] по убыванию счёта."""
+        hashes = np.unique(np.fromiter((term_hash(g) for g in ngrams(query)), dtype=np.uint32))
+        pos = np.searchsorted(self._terms, hashes)
+        found = pos < len(self._terms)
+        found[found] = self._terms[pos[found]] == hashes[found]
+        pos = pos[found]
+        if not len(pos):
+            return []
+        starts, ends = self._ptr[pos].astype(np.int64), self._ptr[pos + 1].astype(np.int64)
+        if len(pos) > MAX_QUERY_TERMS:
+            rarest = np.argsort(ends - starts, kind="stable")[:MAX_QUERY_TERMS]
+            starts, ends = starts[rarest], ends[rarest]
+
+        docs = np.concatenate([self._docs[s:e] for s, e in zip(starts, ends)])
+        weights = np.concatenate([self._weights[s:e] for s, e in zip(starts, ends)])
+        scores = np.bincount(docs, weights=weights.astype(np.float32), minlength=self.count)
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self._rows[d]), float(scores[d])) for d in top]
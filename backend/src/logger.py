@@ -1,11 +1,171 @@
+"""
+Логи сервиса: записи уходят в очередь, в stdout их пишет отдельный поток.
+
+Синхронная запись в stdout из event loop под нагрузкой добавляла задержку
+каждому запросу. Теперь logger.* только кладёт запись в ограниченную очередь
+(QueueHandler), а QueueListener в фоновом потоке форматирует её и пишет. Если
+очередь переполнена, запись отбрасывается и считается в dropped, но запрос не
+ждёт. Логгеры uvicorn (если он их уже настроил) пишут через ту же очередь.
+
+Формат — LOG_FORMAT: json (по умолчанию, одна JSON-строка на запись) или
+text (прежний, для локальной разработки). В запись попадает id запроса из
+contextvar request_id, его ставит src/api/request_log.py. Поэтому строки
+ml_service, сервисов БД и обработчика ошибок одного запроса связаны между
+собой. Поля из extra={"fields": {...}} — отдельные ключи JSON.
+
+Тайминги стадий запроса (stage) и флаги (note) копятся в RequestTrace
+текущего запроса. Вне запроса (прогрев, фоновые задачи, CLI) они ничего не
+делают. Итоговую строку на запрос пишет тот же middleware.
+"""
+
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
 import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+
+# ─── Контекст запроса ────────────────────────────────────────────────────────
+
+class RequestTrace:
+    """Суммарное время стадий (сек) и флаги одного запроса."""
+
+    __slots__ = ("stages", "flags")
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.flags: dict[str, object] = {}
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.flags[name] = self.flags.get(name, 0) + n
+
+
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+request_trace: ContextVar[RequestTrace | None] = ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Время блока в стадию name текущего запроса (повторы суммируются)."""
+    trace = request_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.stages[name] = trace.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def note(**flags) -> None:
+    """Флаги текущего запроса для итоговой строки: путь диагноза, попадания в кэши."""
+    trace = request_trace.get()
+    if trace is not None:
+        trace.flags.update(flags)
+
+
+# ─── Форматы ─────────────────────────────────────────────────────────────────
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", None)
+        if rid is not None:
+            entry["request_id"] = rid
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(TEXT_FORMAT, defaults={"request_id": "-"})
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+# ─── Очередь ─────────────────────────────────────────────────────────────────
+
+class RequestQueueHandler(QueueHandler):
+    """QueueHandler, который не блокирует и помечает запись id запроса."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # В потоке вызова: contextvars и аргументы сообщения доступны только здесь
+        record = copy.copy(record)
+        rid = request_id.get()
+        if rid is not None:
+            record.request_id = rid
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_exc_formatter = logging.Formatter()
+_stream = logging.StreamHandler(sys.stdout)
+_stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+queue_handler = RequestQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+_listener = QueueListener(queue_handler.queue, _stream)
+
+
+def _restart_in_child() -> None:
+    # serve_preload форкает воркеры после импорта: поток записи в потомок не
+    # переходит, а замки очереди могли остаться захваченными — всё заново
+    global _listener
+    queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = QueueListener(queue_handler.queue, _stream)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    # Дописывает то, что осталось в очереди
+    _listener.stop()
+
+
+logging.basicConfig(level=LOG_LEVEL, handlers=[queue_handler])
+# uvicorn настраивает свои логгеры до импорта приложения — переводим их на очередь
+for _name in ("uvicorn", "uvicorn.access"):
+    if logging.getLogger(_name).handlers:
+        logging.getLogger(_name).handlers = [queue_handler]
 
-# Настраиваем формат и уровень
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    stream=sys.stdout
-)
+_listener.start()
+atexit.register(_stop_listener)
+os.register_at_fork(after_in_child=_restart_in_child)
 
 logger = logging.getLogger("qazcode_backend")
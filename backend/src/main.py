@@ -1,18 +1,26 @@
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
 from src.config import settings
 from src.database import init_db
-from src.logger import logger
+from src.logger import logger, queue_handler
+from src.api.request_log import REQUEST_ID_HEADER, RequestLogMiddleware
+from src.api.static_site import StaticSite
+from src.api.responses import report_diagnosis_path
+from src.services.errors import ServiceUnavailableError
+from src.services import export_cache
+from src.services.admission import Priority
+from src.services.body_map_answers import BodyMapAnswers
+from src.services.maintenance import MaintenanceTask
 from src.services.ml_service import MedicalDiagnosisService
+from src.services.password_service import password_hasher
 
-from src.api.endpoints import auth, chat, history, export, body_map
+from src.api.endpoints import auth, chat, history, export, body_map, debug
 
 STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
 
@@ -33,10 +41,19 @@ async def lifespan(app: FastAPI):
     logger.info("Server startup: Initializing database...")
     await init_db()
     logger.info("Database initialized.")
-    logger.info("Server startup: Initializing services...")
+    logger.info("Server startup: Loading ML services in background...")
     app.state.ml_service = MedicalDiagnosisService()
-    logger.info("MedicalDiagnosisService initialized successfully.")
+    app.state.ml_service.start()
+    app.state.maintenance = MaintenanceTask()
+    app.state.maintenance.start()
+    app.state.body_map_answers = BodyMapAnswers(app.state.ml_service)
+    app.state.body_map_answers.start()
     yield
+    await app.state.body_map_answers.stop()
+    await app.state.maintenance.stop()
+    await app.state.ml_service.stop()
+    export_cache.shutdown()
+    password_hasher.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -46,17 +63,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Diagnosis-Path", REQUEST_ID_HEADER],
 )
+# Последним — значит снаружи: время запроса целиком, id виден и в CORS-ответах
+app.add_middleware(RequestLogMiddleware)
 
 app.include_router(auth.router)
 app.include_router(chat.router)
 app.include_router(history.router)
 app.include_router(export.router)
 app.include_router(body_map.router)
+if debug.ENABLED:
+    app.include_router(debug.router)
+
+@app.exception_handler(ServiceUnavailableError)
+async def service_unavailable_handler(request: Request, exc: ServiceUnavailableError):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception during request processing: {exc}")
+    logger.error(f"Unhandled exception during request processing: {exc}", exc_info=exc)
     return JSONResponse(
         status_code=500,
         content={"detail": "Internal Server Error", "error": str(exc)}
@@ -64,20 +94,37 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 @app.get("/health")
 async def health():
+    # Liveness: процесс жив и принимает запросы, модели могут ещё грузиться
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready(request: Request):
+    ml_service: MedicalDiagnosisService = request.app.state.ml_service
+    readiness = ml_service.readiness()
+    # Заглушка не должна получать трафик: 503 и при loading, и при degraded
+    return JSONResponse(status_code=200 if readiness["status"] == "ready" else 503, content=readiness)
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    ml_service: MedicalDiagnosisService = request.app.state.ml_service
+    return {
+        **ml_service.metrics(),
+        "password_hashing": password_hasher.metrics(),
+        "body_map_answers": request.app.state.body_map_answers.metrics(),
+        "logging": {"dropped": queue_handler.dropped},
+    }
+
 @app.post("/diagnose", response_model=DiagnoseResponse)
-async def diagnose(request_data: DiagnoseRequest, request: Request):
+async def diagnose(request_data: DiagnoseRequest, request: Request, response: Response):
     ml_service: MedicalDiagnosisService = request.app.state.ml_service
-    diagnoses = await ml_service.predict(request_data.symptoms)
+    diagnoses = await ml_service.predict(request_data.symptoms, priority=Priority.BATCH)
+    report_diagnosis_path(response)
     return DiagnoseResponse(diagnoses=diagnoses)
 
 if STATIC_DIR.is_dir():
-    app.mount("/assets", StaticFiles(directory=STATIC_DIR / "assets"), name="assets")
+    # Манифест сборки в памяти: сжатые варианты, ETag, кэш для assets/ (src/api/static_site.py)
+    static_site = StaticSite(STATIC_DIR)
 
     @app.get("/{full_path:path}")
-    async def serve_spa(full_path: str):
-        file_path = STATIC_DIR / full_path
-        if file_path.is_file():
-            return FileResponse(file_path)
-        return FileResponse(STATIC_DIR / "index.html")
+    async def serve_spa(full_path: str, request: Request):
+        return static_site.response(request, full_path)
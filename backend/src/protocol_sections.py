@@ -0,0 +1,154 @@
+"""
+Разбор клинического протокола на секции за один проход.
+
+Раньше db.py искал симптомы, диагностику и лечение тремя большими
+регулярками с ленивым телом (.*?) и альтернативами в lookahead'е плюс
+отдельным поиском названия протокола: на каждом символе тела проверялась
+каждая альтернатива конца секции, и так для каждой из секций.
+
+Здесь текст сканируется один раз: одна регулярка из lookahead'ов находит все
+метки (ключевые слова начала секций, «лечение», «профилактика», заголовок
+протокола и строки-заголовки «1.1», «II», «VI»), включая перекрывающиеся,
+например «диагностики» внутри «критерии диагностики». Из меток строится
+оглавление (римские заголовки — верхний уровень, «1.1» — вложенный) и
+смещения секций; текст секции вырезается только при выдаче, один раз.
+
+Результат совпадает со старыми регулярками символ в символ, включая их
+причуды: IGNORECASE для римских цифр (строка «\\nI » — тоже заголовок), конец
+диагностики на первом «лечение» где угодно, а не только в заголовке.
+Проверка совпадения и пропускная способность (МБ/с) —
+benchmarks/bench_section_parser.py.
+"""
+
+import re
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Iterator
+
+MAX_CHARS_PER_SECTION = 5000
+
+# Каждая метка — lookahead: поиск проверяет каждую позицию и находит метки,
+# которые перекрываются. В одной позиции может начинаться только одна метка:
+# первые буквы альтернатив различаются. Первый lookahead — первые две буквы
+# всех меток: на остальных позициях альтернативы не перебираются (так вдвое быстрее).
+_MARKERS = re.compile(
+    r"(?=[жкдлимхп\n][аелрин\s\dIV])"
+    r"(?=(?:"
+    r"(?P<title>КЛИНИЧЕСКИЙ ПРОТОКОЛ ДИАГНОСТИКИ И ЛЕЧЕНИЯ\s+(?P<name>[^\n]{5,150}))"
+    r"|(?P<symptoms>жалоб[ыи]|клинические\s+критерии|критерии\s+диагностики|клиническая\s+картина)"
+    r"|(?P<diagnosis>диагностик[аи]|лабораторн|инструментальн)"
+    r"|(?P<cure>лечение)"
+    r"|(?P<treatment>медикаментозн|хирургическ)"
+    r"|(?P<prevention>профилактика)"
+    r"|(?P<heading>\n(?:\s*\d+\.\d+\s|I{1,3}V?\b|VII?\b|V{1,3}\b))"
+    r"))",
+    re.IGNORECASE,
+)
+
+# Какие концы секций даёт строка-заголовок (флаги как у _MARKERS)
+_NUMBERED = re.compile(r"\n\s*\d+\.\d+\s")
+_ROMAN_I = re.compile(r"\n(?:I{1,3}V?|VII?)\b", re.IGNORECASE)   # I–IV, VI, VII
+_ROMAN_V = re.compile(r"\n(?:V{1,3}|VII?)\b", re.IGNORECASE)      # V–VII
+
+SECTION_KEYS = ("symptoms", "diagnosis", "treatment")
+
+
+@dataclass
+class Heading:
+    start: int          # позиция "\n" перед заголовком
+    end: int            # конец раздела: следующий заголовок того же или верхнего уровня
+    level: int          # 1 — римский, 2 — «1.1»
+    children: list["Heading"] = field(default_factory=list)
+
+
+@dataclass
+class ProtocolLayout:
+    """Смещения меток в тексте протокола. Сам текст не копируется."""
+    text: str
+    name: str | None = None
+    # Начало тела секции (сразу после ключевого слова первого вхождения)
+    starts: dict[str, int] = field(default_factory=dict)
+    # Позиции, на которых заканчиваются тела секций
+    numbered: list[int] = field(default_factory=list)
+    roman_i: list[int] = field(default_factory=list)
+    roman_v: list[int] = field(default_factory=list)
+    cure: list[int] = field(default_factory=list)
+    prevention: list[int] = field(default_factory=list)
+
+    def _stops(self, key: str) -> tuple[list[int], ...]:
+        if key == "symptoms":
+            return self.numbered, self.roman_i
+        if key == "diagnosis":
+            return self.roman_i, self.cure
+        return self.roman_v, self.prevention
+
+    def span(self, key: str) -> tuple[int, int] | None:
+        """(начало, конец) тела секции или None, если ключевого слова нет."""
+        start = self.starts.get(key)
+        if start is None:
+            return None
+        end = len(self.text)
+        for positions in self._stops(key):
+            # Позиции возрастают: первая не раньше начала тела
+            i = bisect_left(positions, start)
+            if i < len(positions):
+                end = min(end, positions[i])
+        return start, end
+
+    def spans(self) -> Iterator[tuple[str, int, int]]:
+        for key in SECTION_KEYS:
+            span = self.span(key)
+            if span is not None:
+                yield key, *span
+
+    def outline(self) -> list[Heading]:
+        """Дерево заголовков: римские разделы с вложенными «1.1»."""
+        # «1.1» и римский заголовок на одной строке не сходятся: после "\n" цифра или буква
+        headings = sorted([(pos, 2) for pos in self.numbered] + [(pos, 1) for pos in {*self.roman_i, *self.roman_v}])
+        roots: list[Heading] = []
+        stack: list[Heading] = []
+        for pos, level in headings:
+            while stack and stack[-1].level >= level:
+                stack.pop().end = pos
+            node = Heading(pos, len(self.text), level)
+            (stack[-1].children if stack else roots).append(node)
+            stack.append(node)
+        return roots
+
+
+def parse_protocol(text: str) -> ProtocolLayout:
+    layout = ProtocolLayout(text)
+    for m in _MARKERS.finditer(text):
+        kind = m.lastgroup
+        if kind == "heading":
+            pos = m.start()
+            if _NUMBERED.match(text, pos):
+                layout.numbered.append(pos)
+            if _ROMAN_I.match(text, pos):
+                layout.roman_i.append(pos)
+            if _ROMAN_V.match(text, pos):
+                layout.roman_v.append(pos)
+        elif kind == "title":
+            if layout.name is None:
+                layout.name = m.group("name").strip()
+        elif kind == "cure":
+            layout.cure.append(m.start())
+            layout.starts.setdefault("treatment", m.end(kind))
+        elif kind == "prevention":
+            layout.prevention.append(m.start())
+        else:
+            layout.starts.setdefault(kind, m.end(kind))
+    return layout
+
+
+def section_text(text: str, start: int, end: int, limit: int = MAX_CHARS_PER_SECTION) -> str:
+    """То же, что text[start:end].strip()[:limit], без копии всего хвоста протокола."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return text[start:min(end, start + limit)]
+
+
+def extract_sections(text: str, limit: int = MAX_CHARS_PER_SECTION) -> dict[str, str]:
+    return {key: section_text(text, start, end, limit) for key, start, end in parse_protocol(text).spans()}
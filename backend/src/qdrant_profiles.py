@@ -0,0 +1,96 @@
+"""
+Профили производительности коллекции Qdrant.
+
+Профиль задаёт, как хранить вектора (float32/float16, RAM/диск), нужна ли
+int8-квантизация и как настроить HNSW. db.py применяет его при создании
+коллекции (--profile), Diagnoser — при поиске (QDRANT_PROFILE), чтобы
+hnsw_ef и rescoring совпадали с тем, как коллекция построена.
+"""
+
+from dataclasses import dataclass
+
+from qdrant_client.models import (
+    Datatype,
+    Distance,
+    HnswConfigDiff,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+)
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    description: str
+    datatype: Datatype | None = None   # None → float32
+    on_disk: bool = False              # оригинальные вектора в mmap-файлах, а не в RAM
+    int8: bool = False                 # скалярная int8-квантизация (всегда в RAM)
+    m: int | None = None               # HNSW: связность графа
+    ef_construct: int | None = None    # HNSW: точность построения
+    hnsw_ef: int | None = None         # HNSW: ef при поиске
+    oversampling: float = 2.0          # сколько кандидатов пересчитывать по оригиналам
+
+    def vectors_config(self, size: int) -> VectorParams:
+        return VectorParams(
+            size=size,
+            distance=Distance.COSINE,
+            on_disk=self.on_disk or None,
+            datatype=self.datatype,
+        )
+
+    def hnsw_config(self) -> HnswConfigDiff | None:
+        if self.m is None and self.ef_construct is None:
+            return None
+        return HnswConfigDiff(m=self.m, ef_construct=self.ef_construct)
+
+    def quantization_config(self) -> ScalarQuantization | None:
+        if not self.int8:
+            return None
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+
+    def search_params(self) -> SearchParams | None:
+        if not self.int8 and self.hnsw_ef is None:
+            return None
+        quantization = (
+            QuantizationSearchParams(rescore=True, oversampling=self.oversampling)
+            if self.int8 else None
+        )
+        return SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+
+COLLECTION_PROFILES: dict[str, CollectionProfile] = {
+    "default": CollectionProfile(
+        "float32 в RAM, HNSW по умолчанию (как раньше)",
+    ),
+    "float16": CollectionProfile(
+        "float16-вектора в RAM: вдвое меньше памяти",
+        datatype=Datatype.FLOAT16,
+    ),
+    "int8": CollectionProfile(
+        "int8-квантизация в RAM, float32-оригиналы на диске, rescoring x2",
+        on_disk=True,
+        int8=True,
+    ),
+    "int8-fast": CollectionProfile(
+        "int8 + плотный HNSW (m=32, ef_construct=256) и ef=64 при поиске",
+        on_disk=True,
+        int8=True,
+        m=32,
+        ef_construct=256,
+        hnsw_ef=64,
+    ),
+}
+
+
+def get_profile(name: str) -> CollectionProfile:
+    try:
+        return COLLECTION_PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Неизвестный профиль коллекции '{name}', доступны: {', '.join(COLLECTION_PROFILES)}"
+        ) from None
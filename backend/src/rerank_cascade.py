@@ -0,0 +1,113 @@
+"""
+Каскадный реранкинг с адаптивной глубиной.
+
+Раньше bge-reranker-v2-m3 (max_length 512) считал все 30 кандидатов
+плотного поиска. Это самый дорогой шаг на CPU, даже когда по плотным оценкам
+ответ очевиден. Теперь реранкинг идёт в три шага:
+
+  1. Глубина. Кандидатов берём столько, сколько их лежит в пределах
+     RERANK_DEPTH_MARGIN от лучшей плотной оценки (косинус), но не меньше
+     RERANK_MIN_DEPTH. Крутой верх — меньше кандидатов. 0 — все найденные.
+  2. Отсев. Маленький многоязычный cross-encoder (RERANK_PRUNE_MODEL)
+     оставляет RERANK_PRUNE_KEEP лучших. Включается RERANK_CASCADE=1.
+  3. Большой реранкер считает только оставшихся. Отсеянные в выдачу не попадают.
+
+Шаги 1 и 2 включаются независимо. Пороги быстрого пути (src/fast_path.py)
+считаются по оценкам большого реранкера среди оставшихся, поэтому после
+смены настроек каскада их стоит откалибровать заново. Recall и CPU-время на
+запрос для сетки настроек — benchmarks/bench_rerank_cascade.py.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Sequence
+
+RERANK_CASCADE = os.getenv("RERANK_CASCADE", "0") == "1"
+PRUNE_MODEL = os.getenv("RERANK_PRUNE_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+PRUNE_MAX_LENGTH = int(os.getenv("RERANK_PRUNE_MAX_LENGTH", "256"))
+PRUNE_KEEP = int(os.getenv("RERANK_PRUNE_KEEP", "10"))
+DEPTH_MARGIN = float(os.getenv("RERANK_DEPTH_MARGIN", "0"))
+MIN_DEPTH = int(os.getenv("RERANK_MIN_DEPTH", "10"))
+
+
+class RerankCascade:
+    def __init__(
+        self,
+        reranker,
+        pruner=None,
+        keep: int = PRUNE_KEEP,
+        depth_margin: float = DEPTH_MARGIN,
+        min_depth: int = MIN_DEPTH,
+    ):
+        # pruner=None — без отсева, большой реранкер считает всех кандидатов
+        self.reranker = reranker
+        self.pruner = pruner
+        self.keep = keep
+        self.depth_margin = depth_margin
+        self.min_depth = min_depth
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.found = 0
+        self.candidates = 0
+        self.reranked = 0
+        self.prune_seconds = 0.0
+        self.rerank_seconds = 0.0
+
+    def depth(self, dense_scores: Sequence[float]) -> int:
+        """Сколько кандидатов отдать реранкингу. Оценки Qdrant идут по убыванию."""
+        with self._lock:
+            self.found += len(dense_scores)
+        if self.depth_margin <= 0 or not dense_scores:
+            return len(dense_scores)
+        floor = dense_scores[0] - self.depth_margin
+        within = sum(1 for score in dense_scores if score >= floor)
+        return min(len(dense_scores), max(self.min_depth, within))
+
+    def rank(
+        self,
+        pairs: list[list[str]],
+        rerank: Callable[[list[int]], Sequence[float]] | None = None,
+    ) -> list[tuple[int, float]]:
+        """[(индекс пары, оценка большого реранкера)] по убыванию; отсеянных пар нет.
+
+        rerank(индексы оставшихся пар) заменяет reranker.predict, например
+        по заранее токенизированным документам (src/rerank_tokens.py).
+        """
+        if not pairs:
+            return []
+        survivors = list(range(len(pairs)))
+        start = time.perf_counter()
+        if self.pruner is not None and len(pairs) > self.keep:
+            coarse = self.pruner.predict(pairs)
+            survivors = sorted(survivors, key=lambda i: coarse[i], reverse=True)[: self.keep]
+        pruned = time.perf_counter()
+        if rerank is not None:
+            scores = rerank(survivors)
+        else:
+            scores = self.reranker.predict([pairs[i] for i in survivors])
+        done = time.perf_counter()
+
+        with self._lock:
+            self.requests += 1
+            self.candidates += len(pairs)
+            self.reranked += len(survivors)
+            self.prune_seconds += pruned - start
+            self.rerank_seconds += done - pruned
+        order = sorted(range(len(survivors)), key=lambda k: scores[k], reverse=True)
+        return [(survivors[k], float(scores[k])) for k in order]
+
+    def metrics(self) -> dict:
+        with self._lock:
+            n = self.requests or 1
+            return {
+                "prune": self.pruner is not None,
+                "depth_margin": self.depth_margin,
+                "requests": self.requests,
+                "avg_found": round(self.found / n, 1),
+                "avg_candidates": round(self.candidates / n, 1),
+                "avg_reranked": round(self.reranked / n, 1),
+                "prune_ms": round(self.prune_seconds * 1000 / n, 1),
+                "rerank_ms": round(self.rerank_seconds * 1000 / n, 1),
+            }
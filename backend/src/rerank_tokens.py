@@ -0,0 +1,269 @@
+"""
+Заранее токенизированные документы чанков для реранкера.
+
+Реранкер получает пары [симптомы, "ПРОТОКОЛ: {title}. СОДЕРЖАНИЕ: {text}"].
+CrossEncoder.predict на каждый запрос заново токенизировал все документы, хотя
+они не меняются между запросами. Теперь db.py сохраняет token ids документа
+каждого чанка, обрезанные до бюджета, в компактный файл (rerank_tokens.bin).
+В запросе токенизируется только текст симптомов, и то один раз. Входные
+тензоры <s> запрос </s></s> документ </s> собираются из готовых id.
+
+Обрезка пары повторяет truncation="longest_first" быстрых токенизаторов HF,
+как в CrossEncoder. Если пара не влезает в max_length, режется более длинная
+часть, а если обе длиннее половины — обе до половины. Для этого в файле
+хранится и исходная длина документа. Входы и оценки совпадают с
+CrossEncoder.predict. Чанки, которых нет в файле (файл старше коллекции),
+токенизируются на лету.
+
+Файл строит db.py из chunk store, формат (little-endian) как у него:
+    b"FXRTOK01" | u32 длина JSON-заголовка | JSON-заголовок | секции (выровнены по 8 байт)
+
+Секции:
+    ids       n × 16 байт    UUID точек, отсортированы (как в chunk store)
+    offs      (n+1) × u64    границы token ids документа
+    lengths   n × u32        длина документа в токенах до обрезки
+    tokens    m × u32        token ids без спецтокенов
+
+В заголовке записаны токенизатор и max_length. Если они не совпадают с
+реранкером, файл не используется. Работает только с локальным реранкером:
+в режиме сайдкара (INFERENCE_SOCKET) токенизирует сайдкар.
+
+Время токенизации на запрос до и после — benchmarks/bench_rerank_tokens.py.
+"""
+
+import json
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from src.chunk_store import ChunkStore, _align
+
+MAGIC = b"FXRTOK01"
+BUILD_BATCH_SIZE = 256
+
+
+def rerank_document(payload: dict) -> str:
+    # Скармливаем связку [Симптомы, Название + Текст]
+    # Это "чит", чтобы реранкер видел заголовок протокола (например, "Остеомиелит")
+    title = payload.get('title', 'Неизвестный протокол')
+    text = payload.get('text', '')
+    return f"ПРОТОКОЛ: {title}. СОДЕРЖАНИЕ: {text}"
+
+
+def pair_template(tokenizer) -> tuple[list[int], list[int], list[int]]:
+    """Спецтокены пары: (перед запросом, между запросом и документом, после документа).
+
+    Берутся из кодирования пробной пары: build_inputs_with_special_tokens есть не у всех токенизаторов.
+    """
+    a = tokenizer("симптомы", add_special_tokens=False)["input_ids"]
+    b = tokenizer("протокол", add_special_tokens=False)["input_ids"]
+    pair = tokenizer("симптомы", "протокол")["input_ids"]
+    i = next(i for i in range(len(pair)) if pair[i:i + len(a)] == a)
+    j = next(j for j in range(i + len(a), len(pair)) if pair[j:j + len(b)] == b)
+    return pair[:i], pair[i + len(a):j], pair[j + len(b):]
+
+
+def pair_budget(tokenizer, max_length: int) -> int:
+    """Сколько токенов запроса и документа вместе влезает в max_length."""
+    return max_length - sum(map(len, pair_template(tokenizer)))
+
+
+def longest_first(query_len: int, doc_len: int, budget: int) -> tuple[int, int]:
+    """Длины запроса и документа после обрезки, как TruncationStrategy::LongestFirst в tokenizers."""
+    if query_len + doc_len <= budget:
+        return query_len, doc_len
+    n1, n2 = query_len, doc_len
+    swap = n1 > n2
+    if swap:
+        n1, n2 = n2, n1
+    n2 = n1 if n1 > budget else max(n1, budget - n1)
+    if n1 + n2 > budget:
+        n1 = budget // 2
+        n2 = n1 + budget % 2
+    if swap:
+        n1, n2 = n2, n1
+    return min(query_len, n1), min(doc_len, n2)
+
+
+# ─── Построение ──────────────────────────────────────────────────────────────
+
+def build_rerank_tokens(chunk_store_path: str, tokens_path: str, tokenizer, max_length: int) -> int:
+    """Токенизирует документы всех чанков из chunk store (db.py). Возвращает число записей."""
+    store = ChunkStore(chunk_store_path)
+    budget = pair_budget(tokenizer, max_length)
+    lengths = np.zeros(len(store), dtype="<u4")
+    offs = np.zeros(len(store) + 1, dtype="<u8")
+    parts: list[np.ndarray] = []
+    for start in range(0, len(store), BUILD_BATCH_SIZE):
+        rows = range(start, min(start + BUILD_BATCH_SIZE, len(store)))
+        docs = [rerank_document(store.payload_at(row)) for row in rows]
+        encoded = tokenizer(docs, add_special_tokens=False)["input_ids"]
+        for row, ids in zip(rows, encoded):
+            # Документ длиннее бюджета всё равно будет обрезан — храним только бюджет
+            lengths[row] = len(ids)
+            parts.append(np.asarray(ids[:budget], dtype="<u4"))
+            offs[row + 1] = offs[row] + len(parts[-1])
+
+    sections = {
+        "ids": bytes(store._id_bytes),
+        "offs": offs.tobytes(),
+        "lengths": lengths.tobytes(),
+        "tokens": (np.concatenate(parts) if parts else np.zeros(0, "<u4")).tobytes(),
+    }
+
+    # Та же раскладка, что у chunk store: ширина под смещения зарезервирована в заголовке
+    layout = {name: [0, len(data)] for name, data in sections.items()}
+    header = {
+        "count": len(store),
+        "tokenizer": tokenizer.name_or_path,
+        "max_length": max_length,
+        "sections": layout,
+    }
+    header_len = len(json.dumps(header).encode()) + 16 * len(sections)
+    offset = _align(len(MAGIC) + 4 + header_len)
+    for name, data in sections.items():
+        layout[name][0] = offset
+        offset = _align(offset + len(data))
+    header_bytes = json.dumps(header).encode().ljust(header_len)
+
+    with open(tokens_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(4, "little"))
+        f.write(header_bytes)
+        for name, data in sections.items():
+            f.seek(layout[name][0])
+            f.write(data)
+    return len(store)
+
+
+# ─── Чтение ──────────────────────────────────────────────────────────────────
+
+class RerankTokens:
+    def __init__(self, path: str):
+        self.path = path
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._mm[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path}: не похоже на файл токенов реранкера")
+        header_len = int.from_bytes(bytes(self._mm[8:12]), "little")
+        header = json.loads(bytes(self._mm[12:12 + header_len]))
+        self.count = header["count"]
+        self.tokenizer = header["tokenizer"]
+        self.max_length = header["max_length"]
+        sec = {name: self._mm[off:off + size] for name, (off, size) in header["sections"].items()}
+
+        self._id_bytes = sec["ids"]
+        self._ids = sec["ids"].view("S16")
+        self._offs = sec["offs"].view("<u8")
+        self._lengths = sec["lengths"].view("<u4")
+        self._tokens = sec["tokens"].view("<u4")
+
+    def __len__(self) -> int:
+        return self.count
+
+    @classmethod
+    def open_if_exists(cls, path: str) -> "RerankTokens | None":
+        return cls(path) if path and Path(path).is_file() else None
+
+    def get(self, point_id: str) -> tuple[np.ndarray, int] | None:
+        """(token ids документа, длина до обрезки) или None, если чанка нет в файле."""
+        key = uuid.UUID(point_id).bytes
+        row = int(np.searchsorted(self._ids, key))
+        # Сравниваем сырые байты: элемент S16 теряет хвостовые нули
+        if row < self.count and bytes(self._id_bytes[row * 16:(row + 1) * 16]) == key:
+            start, end = int(self._offs[row]), int(self._offs[row + 1])
+            return self._tokens[start:end], int(self._lengths[row])
+        return None
+
+
+class PretokenizedReranker:
+    """CrossEncoder.predict для одного запроса и документов из RerankTokens."""
+
+    def __init__(self, cross_encoder, store: RerankTokens):
+        self.cross_encoder = cross_encoder
+        self.tokenizer = cross_encoder.tokenizer
+        self.store = store
+        self.prefix, self.middle, self.suffix = pair_template(self.tokenizer)
+        self.budget = store.max_length - len(self.prefix) - len(self.middle) - len(self.suffix)
+        self.pad_id = self.tokenizer.pad_token_id
+        self.with_token_types = "token_type_ids" in self.tokenizer.model_input_names
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.missing = 0
+        self.tokenize_seconds = 0.0
+
+    @staticmethod
+    def compatible(cross_encoder, store: RerankTokens) -> bool:
+        return (
+            store.tokenizer == cross_encoder.tokenizer.name_or_path
+            and store.max_length == cross_encoder.max_length
+        )
+
+    def _document(self, point_id: str, document: str) -> tuple[np.ndarray, int, bool]:
+        cached = self.store.get(point_id)
+        if cached is not None:
+            return *cached, False
+        ids = self.tokenizer(document, add_special_tokens=False)["input_ids"]
+        return np.asarray(ids[:self.budget], dtype=np.int64), len(ids), True
+
+    def encode(self, query: str, docs: list[tuple[str, str]]) -> dict[str, np.ndarray]:
+        """Входы модели для пар (query, документ); docs — [(id точки, текст документа)]."""
+        query_ids = self.tokenizer(query, add_special_tokens=False)["input_ids"]
+        rows, missing = [], 0
+        for point_id, document in docs:
+            doc_ids, doc_len, fresh = self._document(point_id, document)
+            missing += fresh
+            q, d = longest_first(len(query_ids), doc_len, self.budget)
+            # Первый сегмент — до документа: у BERT-подобных моделей token_type 0, дальше 1
+            first = len(self.prefix) + q + len(self.middle)
+            rows.append((self.prefix + query_ids[:q] + self.middle, doc_ids[:d], first))
+
+        # Паддинг справа до самой длинной пары, как padding=True в CrossEncoder
+        width = max(first + len(doc) + len(self.suffix) for _, doc, first in rows)
+        features = {
+            "input_ids": np.full((len(rows), width), self.pad_id, dtype=np.int64),
+            "attention_mask": np.zeros((len(rows), width), dtype=np.int64),
+        }
+        if self.with_token_types:
+            features["token_type_ids"] = np.zeros((len(rows), width), dtype=np.int64)
+        input_ids = features["input_ids"]
+        for i, (head, doc, first) in enumerate(rows):
+            end = first + len(doc)
+            input_ids[i, :first] = head
+            input_ids[i, first:end] = doc
+            input_ids[i, end:end + len(self.suffix)] = self.suffix
+            features["attention_mask"][i, :end + len(self.suffix)] = 1
+            if self.with_token_types:
+                features["token_type_ids"][i, first:end + len(self.suffix)] = 1
+        with self._lock:
+            self.missing += missing
+        return features
+
+    def predict(self, query: str, docs: list[tuple[str, str]]) -> np.ndarray:
+        import torch
+
+        start = time.perf_counter()
+        features = self.encode(query, docs)
+        tokenized = time.perf_counter()
+        model = self.cross_encoder
+        inputs = {name: torch.from_numpy(array).to(model.device) for name, array in features.items()}
+        with torch.inference_mode():
+            logits = model.activation_fn(model.model(**inputs).logits)
+        with self._lock:
+            self.requests += 1
+            self.tokenize_seconds += tokenized - start
+        scores = logits.float().cpu().numpy()
+        return scores[:, 0] if scores.shape[1] == 1 else scores
+
+    def metrics(self) -> dict:
+        with self._lock:
+            n = self.requests or 1
+            return {
+                "chunks": len(self.store),
+                "requests": self.requests,
+                "tokenized_on_the_fly": self.missing,
+                "tokenize_ms": round(self.tokenize_seconds * 1000 / n, 2),
+            }
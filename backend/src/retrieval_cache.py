@@ -0,0 +1,121 @@
+"""
+Состояние retrieval в пределах чат-сессии.
+
+Уточнение в той же сессии («ещё температура 39») почти всегда касается тех же
+протоколов, что и предыдущее сообщение. Поэтому для сессии хранится эмбеддинг
+последнего запроса и пул лучших кандидатов после реранкинга. Diagnoser берёт
+из Qdrant меньше свежих кандидатов и реранжирует их вместе с пулом, а не
+делает полный поиск на 30 кандидатов.
+
+Кэш ограничен по времени (SESSION_RETRIEVAL_TTL) и по памяти
+(SESSION_RETRIEVAL_MAX_MB). При переполнении вытесняются давно не
+использованные сессии. Размер записи оценочный: вектор плюс тексты чанков.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+SESSION_RETRIEVAL_TTL = float(os.getenv("SESSION_RETRIEVAL_TTL", "1800"))
+SESSION_RETRIEVAL_MAX_MB = float(os.getenv("SESSION_RETRIEVAL_MAX_MB", "64"))
+
+# Накладные расходы на dict payload'а и строки помимо текста (оценка)
+_PAYLOAD_OVERHEAD = 512
+
+
+@dataclass
+class SessionRetrieval:
+    query_vector: np.ndarray
+    pool: list[tuple[str, dict]]   # (id точки, payload) в порядке реранкинга
+    expires_at: float
+    size: int
+
+    @property
+    def ids(self) -> set[str]:
+        return {point_id for point_id, _ in self.pool}
+
+
+def _estimate_size(query_vector: np.ndarray, pool: list[tuple[str, dict]]) -> int:
+    # Кириллица в str занимает 2 байта на символ
+    return query_vector.nbytes + sum(2 * len(p.get("text", "")) + _PAYLOAD_OVERHEAD for _, p in pool)
+
+
+class SessionRetrievalCache:
+    def __init__(self, ttl: float = SESSION_RETRIEVAL_TTL, max_mb: float = SESSION_RETRIEVAL_MAX_MB):
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 2**20)
+        self._entries: OrderedDict[str, SessionRetrieval] = OrderedDict()
+        self._bytes = 0
+        # diagnose() выполняется в потоках пула
+        self._lock = threading.Lock()
+        self._stats = {
+            "full": 0, "followup": 0, "topic_change": 0,
+            "expired": 0, "evicted": 0, "overlap_sum": 0.0,
+            "full_seconds": 0.0, "followup_seconds": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_bytes > 0
+
+    def get(self, session_id: str) -> SessionRetrieval | None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                self._drop(session_id)
+                self._stats["expired"] += 1
+                return None
+            self._entries.move_to_end(session_id)
+            return entry
+
+    def put(self, session_id: str, query_vector: np.ndarray, pool: list[tuple[str, dict]]) -> None:
+        if not self.enabled:
+            return
+        size = _estimate_size(query_vector, pool)
+        entry = SessionRetrieval(query_vector, pool, time.monotonic() + self.ttl, size)
+        with self._lock:
+            if session_id in self._entries:
+                self._drop(session_id)
+            self._entries[session_id] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+                self._stats["evicted"] += 1
+
+    def _drop(self, session_id: str) -> None:
+        self._bytes -= self._entries.pop(session_id).size
+
+    def record(self, path: str, seconds: float, overlap: float | None = None) -> None:
+        """path: full | followup | topic_change (был пул, но запрос ушёл в другую тему)."""
+        with self._lock:
+            self._stats[path] += 1
+            if path == "followup":
+                self._stats["followup_seconds"] += seconds
+                self._stats["overlap_sum"] += overlap or 0.0
+            else:
+                self._stats["full_seconds"] += seconds
+
+    def metrics(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            sessions, size = len(self._entries), self._bytes
+        full = s["full"] + s["topic_change"]
+        return {
+            "sessions": sessions,
+            "bytes": size,
+            "full_searches": s["full"],
+            "followups": s["followup"],
+            "topic_changes": s["topic_change"],
+            "expired": s["expired"],
+            "evicted": s["evicted"],
+            # Доля свежих кандидатов уточнения, которые уже были в пуле сессии
+            "overlap_rate": round(s["overlap_sum"] / s["followup"], 3) if s["followup"] else None,
+            "full_retrieval_ms": round(1000 * s["full_seconds"] / full, 1) if full else None,
+            "followup_retrieval_ms": round(1000 * s["followup_seconds"] / s["followup"], 1) if s["followup"] else None,
+        }
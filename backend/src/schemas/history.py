@@ -24,3 +24,19 @@ class PaginatedResponse(BaseModel):
     total: int
     page: int
     per_page: int
+
+
+class SearchHit(BaseModel):
+    message_id: str
+    session_id: str
+    session_title: str
+    role: str
+    snippet: str
+    created_at: str
+
+
+class SearchResponse(BaseModel):
+    items: list[SearchHit]
+    page: int
+    per_page: int
+    has_more: bool
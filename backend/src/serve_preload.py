@@ -0,0 +1,128 @@
+"""
+Preload-then-fork: родитель загружает веса bge-m3 и реранкера, затем форкает
+N воркеров uvicorn на общем сокете. Тензоры не копируются — воркеры делят
+страницы родителя copy-on-write, поэтому RSS на воркер почти не растёт.
+
+Запуск:
+    uv run python -m src.serve_preload --workers 8 --port 8000
+
+Только CPU: CUDA/MPS-контексты после fork не работают. Прогрев (warm-up)
+выполняет каждый воркер сам, уже после fork. Пул потоков torch в каждом
+воркере — ядра / N (--threads). Упавший воркер родитель перезапускает, а
+процесс завершается с ненулевым кодом, если хоть один воркер упал.
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+# Воркер, проживший меньше RESPAWN_MIN_UPTIME секунд, перезапускается через RESPAWN_DELAY
+RESPAWN_MIN_UPTIME = 5.0
+RESPAWN_DELAY = 1.0
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, args) -> int:
+    import torch
+    import uvicorn
+
+    # Без этого каждый воркер берёт пул потоков torch на все ядра: N воркеров × ядра потоков
+    torch.set_num_threads(args.threads)
+    config = uvicorn.Config("src.main:app", log_level=args.log_level, timeout_keep_alive=5)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    # Как uvicorn.run: не поднялся (упал lifespan) — код 3
+    return 0 if server.started else 3
+
+
+def _spawn(sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            code = _run_worker(sock, args)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            # os._exit: не выполнять atexit и finally родителя в потомке
+            os._exit(code)
+    return pid
+
+
+def main():
+    cores = len(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser(description="uvicorn-воркеры с общими (preload) весами моделей")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Потоков torch на воркер (по умолчанию ядра / воркеры)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    args.threads = args.threads or max(1, cores // args.workers)
+
+    from src.diagnose import preload_models
+
+    print("Preload: загрузка моделей в родительский процесс...")
+    preload_models("cpu")
+
+    # Всё, что создано до fork, переносим в permanent generation: иначе сборщик
+    # мусора в воркерах трогает заголовки объектов и размножает страницы.
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(args.host, args.port)
+    children: dict[int, float] = {_spawn(sock, args): time.monotonic() for _ in range(args.workers)}
+    print(f"Preload: запущено {len(children)} воркеров на {args.host}:{args.port}, по {args.threads} потоков torch")
+
+    stopping = False
+
+    def _forward(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for child in children:
+            try:
+                os.kill(child, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _forward)
+    signal.signal(signal.SIGINT, _forward)
+
+    exit_code = 0
+    while children:
+        pid, status = os.wait()
+        started = children.pop(pid, None)
+        if started is None:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if code != 0:
+            exit_code = 1
+        if stopping:
+            continue
+        # Упавший воркер заменяем, иначе узел тихо работает на меньшем числе воркеров.
+        # Если падает сразу после старта — с паузой, чтобы не форкать в цикле
+        print(f"Preload: воркер {pid} завершился с кодом {code}, перезапуск", file=sys.stderr)
+        if time.monotonic() - started < RESPAWN_MIN_UPTIME:
+            time.sleep(RESPAWN_DELAY)
+        children[_spawn(sock, args)] = time.monotonic()
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
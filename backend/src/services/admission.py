@@ -0,0 +1,160 @@
+"""
+Admission control для диагностики: ограничение одновременных вызовов,
+ограниченная очередь с приоритетами и дедлайнами.
+
+Запрос, который не помещается в очередь, сразу получает 429; запрос,
+простоявший в очереди дольше своего дедлайна, выкидывается (503) до того,
+как на него потрачен бюджет ЛЛМ. При полной очереди интерактивный запрос
+вытесняет самый свежий batch-запрос.
+"""
+
+import asyncio
+import heapq
+import itertools
+import statistics
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+
+from src.services.errors import DeadlineExceededError, OverloadedError
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # чат и карта тела — пользователь ждёт ответа
+    BATCH = 1        # /diagnose: пакетные прогоны и evaluate.py
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    deadline: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+def _granted(future: asyncio.Future) -> bool:
+    return (
+        future.done()
+        and not future.cancelled()
+        and future.exception() is None
+        and future.result() is True
+    )
+
+
+class AdmissionController:
+    def __init__(self, max_inflight: int, max_queue: int, name: str = "Diagnosis"):
+        self.name = name
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.inflight = 0
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.shed = 0
+        self._wait_times: deque[float] = deque(maxlen=1024)
+        # Скользящее среднее времени обработки — для оценки Retry-After
+        self._service_time = 5.0
+
+    # ─── Публичный API ───────────────────────────────────────────────────
+
+    async def acquire(self, priority: Priority, deadline: float) -> None:
+        """Ждёт слот до deadline (по часам event loop). Вызывающий обязан сделать release()."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        if self.inflight < self.max_inflight and not self._queue:
+            self.inflight += 1
+            self._admit(0.0)
+            return
+
+        if len(self._queue) >= self.max_queue and not self._shed_for(priority):
+            self.rejected += 1
+            raise OverloadedError(f"{self.name} queue is full", self.retry_after())
+
+        waiter = _Waiter(priority, next(self._seq), deadline, loop.create_future())
+        heapq.heappush(self._queue, waiter)
+        try:
+            async with asyncio.timeout_at(deadline):
+                granted = await waiter.future
+        except BaseException as e:
+            if _granted(waiter.future):
+                # Слот уже был передан, но ждущий ушёл (отмена клиентом или таймаут) — отдаём дальше
+                self.release()
+            else:
+                self._discard(waiter)
+            if isinstance(e, TimeoutError):
+                self.expired += 1
+                raise DeadlineExceededError("Request deadline expired in queue", self.retry_after()) from None
+            raise
+
+        if not granted:
+            self.expired += 1
+            raise DeadlineExceededError("Request deadline expired in queue", self.retry_after())
+        self._admit(loop.time() - now)
+
+    def release(self, service_time: float | None = None) -> None:
+        if service_time is not None:
+            self._service_time = 0.8 * self._service_time + 0.2 * service_time
+
+        now = asyncio.get_running_loop().time()
+        while self._queue:
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                continue
+            if waiter.deadline <= now:
+                # Дедлайн уже истёк — не тратим на него слот
+                waiter.future.set_result(False)
+                continue
+            # Слот переходит ожидающему напрямую, inflight не меняется
+            waiter.future.set_result(True)
+            return
+        self.inflight -= 1
+
+    def retry_after(self) -> int:
+        backlog = len(self._queue) + self.inflight
+        return max(1, round(backlog * self._service_time / self.max_inflight))
+
+    def metrics(self) -> dict:
+        waits = sorted(self._wait_times)
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "shed": self.shed,
+            "wait_ms_p50": round(statistics.median(waits) * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "service_time_s": round(self._service_time, 3),
+        }
+
+    # ─── Внутреннее ──────────────────────────────────────────────────────
+
+    def _admit(self, waited: float) -> None:
+        self.admitted += 1
+        self._wait_times.append(waited)
+
+    def _shed_for(self, priority: Priority) -> bool:
+        """Освобождает место в полной очереди, вытесняя самый свежий менее приоритетный запрос."""
+        if not self._queue:
+            return False
+        victim = max(self._queue)
+        if victim.priority <= priority:
+            return False
+        self._discard(victim)
+        self.shed += 1
+        victim.future.set_exception(OverloadedError("Preempted by interactive request", self.retry_after()))
+        return True
+
+    def _discard(self, waiter: _Waiter) -> None:
+        try:
+            self._queue.remove(waiter)
+        except ValueError:
+            return
+        heapq.heapify(self._queue)
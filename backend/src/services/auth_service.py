@@ -2,25 +2,14 @@ from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 
 import jwt
-from passlib.context import CryptContext
 
 from src.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 JWT_SECRET = settings.JWT_SECRET
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_HOURS = 24
 
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
-
-
 def create_access_token(user_id: str) -> str:
     payload = {
         "sub": user_id,
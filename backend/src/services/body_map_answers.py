@@ -0,0 +1,229 @@
+"""
+Готовые диагнозы для карты тела.
+
+Без additional_symptoms запрос /diagnose/by-body-map целиком задаётся набором
+зон и языком: 7 зон × 3 языка — несколько сотен вариантов. Фоновая задача
+прогоняет пайплайн для всех наборов до BODY_MAP_PRECOMPUTE_MAX_ZONES зон на
+каждом языке и сохраняет ответы в таблицу body_map_answers. Ключ — зоны по
+алфавиту через запятую + язык. В памяти держится словарь ключ → диагнозы, и
+такие запросы не доходят до RAG и ЛЛМ.
+
+Ответ действителен только для версии пайплайна, которой он посчитан
+(MedicalDiagnosisService.pipeline_version). При смене версии старые строки
+удаляются и считаются заново. Строки старше BODY_MAP_REFRESH_HOURS
+пересчитываются на очередном прогоне.
+
+Воркеров несколько (serve_preload, uvicorn --workers), а считает один: тот,
+кто взял flock на файл рядом с базой. Остальные только загружают таблицу и
+перечитывают её раз в BODY_MAP_RELOAD_MINUTES, подхватывая посчитанное. Так
+же прогоняют и повторные проходы: лок берёт первый свободный воркер.
+
+Вручную (например, по cron при BODY_MAP_PRECOMPUTE_MAX_ZONES=0 у сервера):
+    uv run python -m src.services.body_map_answers --max-zones 3
+"""
+
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import time
+from itertools import combinations
+from pathlib import Path
+
+import aiosqlite
+
+from src.database import DB_PATH, init_db
+from src.logger import logger, note
+from src.schemas.chat import DiagnosisItemOut
+from src.services.admission import Priority
+from src.services.body_map_service import ZONES_MAP, zones_to_symptoms_text
+from src.services.ml_service import MedicalDiagnosisService
+
+LANGS = ("ru", "kk", "en")
+
+BODY_MAP_PRECOMPUTE_MAX_ZONES = int(os.getenv("BODY_MAP_PRECOMPUTE_MAX_ZONES", "3"))  # 0 — не считать
+BODY_MAP_REFRESH_HOURS = float(os.getenv("BODY_MAP_REFRESH_HOURS", "168"))  # 0 — только при старте
+BODY_MAP_RELOAD_MINUTES = float(os.getenv("BODY_MAP_RELOAD_MINUTES", "10"))
+
+
+def answer_key(zone_ids: list[str], lang: str) -> tuple[str, str] | None:
+    """Канонический ключ: известные зоны без повторов по алфавиту + язык (как в zones_to_symptoms_text)."""
+    zones = sorted({z for z in zone_ids if z in ZONES_MAP})
+    if not zones:
+        return None
+    return ",".join(zones), lang if lang in LANGS else "ru"
+
+
+def all_keys(max_zones: int) -> list[tuple[str, str]]:
+    zone_ids = sorted(ZONES_MAP)
+    return [
+        (",".join(combo), lang)
+        for lang in LANGS
+        for size in range(1, min(max_zones, len(zone_ids)) + 1)
+        for combo in combinations(zone_ids, size)
+    ]
+
+
+def _items(diagnoses_json: str) -> list[DiagnosisItemOut]:
+    return [DiagnosisItemOut(**d) for d in json.loads(diagnoses_json)]
+
+
+class BodyMapAnswers:
+    def __init__(
+        self,
+        ml_service: MedicalDiagnosisService,
+        db_path: Path = DB_PATH,
+        max_zones: int = BODY_MAP_PRECOMPUTE_MAX_ZONES,
+        refresh_hours: float = BODY_MAP_REFRESH_HOURS,
+    ):
+        self.ml_service = ml_service
+        self.db_path = db_path
+        self.max_zones = max_zones
+        self.refresh_hours = refresh_hours
+        self.lock_path = db_path.with_name(db_path.name + ".body_map.lock")
+        self._answers: dict[tuple[str, str], list[DiagnosisItemOut]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.last_run: dict | None = None
+        self._task: asyncio.Task | None = None
+
+    def lookup(self, zone_ids: list[str], lang: str) -> list[DiagnosisItemOut] | None:
+        answer = self._answers.get(answer_key(zone_ids, lang))
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        note(body_map_precomputed=answer is not None)
+        return answer
+
+    def start(self) -> None:
+        """Запускает прогоны в фоне после загрузки моделей (вызывается из lifespan)."""
+        if self.max_zones > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _loop(self) -> None:
+        await self.ml_service.wait_ready()
+        while True:
+            try:
+                run = await self.run()
+                if run.get("computed") or self.last_run is None:
+                    logger.info(f"Body map answers: {run}")
+                self.last_run = run
+            except Exception as e:
+                logger.error(f"Body map precompute failed: {e}")
+            # Проход без устаревших строк — только чтение таблицы, поэтому повторяется часто
+            await asyncio.sleep(BODY_MAP_RELOAD_MINUTES * 60)
+
+    def _try_lock(self) -> int | None:
+        """fd с эксклюзивным flock или None, если считает другой процесс."""
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    async def run(self) -> dict:
+        """Загружает ответы текущей версии пайплайна; под локом досчитывает недостающие и устаревшие."""
+        if self.ml_service.diagnoser is None:
+            # Заглушка вместо пайплайна: считать нечего, а чужую версию не стираем
+            return {"skipped": "pipeline unavailable"}
+
+        lock_fd = self._try_lock()
+        try:
+            return await self._run(compute=lock_fd is not None)
+        finally:
+            if lock_fd is not None:
+                # Закрытие fd снимает flock
+                os.close(lock_fd)
+
+    async def _run(self, compute: bool) -> dict:
+        started = time.perf_counter()
+        version = self.ml_service.pipeline_version
+        computed = failed = 0
+        async with aiosqlite.connect(str(self.db_path)) as db:
+            if compute:
+                await db.execute("DELETE FROM body_map_answers WHERE pipeline_version != ?", (version,))
+                await db.commit()
+            cursor = await db.execute(
+                "SELECT zones, lang, diagnoses_json, computed_at >= datetime('now', ?) "
+                "FROM body_map_answers WHERE pipeline_version = ?",
+                (f"-{self.refresh_hours} hours", version),
+            )
+            fresh = set()
+            answers = {}
+            for zones, lang, diagnoses_json, is_fresh in await cursor.fetchall():
+                answers[(zones, lang)] = _items(diagnoses_json)
+                if is_fresh or self.refresh_hours <= 0:
+                    fresh.add((zones, lang))
+            self._answers = answers
+
+            for key in all_keys(self.max_zones) if compute else ():
+                if key in fresh:
+                    continue
+                zones, lang = key
+                try:
+                    # BATCH: интерактивные запросы в очереди admission идут первыми
+                    items = await self.ml_service.predict(
+                        zones_to_symptoms_text(zones.split(","), lang), priority=Priority.BATCH
+                    )
+                except Exception as e:
+                    failed += 1
+                    logger.warning(f"Body map precompute {key} failed: {e}")
+                    continue
+                diagnoses = [DiagnosisItemOut(**item.model_dump()) for item in items]
+                await db.execute(
+                    "INSERT OR REPLACE INTO body_map_answers (zones, lang, pipeline_version, diagnoses_json) "
+                    "VALUES (?, ?, ?, ?)",
+                    (zones, lang, version, json.dumps([d.model_dump() for d in diagnoses], ensure_ascii=False)),
+                )
+                await db.commit()
+                self._answers[key] = diagnoses
+                computed += 1
+
+        return {
+            "pipeline_version": version,
+            "role": "compute" if compute else "load",
+            "answers": len(self._answers),
+            "computed": computed,
+            "failed": failed,
+            "seconds": round(time.perf_counter() - started, 1),
+        }
+
+    def metrics(self) -> dict:
+        return {
+            "answers": len(self._answers),
+            "hits": self.hits,
+            "misses": self.misses,
+            "last_run": self.last_run,
+        }
+
+
+async def _main(args) -> None:
+    await init_db()
+    ml_service = MedicalDiagnosisService()
+    await ml_service.load()
+    answers = BodyMapAnswers(ml_service, max_zones=args.max_zones, refresh_hours=args.refresh_hours)
+    print(json.dumps(await answers.run(), ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-zones", type=int, default=max(BODY_MAP_PRECOMPUTE_MAX_ZONES, 1))
+    parser.add_argument("--refresh-hours", type=float, default=BODY_MAP_REFRESH_HOURS,
+                        help="Пересчитать ответы старше этого; 0 — только недостающие")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
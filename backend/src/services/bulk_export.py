@@ -0,0 +1,158 @@
+"""
+Потоковая выгрузка всей истории пользователя: NDJSON или ZIP.
+
+Строки читаются из SQLite курсором пачками по FETCH_SIZE и сразу уходят в
+StreamingResponse. Вся история в память не загружается, поэтому расход
+памяти одинаков для 10 и для 100k сообщений (архивные сессии распаковываются
+по одной). diagnoses_json вставляется в вывод как есть: он уже хранится как
+JSON, и разбирать его в Pydantic-модели только ради повторной сериализации
+незачем.
+
+Формат строки NDJSON — одно сообщение:
+    {"session_id", "session_title", "session_created_at", "id", "role",
+     "content", "created_at", "diagnoses": [...]}
+В ZIP каждая сессия — отдельный файл sessions/<created_at>_<id>.ndjson с
+такими же строками.
+"""
+
+import zipfile
+from typing import AsyncIterator
+
+import aiosqlite
+
+from src.fastjson import splice
+from src.services.message_store import decode_archive, resolve_content
+
+FETCH_SIZE = 500
+# Сколько байт копить перед отдачей очередного куска клиенту
+FLUSH_BYTES = 64 * 1024
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "zip": "application/zip",
+}
+
+_SESSIONS_QUERY = (
+    "SELECT s.id, s.title, s.created_at, a.data "
+    "FROM diagnosis_sessions s LEFT JOIN message_archive a ON a.session_id = s.id "
+    "WHERE s.user_id = ? "
+    "ORDER BY s.created_at, s.id"
+)
+_MESSAGES_QUERY = (
+    "SELECT s.id AS session_id, m.id, m.role, m.content, m.diagnoses_json, m.created_at "
+    "FROM diagnosis_sessions s JOIN chat_messages m ON m.session_id = s.id "
+    "WHERE s.user_id = ? "
+    "ORDER BY s.created_at, s.id, m.created_at"
+)
+
+
+async def _cursor_rows(db: aiosqlite.Connection, query: str, user_id: str) -> AsyncIterator[aiosqlite.Row]:
+    cursor = await db.execute(query, (user_id,))
+    cursor.arraysize = FETCH_SIZE
+    try:
+        async for row in cursor:
+            yield row
+    finally:
+        await cursor.close()
+
+
+def _with_session(session: aiosqlite.Row, row) -> dict:
+    return {
+        "session_id": session["id"],
+        "session_title": session["title"],
+        "session_created_at": session["created_at"],
+        "id": row["id"],
+        "role": row["role"],
+        "content": resolve_content(row["role"], row["content"], row["diagnoses_json"]),
+        "created_at": row["created_at"],
+        "diagnoses_json": row["diagnoses_json"],
+    }
+
+
+async def _rows(db: aiosqlite.Connection, user_id: str) -> AsyncIterator[dict]:
+    """Сообщения пользователя по сессиям: архивные из блоба, затем живые.
+
+    Два курсора идут в одном порядке сессий, поэтому живые сообщения
+    сливаются с сессиями за один проход, без запроса на каждую сессию.
+    """
+    messages = _cursor_rows(db, _MESSAGES_QUERY, user_id)
+    pending = await anext(messages, None)
+    try:
+        async for session in _cursor_rows(db, _SESSIONS_QUERY, user_id):
+            if session["data"] is not None:
+                for row in decode_archive(session["data"]):
+                    yield _with_session(session, row)
+            while pending is not None and pending["session_id"] == session["id"]:
+                yield _with_session(session, pending)
+                pending = await anext(messages, None)
+    finally:
+        await messages.aclose()
+
+
+def _line(row: dict) -> bytes:
+    obj = {k: v for k, v in row.items() if k != "diagnoses_json"}
+    return splice(obj, "diagnoses", row["diagnoses_json"]) + b"\n"
+
+
+async def stream_ndjson(db: aiosqlite.Connection, user_id: str) -> AsyncIterator[bytes]:
+    chunk: list[bytes] = []
+    size = 0
+    async for row in _rows(db, user_id):
+        line = _line(row)
+        chunk.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b"".join(chunk)
+
+
+class _DrainBuffer:
+    """Несекабельный приёмник для ZipFile: накапливает байты до следующего drain()."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts, self.size = [], 0
+        return data
+
+
+def _member_name(row: dict) -> str:
+    stamp = row["session_created_at"].replace(" ", "_").replace(":", "-")
+    return f"sessions/{stamp}_{row['session_id']}.ndjson"
+
+
+async def stream_zip(db: aiosqlite.Connection, user_id: str) -> AsyncIterator[bytes]:
+    # Без seek() ZipFile пишет размеры в data descriptor после каждого файла,
+    # поэтому архив можно отдавать по мере записи
+    buf = _DrainBuffer()
+    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        member = None
+        current = None
+        try:
+            async for row in _rows(db, user_id):
+                if row["session_id"] != current:
+                    if member is not None:
+                        member.close()
+                    current = row["session_id"]
+                    member = zf.open(_member_name(row), mode="w", force_zip64=True)
+                member.write(_line(row))
+                if buf.size >= FLUSH_BYTES:
+                    yield buf.drain()
+        finally:
+            if member is not None:
+                member.close()
+    # Центральный каталог дописывается при закрытии архива
+    yield buf.drain()
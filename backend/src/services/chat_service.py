@@ -3,7 +3,9 @@ from uuid import uuid4
 
 import aiosqlite
 
+from src.fastjson import join_array, splice
 from src.schemas.chat import ChatMessage, ChatMessageResponse, DiagnosisItemOut
+from src.services.message_store import format_diagnoses, load_message_rows, stored_content
 from src.services.ml_service import MedicalDiagnosisService
 
 
@@ -28,7 +30,7 @@ async def save_message(
     diagnoses_json = json.dumps(diagnoses, ensure_ascii=False) if diagnoses else None
     await db.execute(
         "INSERT INTO chat_messages (id, session_id, role, content, diagnoses_json) VALUES (?, ?, ?, ?, ?)",
-        (msg_id, session_id, role, content, diagnoses_json),
+        (msg_id, session_id, role, stored_content(role, content, diagnoses), diagnoses_json),
     )
     await db.execute(
         "UPDATE diagnosis_sessions SET updated_at = datetime('now') WHERE id = ?",
@@ -39,12 +41,7 @@ async def save_message(
 
 
 async def get_messages(db: aiosqlite.Connection, session_id: str) -> list[ChatMessage]:
-    cursor = await db.execute(
-        "SELECT id, session_id, role, content, diagnoses_json, created_at "
-        "FROM chat_messages WHERE session_id = ? ORDER BY created_at",
-        (session_id,),
-    )
-    rows = await cursor.fetchall()
+    rows = await load_message_rows(db, session_id)
     messages = []
     for row in rows:
         diagnoses = []
@@ -64,29 +61,54 @@ async def get_messages(db: aiosqlite.Connection, session_id: str) -> list[ChatMe
     return messages
 
 
+async def get_messages_json(db: aiosqlite.Connection, session_id: str) -> bytes:
+    """То же, что get_messages, но сразу JSON-массивом в формате ChatMessage.
+
+    diagnoses_json пишет только save_message, из словарей с полями
+    DiagnosisItemOut, поэтому он вставляется в ответ как есть, без моделей.
+    """
+    rows = await load_message_rows(db, session_id)
+    return join_array(
+        splice(
+            {
+                "id": row["id"],
+                "session_id": row["session_id"],
+                "role": row["role"],
+                "content": row["content"],
+                "created_at": row["created_at"],
+            },
+            "diagnoses",
+            row["diagnoses_json"],
+        )
+        for row in rows
+    )
+
+
 async def process_chat_message(
     db: aiosqlite.Connection,
     ml_service: MedicalDiagnosisService,
     user_id: str,
     session_id: str | None,
     message: str,
+    diagnoses: list[DiagnosisItemOut] | None = None,
 ) -> ChatMessageResponse:
+    """diagnoses — готовый ответ (карта тела), тогда пайплайн не вызывается."""
     if not session_id:
         title = message[:60].strip()
         session_id = await create_session(db, user_id, title)
 
     await save_message(db, session_id, "user", message)
 
-    diagnosis_items = await ml_service.predict(message)
-    diagnoses_data = [
-        {"rank": d.rank, "diagnosis": d.diagnosis, "icd10_code": d.icd10_code, "explanation": d.explanation}
-        for d in diagnosis_items
-    ]
+    if diagnoses is None:
+        # session_id: уточнения в той же сессии переиспользуют кандидатов retrieval
+        diagnosis_items = await ml_service.predict(message, session_id=session_id)
+        diagnoses = [
+            DiagnosisItemOut(rank=d.rank, diagnosis=d.diagnosis, icd10_code=d.icd10_code, explanation=d.explanation)
+            for d in diagnosis_items
+        ]
 
-    response_lines = []
-    for d in diagnosis_items:
-        response_lines.append(f"{d.rank}. {d.diagnosis} ({d.icd10_code}) — {d.explanation}")
-    response_content = "\n".join(response_lines)
+    diagnoses_data = [d.model_dump() for d in diagnoses]
+    response_content = format_diagnoses(diagnoses_data)
 
     msg_id = await save_message(db, session_id, "assistant", response_content, diagnoses_data)
 
@@ -94,5 +116,5 @@ async def process_chat_message(
         session_id=session_id,
         message_id=msg_id,
         content=response_content,
-        diagnoses=[DiagnosisItemOut(**d) for d in diagnoses_data],
+        diagnoses=diagnoses,
     )
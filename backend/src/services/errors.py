@@ -0,0 +1,23 @@
+class ServiceUnavailableError(Exception):
+    """Диагностика временно недоступна; main.py превращает это в ответ с Retry-After."""
+
+    status_code = 503
+
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class ServiceNotReadyError(ServiceUnavailableError):
+    """Модели ещё загружаются."""
+
+
+class OverloadedError(ServiceUnavailableError):
+    """Очередь на диагностику заполнена — клиенту стоит повторить позже."""
+
+    status_code = 429
+
+
+class DeadlineExceededError(ServiceUnavailableError):
+    """Запрос простоял в очереди дольше своего дедлайна и выполняться не будет."""
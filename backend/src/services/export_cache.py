@@ -0,0 +1,136 @@
+"""
+Рендеринг экспортов в отдельных процессах и кэш готовых файлов на диске.
+
+ReportLab полностью занимает CPU. Если рендерить внутри async-эндпоинта,
+event loop блокируется для всех пользователей. Поэтому рендер идёт в
+ограниченном пуле процессов, а результат сохраняется в data/exports/ с ключом
+(session_id, версия сессии, format). Повторное скачивание отдаётся потоком с
+диска. Версия — updated_at, заголовок, число сообщений и rowid последнего:
+updated_at хранится с точностью до секунды, и сообщение, дописанное в ту же
+секунду, без остального ключ бы не поменяло. Старые файлы вытесняет eviction
+по возрасту и суммарному размеру.
+"""
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from src.database import DB_PATH
+from src.logger import note
+from src.schemas.chat import ChatMessage
+from src.services.export_service import generate_json_export, generate_pdf
+
+EXPORT_CACHE_DIR = DB_PATH.parent / "exports"
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_MB", "256")) * 2**20
+EXPORT_CACHE_MAX_AGE = int(os.getenv("EXPORT_CACHE_MAX_AGE_HOURS", "24")) * 3600
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+# Файлы, тронутые за последние секунды, не вытесняются: их путь уже отдан
+# запросу, а FileResponse откроет файл только при отправке
+EVICT_GRACE_SECONDS = 60
+
+FORMATS = {
+    "pdf": ("application/pdf", ".pdf"),
+    "json": ("application/json", ".json"),
+}
+
+_pool: ProcessPoolExecutor | None = None
+# Не больше EXPORT_WORKERS рендеров одновременно; остальные ждут, не раздувая очередь пула
+_slots = asyncio.Semaphore(EXPORT_WORKERS)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: форк процесса с потоками uvicorn/torch небезопасен
+        _pool = ProcessPoolExecutor(
+            max_workers=EXPORT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _render_to_file(fmt: str, title: str, messages: list[ChatMessage], path: str) -> None:
+    """Выполняется в процессе пула. Пишем во временный файл и атомарно переименовываем."""
+    if fmt == "pdf":
+        data = generate_pdf(title, messages)
+    else:
+        data = generate_json_export(title, messages).encode("utf-8")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def session_version(meta) -> str:
+    """Версия сессии для ключа кэша из строки history_service.get_session_meta."""
+    return f"{meta['updated_at']}|{meta['message_count']}|{meta['last_rowid']}|{meta['title']}"
+
+
+def cache_path(session_id: str, version: str, fmt: str) -> Path:
+    key = hashlib.sha256(f"{session_id}|{version}|{fmt}".encode()).hexdigest()
+    return EXPORT_CACHE_DIR / f"{key}{FORMATS[fmt][1]}"
+
+
+def _evict(keep: Path) -> None:
+    now = time.time()
+    entries = []
+    for p in EXPORT_CACHE_DIR.iterdir():
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        if p.suffix == ".tmp":
+            # Недописанный файл упавшего рендера
+            if now - st.st_mtime > 3600:
+                p.unlink(missing_ok=True)
+            continue
+        if now - st.st_mtime > EXPORT_CACHE_MAX_AGE:
+            p.unlink(missing_ok=True)
+        else:
+            entries.append((st.st_mtime, st.st_size, p))
+
+    total = sum(size for _, size, _ in entries)
+    # mtime обновляется при каждом попадании — удаляем давно не скачанные
+    for mtime, size, p in sorted(entries):
+        if total <= EXPORT_CACHE_MAX_BYTES:
+            break
+        if p == keep or now - mtime < EVICT_GRACE_SECONDS:
+            continue
+        p.unlink(missing_ok=True)
+        total -= size
+
+
+async def get_or_render(
+    session_id: str,
+    version: str,
+    fmt: str,
+    load: Callable[[], Awaitable[tuple[str, list[ChatMessage]]]],
+) -> Path:
+    """Путь к готовому файлу экспорта; load() вызывается только при промахе кэша."""
+    path = cache_path(session_id, version, fmt)
+    try:
+        # utime и есть проверка попадания: файл мог удалить _evict другого запроса
+        os.utime(path)
+        note(export_cache_hit=True)
+        return path
+    except FileNotFoundError:
+        note(export_cache_hit=False)
+
+    title, messages = await load()
+    EXPORT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    async with _slots:
+        await loop.run_in_executor(_get_pool(), _render_to_file, fmt, title, messages, str(path))
+    await asyncio.to_thread(_evict, path)
+    return path
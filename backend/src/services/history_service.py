@@ -1,7 +1,8 @@
 import aiosqlite
 
 from src.schemas.history import PaginatedResponse, SessionDetail, SessionListItem
-from src.services.chat_service import get_messages
+from src.fastjson import splice
+from src.services.chat_service import get_messages, get_messages_json
 
 
 async def list_sessions(
@@ -15,7 +16,8 @@ async def list_sessions(
     offset = (page - 1) * per_page
     cursor = await db.execute(
         "SELECT s.id, s.title, s.created_at, s.updated_at, "
-        "(SELECT COUNT(*) FROM chat_messages WHERE session_id = s.id) AS message_count "
+        "(SELECT COUNT(*) FROM chat_messages WHERE session_id = s.id) "
+        "+ coalesce((SELECT message_count FROM message_archive WHERE session_id = s.id), 0) AS message_count "
         "FROM diagnosis_sessions s WHERE s.user_id = ? "
         "ORDER BY s.updated_at DESC LIMIT ? OFFSET ?",
         (user_id, per_page, offset),
@@ -36,6 +38,21 @@ async def list_sessions(
     return PaginatedResponse(items=items, total=total, page=page, per_page=per_page)
 
 
+async def get_session_meta(
+    db: aiosqlite.Connection, session_id: str, user_id: str
+) -> aiosqlite.Row | None:
+    """Только заголовок сессии, без сообщений (id, title, updated_at, message_count, last_rowid)."""
+    cursor = await db.execute(
+        "SELECT s.id, s.title, s.updated_at, "
+        "(SELECT count(*) FROM chat_messages m WHERE m.session_id = s.id) "
+        "+ coalesce((SELECT message_count FROM message_archive WHERE session_id = s.id), 0) AS message_count, "
+        "(SELECT max(m.rowid) FROM chat_messages m WHERE m.session_id = s.id) AS last_rowid "
+        "FROM diagnosis_sessions s WHERE s.id = ? AND s.user_id = ?",
+        (session_id, user_id),
+    )
+    return await cursor.fetchone()
+
+
 async def get_session(
     db: aiosqlite.Connection, session_id: str, user_id: str
 ) -> SessionDetail | None:
@@ -58,6 +75,20 @@ async def get_session(
     )
 
 
+async def get_session_json(db: aiosqlite.Connection, session_id: str, user_id: str) -> bytes | None:
+    """SessionDetail сразу в JSON: сообщения вставляются готовым массивом из get_messages_json."""
+    cursor = await db.execute(
+        "SELECT id, title, created_at, updated_at FROM diagnosis_sessions WHERE id = ? AND user_id = ?",
+        (session_id, user_id),
+    )
+    row = await cursor.fetchone()
+    if not row:
+        return None
+
+    meta = {"id": row["id"], "title": row["title"], "created_at": row["created_at"], "updated_at": row["updated_at"]}
+    return splice(meta, "messages", await get_messages_json(db, session_id))
+
+
 async def delete_session(db: aiosqlite.Connection, session_id: str, user_id: str) -> bool:
     cursor = await db.execute(
         "DELETE FROM diagnosis_sessions WHERE id = ? AND user_id = ?",
@@ -0,0 +1,281 @@
+"""
+Фоновое обслуживание SQLite: архив старых сессий, компактный content ответов,
+incremental vacuum и checkpoint WAL.
+
+Раз в MAINTENANCE_INTERVAL_MINUTES (в отдельном потоке, своим соединением):
+1. Сессии без активности дольше ARCHIVE_AFTER_DAYS переносятся из chat_messages
+   в message_archive (zlib, см. message_store.py). get_messages и экспорт
+   читают их как раньше. Для поиска сообщения индексируются заново под
+   rowid из archived_messages (см. database.py); архивы, созданные до этого,
+   доиндексирует тот же проход.
+2. У ответов ассистента, записанных до появления производного content,
+   текст очищается — он восстанавливается из diagnoses_json.
+3. Освободившиеся страницы возвращаются ОС через PRAGMA incremental_vacuum
+   порциями, чтобы не держать блокировку записи долго.
+4. PRAGMA wal_checkpoint(TRUNCATE) — WAL не растёт между автоматическими
+   checkpoint'ами при долгих читателях.
+
+incremental_vacuum работает только при auto_vacuum=INCREMENTAL. Новые базы
+создаются так сразу (init_db), старую нужно один раз перестроить полным VACUUM:
+    uv run python -m src.services.maintenance --enable-incremental-vacuum
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from src.database import DB_PATH, FTS_INSERT_ARCHIVED
+from src.logger import logger
+from src.services.message_store import decode_archive, encode_archive, stored_content
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))  # 0 — не архивировать
+MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL_MINUTES", "60")) * 60
+# Первый прогон — не сразу при старте, чтобы не мешать загрузке моделей
+MAINTENANCE_FIRST_DELAY = 60
+
+ARCHIVE_BATCH = 100          # сессий в одной транзакции
+COMPACT_BATCH = 1000         # сообщений в одной транзакции
+VACUUM_STEP_PAGES = 1000     # страниц за один incremental_vacuum
+STEP_PAUSE = 0.05            # пауза между порциями — окно для записей приложения
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def index_archived_session(conn: sqlite3.Connection, session_id: str, rows: list[dict]) -> None:
+    """Строки chat_fts для всех архивированных сообщений сессии (внутри транзакции вызывающего)."""
+    # Старые строки сессии удаляет триггер chat_fts_archived_delete
+    conn.execute("DELETE FROM archived_messages WHERE session_id = ?", (session_id,))
+    base = conn.execute("SELECT coalesce(min(fts_rowid), 0) FROM archived_messages").fetchone()[0]
+    for i, row in enumerate(rows, 1):
+        fts_rowid = base - i
+        conn.execute(
+            "INSERT INTO archived_messages (fts_rowid, id, session_id, role, created_at) VALUES (?, ?, ?, ?, ?)",
+            (fts_rowid, row["id"], session_id, row["role"], row["created_at"]),
+        )
+        conn.execute(FTS_INSERT_ARCHIVED, (fts_rowid, row["content"], row["diagnoses_json"], session_id))
+
+
+def reindex_archived_sessions(conn: sqlite3.Connection) -> int:
+    """Индексирует архивы, у которых строк в archived_messages меньше, чем сообщений. Число сессий."""
+    reindexed = 0
+    while True:
+        batch = conn.execute(
+            "SELECT a.session_id, a.data FROM message_archive a "
+            "WHERE a.message_count != (SELECT count(*) FROM archived_messages m WHERE m.session_id = a.session_id) "
+            "LIMIT ?",
+            (ARCHIVE_BATCH,),
+        ).fetchall()
+        if not batch:
+            return reindexed
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for row in batch:
+                index_archived_session(conn, row["session_id"], decode_archive(row["data"]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        reindexed += len(batch)
+        time.sleep(STEP_PAUSE)
+
+
+def archive_old_sessions(conn: sqlite3.Connection, older_than_days: int) -> tuple[int, int]:
+    """Переносит сообщения неактивных сессий в message_archive. Возвращает (сессий, сообщений)."""
+    sessions_total = messages_total = 0
+    while True:
+        batch = [
+            row["id"]
+            for row in conn.execute(
+                "SELECT s.id FROM diagnosis_sessions s "
+                "WHERE s.updated_at < datetime('now', ?) "
+                "AND EXISTS (SELECT 1 FROM chat_messages m WHERE m.session_id = s.id) LIMIT ?",
+                (f"-{older_than_days} days", ARCHIVE_BATCH),
+            )
+        ]
+        if not batch:
+            return sessions_total, messages_total
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for session_id in batch:
+                rows = [
+                    dict(row)
+                    for row in conn.execute(
+                        "SELECT id, role, content, diagnoses_json, created_at "
+                        "FROM chat_messages WHERE session_id = ? ORDER BY created_at",
+                        (session_id,),
+                    )
+                ]
+                for row in rows:
+                    if row["diagnoses_json"]:
+                        row["content"] = stored_content(row["role"], row["content"], json.loads(row["diagnoses_json"]))
+                # Сессию могли архивировать раньше и потом продолжить — дописываем к старому блобу
+                previous = conn.execute(
+                    "SELECT data FROM message_archive WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if previous:
+                    rows = decode_archive(previous["data"]) + rows
+                conn.execute(
+                    "INSERT OR REPLACE INTO message_archive (session_id, message_count, data) VALUES (?, ?, ?)",
+                    (session_id, len(rows), encode_archive(rows)),
+                )
+                messages_total += conn.execute(
+                    "DELETE FROM chat_messages WHERE session_id = ?", (session_id,)
+                ).rowcount
+                index_archived_session(conn, session_id, rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        sessions_total += len(batch)
+        time.sleep(STEP_PAUSE)
+
+
+def compact_assistant_content(conn: sqlite3.Connection) -> int:
+    """Очищает content ответов ассистента, который совпадает с текстом из diagnoses_json."""
+    compacted = 0
+    last_rowid = 0
+    while True:
+        rows = conn.execute(
+            "SELECT rowid, role, content, diagnoses_json FROM chat_messages "
+            "WHERE rowid > ? AND role = 'assistant' AND content != '' AND diagnoses_json IS NOT NULL "
+            "ORDER BY rowid LIMIT ?",
+            (last_rowid, COMPACT_BATCH),
+        ).fetchall()
+        if not rows:
+            return compacted
+        last_rowid = rows[-1]["rowid"]
+        updates = [
+            (row["rowid"],)
+            for row in rows
+            if stored_content(row["role"], row["content"], json.loads(row["diagnoses_json"])) == ""
+        ]
+        if updates:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("UPDATE chat_messages SET content = '' WHERE rowid = ?", updates)
+            conn.execute("COMMIT")
+            compacted += len(updates)
+            time.sleep(STEP_PAUSE)
+
+
+def incremental_vacuum(conn: sqlite3.Connection) -> int:
+    """Возвращает ОС свободные страницы порциями. Число освобождённых страниц."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return 0
+    freed = 0
+    while (free := conn.execute("PRAGMA freelist_count").fetchone()[0]) > 0:
+        # execute() делает один шаг, то есть освобождает одну страницу; executescript прогоняет до конца
+        conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+        freed += min(free, VACUUM_STEP_PAGES)
+        time.sleep(STEP_PAUSE)
+    return freed
+
+
+def enable_incremental_vacuum(conn: sqlite3.Connection) -> None:
+    """Одноразовый перевод существующей базы в auto_vacuum=INCREMENTAL (полный VACUUM)."""
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def checkpoint(conn: sqlite3.Connection) -> dict:
+    busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    return {"busy": bool(busy), "wal_pages": wal_pages, "checkpointed": checkpointed}
+
+
+def db_size(db_path: Path) -> dict:
+    wal = Path(f"{db_path}-wal")
+    return {
+        "db_bytes": db_path.stat().st_size if db_path.exists() else 0,
+        "wal_bytes": wal.stat().st_size if wal.exists() else 0,
+    }
+
+
+def run_maintenance(db_path: Path = DB_PATH, archive_after_days: int = ARCHIVE_AFTER_DAYS) -> dict:
+    """Один полный проход обслуживания (синхронно; из приложения — в потоке)."""
+    start = time.perf_counter()
+    conn = _connect(db_path)
+    try:
+        report = {"before": db_size(db_path)}
+        if archive_after_days > 0:
+            report["archived_sessions"], report["archived_messages"] = archive_old_sessions(conn, archive_after_days)
+        report["reindexed_archives"] = reindex_archived_sessions(conn)
+        report["compacted_messages"] = compact_assistant_content(conn)
+        report["vacuumed_pages"] = incremental_vacuum(conn)
+        report["incremental_vacuum"] = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+        conn.execute("PRAGMA optimize")
+        report["checkpoint"] = checkpoint(conn)
+        report["after"] = db_size(db_path)
+    finally:
+        conn.close()
+    report["seconds"] = round(time.perf_counter() - start, 2)
+    return report
+
+
+class MaintenanceTask:
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL, db_path: Path = DB_PATH):
+        self.interval = interval
+        self.db_path = db_path
+        self.last_report: dict | None = None
+        self._warned = False
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Запускает периодическое обслуживание в фоне (вызывается из lifespan)."""
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(MAINTENANCE_FIRST_DELAY)
+        while True:
+            try:
+                self.last_report = await asyncio.to_thread(run_maintenance, self.db_path)
+                logger.info(f"DB maintenance: {self.last_report}")
+                if not self.last_report["incremental_vacuum"] and not self._warned:
+                    self._warned = True
+                    logger.warning(
+                        "auto_vacuum is not INCREMENTAL, freed pages stay in the file; "
+                        "run `python -m src.services.maintenance --enable-incremental-vacuum` once"
+                    )
+            except Exception as e:
+                logger.error(f"DB maintenance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--archive-after-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Перед обслуживанием перестроить базу полным VACUUM (блокирует запись)")
+    args = parser.parse_args()
+
+    if args.enable_incremental_vacuum:
+        conn = _connect(args.db)
+        try:
+            enable_incremental_vacuum(conn)
+        finally:
+            conn.close()
+    print(json.dumps(run_maintenance(args.db, args.archive_after_days), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Хранение сообщений чата: производный content ассистента и архив старых сессий.
+
+Ответ ассистента целиком определяется diagnoses_json, поэтому content для него
+не хранится (пустая строка), а собирается при чтении format_diagnoses().
+Сообщения старых сессий фоновое обслуживание (maintenance.py) переносит из
+chat_messages в message_archive одним zlib-блобом на сессию. Здесь собраны
+функции, через которые все читатели (get_messages, экспорт) видят обе таблицы
+одинаково.
+"""
+
+import json
+import zlib
+
+import aiosqlite
+
+from src.fastjson import dumps
+
+ARCHIVE_COMPRESSION_LEVEL = 6
+
+# Порядок полей сообщения в архивном блобе
+_ARCHIVE_FIELDS = ("id", "role", "content", "diagnoses_json", "created_at")
+
+
+def format_diagnoses(diagnoses: list[dict]) -> str:
+    return "\n".join(
+        f"{d['rank']}. {d['diagnosis']} ({d['icd10_code']}) — {d['explanation']}" for d in diagnoses
+    )
+
+
+def stored_content(role: str, content: str, diagnoses: list[dict] | None) -> str:
+    """Что писать в chat_messages.content: пусто, если текст восстановится из diagnoses_json."""
+    if role == "assistant" and diagnoses and content == format_diagnoses(diagnoses):
+        return ""
+    return content
+
+
+def resolve_content(role: str, content: str, diagnoses_json: str | None) -> str:
+    if content or role != "assistant" or not diagnoses_json:
+        return content
+    return format_diagnoses(json.loads(diagnoses_json))
+
+
+def encode_archive(rows: list[dict]) -> bytes:
+    payload = [[row[f] for f in _ARCHIVE_FIELDS] for row in rows]
+    return zlib.compress(dumps(payload), ARCHIVE_COMPRESSION_LEVEL)
+
+
+def decode_archive(blob: bytes) -> list[dict]:
+    """Сообщения из блоба как есть (content ассистента может быть пустым)."""
+    return [dict(zip(_ARCHIVE_FIELDS, values)) for values in json.loads(zlib.decompress(blob))]
+
+
+def _resolved(session_id: str, row) -> dict:
+    return {
+        "id": row["id"],
+        "session_id": session_id,
+        "role": row["role"],
+        "content": resolve_content(row["role"], row["content"], row["diagnoses_json"]),
+        "diagnoses_json": row["diagnoses_json"],
+        "created_at": row["created_at"],
+    }
+
+
+async def load_message_rows(db: aiosqlite.Connection, session_id: str) -> list[dict]:
+    """Все сообщения сессии по времени: сначала из архива, затем живые."""
+    rows = []
+    cursor = await db.execute("SELECT data FROM message_archive WHERE session_id = ?", (session_id,))
+    archived = await cursor.fetchone()
+    if archived:
+        rows.extend(_resolved(session_id, row) for row in decode_archive(archived[0]))
+
+    cursor = await db.execute(
+        "SELECT id, role, content, diagnoses_json, created_at "
+        "FROM chat_messages WHERE session_id = ? ORDER BY created_at",
+        (session_id,),
+    )
+    rows.extend(_resolved(session_id, row) for row in await cursor.fetchall())
+    if archived:
+        # В архивированную сессию могли дописать новые сообщения — они и так позже, но порядок гарантируем
+        rows.sort(key=lambda r: r["created_at"])
+    return rows
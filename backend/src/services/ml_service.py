@@ -1,20 +1,132 @@
 from __future__ import annotations
 
 import asyncio
+import contextvars
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
 from typing import TYPE_CHECKING, List
 
 if TYPE_CHECKING:
     from src.main import DiagnosisItem
+    from src.services.profiling import TorchCapture
 
-from src.logger import logger
+from src.logger import logger, note, stage
+from src.services.admission import AdmissionController, Priority
+from src.services.errors import ServiceNotReadyError
+
+# Компоненты пайплайна, о которых отчитывается /ready
+COMPONENTS = ("embedder", "reranker", "vector_store", "llm")
+
+# Через сколько секунд клиенту стоит повторить запрос, пока модели грузятся
+NOT_READY_RETRY_AFTER = 10
+
+# Версия пайплайна (коллекция, модели, промпт). Входит в ключ склейки запросов
+# и кэшей ответов — поднимать при любом изменении, влияющем на результат.
+PIPELINE_VERSION = "v5"
+
+# Каким путём посчитан последний диагноз в текущем запросе: fast (без ЛЛМ),
+# llm или stub. predict выполняется в задаче запроса, поэтому эндпоинт видит
+# значение после await и отдаёт его в заголовке X-Diagnosis-Path.
+diagnosis_path: ContextVar[str | None] = ContextVar("diagnosis_path", default=None)
+
+# Admission control: сколько диагнозов считаем одновременно и сколько ждут в очереди
+MAX_INFLIGHT = int(os.getenv("DIAGNOSE_MAX_INFLIGHT", "4"))
+MAX_QUEUE = int(os.getenv("DIAGNOSE_MAX_QUEUE", "32"))
+
+# Сколько запрос может простоять в очереди (сек), по классам приоритета
+QUEUE_TIMEOUTS = {
+    Priority.INTERACTIVE: float(os.getenv("DIAGNOSE_QUEUE_TIMEOUT_INTERACTIVE", "15")),
+    Priority.BATCH: float(os.getenv("DIAGNOSE_QUEUE_TIMEOUT_BATCH", "45")),
+}
 
 
 class MedicalDiagnosisService:
     def __init__(self):
+        # Тяжёлая инициализация вынесена в load(), чтобы сервер поднимался мгновенно
+        self.diagnoser = None
+        self._use_rag = False
+        self.ready = False
+        self.components: dict[str, str] = {name: "pending" for name in COMPONENTS}
+        self._load_task: asyncio.Task | None = None
+        self.admission = AdmissionController(MAX_INFLIGHT, MAX_QUEUE)
+        # Свой пул: очередь ограничивает admission, а не безразмерный default executor
+        self._executor = ThreadPoolExecutor(max_workers=MAX_INFLIGHT, thread_name_prefix="diagnose")
+        # Single-flight: одинаковые одновременные запросы ждут одно общее выполнение
+        self._inflight: dict[tuple[str, str, str], asyncio.Task] = {}
+        self.llm_calls_saved = 0
+        self.paths: Counter[str] = Counter()
+        # /debug/profile/torch: следующие K диагнозов под torch.profiler (src/services/profiling.py)
+        self.torch_capture: TorchCapture | None = None
+
+    def start(self) -> None:
+        """Запускает загрузку моделей в фоне (вызывается из lifespan)."""
+        self._load_task = asyncio.create_task(self.load())
+
+    async def stop(self) -> None:
+        """Закрывает соединения async-клиента Qdrant (вызывается из lifespan)."""
+        close = getattr(self.diagnoser, "close_async", None)
+        if close is not None:
+            await close()
+
+    async def wait_ready(self) -> None:
+        """Ждёт окончания загрузки (успешной или с переходом на заглушку)."""
+        if self._load_task is not None:
+            # shield: отмена ждущего не должна отменять саму загрузку
+            await asyncio.shield(self._load_task)
+
+    async def load(self) -> None:
+        try:
+            await asyncio.to_thread(self._init_diagnoser)
+            if self._use_rag and self.diagnoser is not None:
+                # Async-клиент Qdrant создаётся в event loop сервиса, в котором будет работать
+                connect = getattr(self.diagnoser, "connect_async", None)
+                if connect is not None:
+                    connect()
+                await self._warmup()
+                self._mark_loaded()
+        except Exception as e:
+            logger.error(f"Diagnosis service failed to initialize ({e}), using fallback stub")
+            self.diagnoser = None
+            self._use_rag = False
+            for name, state in self.components.items():
+                if state != "ready":
+                    self.components[name] = "unavailable"
+        self.ready = True
+        logger.info("MedicalDiagnosisService is ready.")
+
+    async def _warmup(self) -> None:
+        if not hasattr(self.diagnoser, "warmup"):
+            return
+        logger.info("Warm-up inference...")
+        try:
+            await asyncio.to_thread(self.diagnoser.warmup)
+        except Exception as e:
+            # Qdrant мог ещё не подняться — модели при этом рабочие, запросы пойдут как раньше
+            logger.warning(f"Warm-up failed ({e}), vector store marked unavailable")
+            self.components["vector_store"] = "unavailable"
+
+    def _component_ready(self, name: str) -> None:
+        self.components[name] = "ready"
+
+    def _mark_loaded(self) -> None:
+        # После прогрева всё, что не отметилось само, считается готовым или отсутствующим
+        for name, state in self.components.items():
+            if state == "loading":
+                self.components[name] = "ready"
+            elif state == "pending":
+                self.components[name] = "disabled"
+
+    def _init_diagnoser(self) -> None:
         # Try heavy RAG (torch + local models) first
         try:
+            for name in COMPONENTS:
+                self.components[name] = "loading"
             from src.diagnose import Diagnoser
-            self.diagnoser = Diagnoser()
+            self.diagnoser = Diagnoser(on_ready=self._component_ready)
             self._use_rag = True
             logger.info("RAG Diagnoser initialized (Qdrant + bge-m3 + reranker)")
             return
@@ -23,22 +135,134 @@ class MedicalDiagnosisService:
 
         # Fallback: light RAG (HF Inference API, no torch)
         try:
+            self.components = {name: "pending" for name in COMPONENTS}
+            self.components["llm"] = "loading"
             from src.diagnose_light import DiagnoserLight
-            self.diagnoser = DiagnoserLight()
+            self.diagnoser = DiagnoserLight(on_ready=self._component_ready)
             self._use_rag = True
             logger.info("Light RAG Diagnoser initialized (HF API + Qdrant Cloud)")
             return
         except Exception as e:
             logger.warning(f"Light RAG also unavailable ({e}), using fallback stub")
 
+        self.components = {name: "unavailable" for name in COMPONENTS}
         self.diagnoser = None
         self._use_rag = False
 
-    async def predict(self, symptoms: str) -> List[DiagnosisItem]:
+    def readiness(self) -> dict:
+        # degraded — загрузка закончилась, но пайплайна нет и отвечает заглушка
+        if not self.ready:
+            status = "loading"
+        elif self.diagnoser is None:
+            status = "degraded"
+        else:
+            status = "ready"
+        return {"status": status, "components": dict(self.components)}
+
+    @property
+    def pipeline_version(self) -> str:
+        # pipeline_tag — варианты пайплайна: хэш настроек Diagnoser, DiagnoserLight с индексом и без
+        tag = getattr(self.diagnoser, "pipeline_tag", None) or type(self.diagnoser).__name__
+        return f"{PIPELINE_VERSION}:{tag}"
+
+    def metrics(self) -> dict:
+        metrics = {
+            "admission": self.admission.metrics(),
+            "coalescing": {
+                "inflight_keys": len(self._inflight),
+                "llm_calls_saved": self.llm_calls_saved,
+            },
+            "paths": dict(self.paths),
+        }
+        session_cache = getattr(self.diagnoser, "session_cache", None)
+        if session_cache is not None:
+            metrics["session_retrieval"] = session_cache.metrics()
+        speculative = getattr(self.diagnoser, "speculative", None)
+        if speculative is not None:
+            metrics["speculative_llm"] = speculative.metrics()
+        cascade = getattr(self.diagnoser, "cascade", None)
+        if cascade is not None:
+            metrics["rerank_cascade"] = cascade.metrics()
+        rerank_tokens = getattr(self.diagnoser, "rerank_tokens", None)
+        if rerank_tokens is not None:
+            metrics["rerank_tokens"] = rerank_tokens.metrics()
+        return metrics
+
+    def _session_scope(self, session_id: str | None) -> str:
+        # С кэшем сессий диагноз сохраняет пул кандидатов в сессию вызвавшего, а
+        # уточнение с пулом считается иначе, чем тот же текст без контекста. Поэтому
+        # запросы с session_id склеиваются только в пределах своей сессии, даже
+        # первый запрос сессии: иначе пул получила бы только сессия первого ждущего
+        session_cache = getattr(self.diagnoser, "session_cache", None)
+        if session_id and session_cache is not None:
+            return session_id
+        return ""
+
+    async def _diagnose_shared(self, symptoms: str, priority: Priority, session_id: str | None = None) -> dict:
+        key = (self.pipeline_version, self._session_scope(session_id), " ".join(symptoms.lower().split()))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run_diagnose(symptoms, priority, session_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.llm_calls_saved += 1
+            note(coalesced=True)
+        # shield: отмена одного ждущего (клиент отвалился) не отменяет общую работу
+        return await asyncio.shield(task)
+
+    def _forget(self, key: tuple[str, str, str], task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Если все ждущие ушли, ошибку никто не заберёт — забираем сами, без warning в логах
+            task.exception()
+
+    async def _run_diagnose(self, symptoms: str, priority: Priority, session_id: str | None) -> dict:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + QUEUE_TIMEOUTS[priority]
+        with stage("queue"):
+            await self.admission.acquire(priority, deadline)
+        started = time.perf_counter()
+        run = partial(self._in_executor, loop)
+        capture = self.torch_capture
+        if capture is not None and not capture.claim():
+            capture = None
+        if capture is not None:
+            run = capture.profiled(run)
+        try:
+            adiagnose = getattr(self.diagnoser, "adiagnose", None)
+            if adiagnose is not None:
+                # Поиск в Qdrant ждём в event loop, блокирующие шаги — в пуле сервиса
+                return await adiagnose(symptoms, session_id, run)
+            return await run(partial(self.diagnoser.diagnose, symptoms, session_id=session_id))
+        finally:
+            elapsed = time.perf_counter() - started
+            self.admission.release(elapsed)
+            if capture is not None:
+                capture.finish(elapsed)
+
+    def _in_executor(self, loop: asyncio.AbstractEventLoop, fn, *args) -> asyncio.Future:
+        # run_in_executor, в отличие от to_thread, не переносит contextvars, а в
+        # пуле нужны id запроса для логов и его RequestTrace для таймингов стадий
+        return loop.run_in_executor(self._executor, contextvars.copy_context().run, fn, *args)
+
+    def _record_path(self, path: str) -> None:
+        self.paths[path] += 1
+        diagnosis_path.set(path)
+        note(diagnosis_path=path)
+
+    async def predict(
+        self, symptoms: str, priority: Priority = Priority.INTERACTIVE, session_id: str | None = None
+    ) -> List[DiagnosisItem]:
         from src.main import DiagnosisItem
 
+        if not self.ready:
+            raise ServiceNotReadyError("Diagnosis models are still loading", NOT_READY_RETRY_AFTER)
+
         if self._use_rag and self.diagnoser is not None:
-            result = await asyncio.to_thread(self.diagnoser.diagnose, symptoms)
+            result = await self._diagnose_shared(symptoms, priority, session_id)
+            self._record_path(result.get("path", "llm"))
             return [
                 DiagnosisItem(
                     rank=d.get("rank", i + 1),
@@ -49,6 +273,7 @@ class MedicalDiagnosisService:
                 for i, d in enumerate(result.get("diagnoses", []))
             ]
 
+        self._record_path("stub")
         return [
             DiagnosisItem(rank=1, diagnosis="Острый бронхит", icd10_code="J20.9",
                           explanation="Симптомы соответствуют острому бронхиту."),
@@ -0,0 +1,103 @@
+"""
+Хэширование паролей вне event loop.
+
+bcrypt тратит 100–300 мс CPU на вызов; синхронно в async-эндпоинте это
+останавливает все остальные запросы воркера. Здесь хэши считаются в отдельном
+ограниченном пуле потоков (bcrypt отпускает GIL), а число одновременных и
+ожидающих вычислений ограничено тем же AdmissionController, что и у диагностики:
+при всплеске логинов лишние запросы получают 429 с Retry-After, а не очередь
+на весь CPU.
+
+Стоимость задаётся BCRYPT_ROUNDS. Если она поменялась, хэш пользователя
+пересчитывается при следующем успешном входе (verify возвращает новый хэш).
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from src.services.admission import AdmissionController, Priority
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+
+# bcrypt учитывает только первые 72 байта; passlib обрезал молча, bcrypt>=5 падает —
+# обрезаем сами, чтобы старые хэши продолжали совпадать
+MAX_PASSWORD_BYTES = 72
+
+
+def _encode(password: str) -> bytes:
+    return password.encode("utf-8")[:MAX_PASSWORD_BYTES]
+
+
+def _rounds_of(hashed: str) -> int | None:
+    # $2b$12$<salt+hash>
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds)).decode("ascii")
+
+
+def _verify(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(_encode(password), hashed.encode("ascii"))
+    except ValueError:
+        # Не bcrypt-хэш или повреждённая строка
+        return False
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        rounds: int = BCRYPT_ROUNDS,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+        timeout: float = PASSWORD_HASH_TIMEOUT,
+    ):
+        self.rounds = rounds
+        self.timeout = timeout
+        self.rehashed = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+        self._admission = AdmissionController(max_inflight=workers, max_queue=max_queue, name="Password hashing")
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        await self._admission.acquire(Priority.INTERACTIVE, loop.time() + self.timeout)
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._admission.release(time.perf_counter() - start)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return _rounds_of(hashed) != self.rounds
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """(пароль верный, новый хэш или None). Новый хэш — если BCRYPT_ROUNDS изменился."""
+        if not await self._run(_verify, password, hashed):
+            return False, None
+        if not self.needs_rehash(hashed):
+            return True, None
+        self.rehashed += 1
+        return True, await self.hash(password)
+
+    def metrics(self) -> dict:
+        return {"rounds": self.rounds, "rehashed": self.rehashed, **self._admission.metrics()}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
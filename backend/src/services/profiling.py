@@ -0,0 +1,191 @@
+"""
+Профилирование живого воркера по запросу (/debug/profile, src/api/endpoints/debug.py).
+
+По умолчанию выключено. Без DEBUG_PROFILE_TOKEN маршруты не подключаются, а в
+пути диагноза остаётся одна проверка ml_service.torch_capture is None. Замер
+идёт только во время запроса к эндпоинту:
+
+- CPU. Поток-сэмплер раз в interval снимает sys._current_frames() всех
+  потоков: пула diagnose, event loop, фоновых задач. Одинаковые стеки
+  считаются. Ответ — collapsed stacks («поток;функция (файл:строка);... N»),
+  их открывают flamegraph.pl, speedscope и inferno. Потоки, которые просто
+  ждут (wait, select, пустая очередь пула), по умолчанию отброшены. torch
+  отпускает GIL внутри операторов, поэтому на стеке видно, откуда из Python
+  вызвана модель.
+- torch. torch.profiler на следующих K диагнозах. Диагноз идёт в потоках пула,
+  а с QDRANT_ASYNC=1 — в нескольких вызовах. Каждый вызов профилируется в
+  своём потоке. Итог — суммы по операторам и chrome-трейсы в DEBUG_PROFILE_DIR.
+- Память. tracemalloc на N секунд, разница снимков по строкам кода.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable
+
+PROFILE_DIR = Path(os.getenv("DEBUG_PROFILE_DIR", str(Path(tempfile.gettempdir()) / "freaxlab-profiles")))
+
+# Верхний кадр потока, который ждёт работы, а не работает
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+# ─── CPU: сэмплирование стеков ───────────────────────────────────────────────
+
+def _is_idle(frame) -> bool:
+    return (Path(frame.f_code.co_filename).name, frame.f_code.co_name) in _IDLE_FRAMES
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = Path(code.co_filename)
+    return f"{code.co_name} ({path.parent.name}/{path.name}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False) -> Counter[str]:
+    """Collapsed-стеки всех потоков, кроме самого сэмплера: {стек: число сэмплов}."""
+    me = threading.get_ident()
+    stacks: Counter[str] = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (not include_idle and _is_idle(frame)):
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(labels))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapsed(stacks: Counter[str]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+# ─── Память: разница снимков tracemalloc ─────────────────────────────────────
+
+def trace_allocations(seconds: float, top: int, frames: int = 1) -> dict:
+    """Что выделено и не освобождено за seconds секунд: топ мест по приросту."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        # Если tracemalloc включили до нас (PYTHONTRACEMALLOC) — не выключаем
+        if started:
+            tracemalloc.stop()
+
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    diff = after.filter_traces(filters).compare_to(
+        before.filter_traces(filters), "traceback" if frames > 1 else "lineno"
+    )
+    return {
+        "seconds": seconds,
+        "size_diff_kb": round(sum(s.size_diff for s in diff) / 1024, 1),
+        "top": [
+            {
+                "traceback": [f"{f.filename}:{f.lineno}" for f in s.traceback],
+                "size_diff_kb": round(s.size_diff / 1024, 1),
+                "count_diff": s.count_diff,
+                "size_kb": round(s.size / 1024, 1),
+            }
+            for s in diff[:top]
+        ],
+    }
+
+
+# ─── torch.profiler на следующих K диагнозах ─────────────────────────────────
+
+class TorchCapture:
+    def __init__(self, diagnoses: int, out_dir: Path = PROFILE_DIR):
+        self.total = diagnoses
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        self._claimed = 0
+        self.done = 0
+        self.wall_ms: list[float] = []
+        self.traces: list[str] = []
+        # оператор → [вызовов, self CPU мкс, CPU мкс]
+        self.ops: dict[str, list[float]] = {}
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def complete(self) -> bool:
+        return self.done >= self.total
+
+    def claim(self) -> bool:
+        """Берёт диагноз в замер, пока не набрано K."""
+        with self._lock:
+            if self._claimed >= self.total:
+                return False
+            self._claimed += 1
+            return True
+
+    def profiled(self, run: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        """Обёртка над run(fn, *args) пула: каждый вызов fn — под torch.profiler в своём потоке."""
+        def run_profiled(fn, *args):
+            return run(self._wrap(fn), *args)
+        return run_profiled
+
+    def _wrap(self, fn: Callable) -> Callable:
+        def call(*args):
+            from torch.profiler import ProfilerActivity, profile
+
+            with profile(activities=[ProfilerActivity.CPU]) as prof:
+                result = fn(*args)
+            # fn — метод Diagnoser или partial от него
+            self._collect(prof, getattr(fn, "func", fn).__name__)
+            return result
+        return call
+
+    def _collect(self, prof, label: str) -> None:
+        with self._lock:
+            index = len(self.traces)
+            path = self.out_dir / f"torch-{os.getpid()}-{index}-{label.strip('_')}.json"
+            self.traces.append(str(path))
+        prof.export_chrome_trace(str(path))
+        events = prof.key_averages()
+        with self._lock:
+            for event in events:
+                op = self.ops.setdefault(event.key, [0, 0.0, 0.0])
+                op[0] += event.count
+                op[1] += event.self_cpu_time_total
+                op[2] += event.cpu_time_total
+
+    def finish(self, seconds: float) -> None:
+        with self._lock:
+            self.done += 1
+            self.wall_ms.append(round(seconds * 1000, 1))
+
+    def report(self, top: int) -> dict:
+        with self._lock:
+            ops = sorted(self.ops.items(), key=lambda item: item[1][1], reverse=True)[:top]
+            return {
+                "pid": os.getpid(),
+                "diagnoses": self.total,
+                "done": self.done,
+                "complete": self.complete,
+                "wall_ms": list(self.wall_ms),
+                "ops": [
+                    {"op": key, "calls": int(calls), "self_cpu_ms": round(self_us / 1000, 2),
+                     "cpu_ms": round(total_us / 1000, 2)}
+                    for key, (calls, self_us, total_us) in ops
+                ],
+                "chrome_traces": list(self.traces),
+            }
@@ -0,0 +1,112 @@
+"""
+Полнотекстовый поиск по истории пользователя (chat_fts, см. database.py).
+
+FTS5 находит сообщения пользователя, где встречаются все слова запроса, и сам
+ранжирует их bm25() с весами колонок _COLUMNS. Условие owner стоит внутри
+MATCH, поэтому FTS5 пересекает короткий список документов пользователя со
+списками слов переходами по индексу. Страница берётся через LIMIT/OFFSET, то
+есть ранжируются все совпадения, а не только самые новые. IDF в bm25()
+считается по всей базе: один проход по списку документов каждого слова.
+
+Слова от MIN_PREFIX_CHARS символов ищутся как префиксы: «боль» находит
+«болью» и «больной», «кашел» — «кашель».
+"""
+
+import re
+
+import aiosqlite
+
+from src.schemas.history import SearchHit, SearchResponse
+
+MAX_SEARCH_TERMS = 8
+MIN_PREFIX_CHARS = 3
+SNIPPET_WORDS = 16
+
+# Колонки chat_fts, по которым ищем, и их веса в ранжировании (owner — 0)
+_COLUMNS = {"content": 1.0, "title": 2.0, "diagnoses": 2.0}
+_BM25 = f"bm25(chat_fts, {', '.join(map(str, _COLUMNS.values()))}, 0.0)"
+
+_QUERY_WORD = re.compile(r'[^\s"]+')
+_TOKEN = re.compile(r"\w+")
+
+
+def _normalize(text: str) -> str:
+    # Так же, как при индексации (database._fts_text) + регистр
+    return text.replace("ё", "е").replace("Ё", "Е").casefold()
+
+
+def _parse_query(query: str) -> list[str]:
+    words = [w for w in _QUERY_WORD.findall(_normalize(query)) if _TOKEN.search(w)]
+    return words[:MAX_SEARCH_TERMS]
+
+
+def _match_expression(user_id: str, words: list[str]) -> str:
+    # Каждое слово в кавычках — синтаксис FTS5 (AND, *, :, скобки) из запроса не интерпретируется;
+    # «J06.9» внутри кавычек становится фразой «j06 9», префиксом — только её последнее слово
+    phrases = " ".join(f'"{w}"*' if len(w) >= MIN_PREFIX_CHARS else f'"{w}"' for w in words)
+    return f'owner : "{user_id}" AND {{{" ".join(_COLUMNS)}}} : ({phrases})'
+
+
+def _snippet(row: aiosqlite.Row, terms: tuple[str, ...]) -> str:
+    for col in ("content", "diagnoses", "title"):
+        words = (row[col] or "").split()
+        for i, word in enumerate(words):
+            if any(token.startswith(terms) for token in _TOKEN.findall(_normalize(word))):
+                start = max(0, i - SNIPPET_WORDS // 3)
+                end = start + SNIPPET_WORDS
+                text = " ".join(words[start:end])
+                return ("…" if start else "") + text + ("…" if end < len(words) else "")
+    return " ".join((row["content"] or "").split()[:SNIPPET_WORDS])
+
+
+async def search_messages(
+    db: aiosqlite.Connection, user_id: str, query: str, page: int = 1, per_page: int = 20
+) -> SearchResponse:
+    words = _parse_query(query)
+    if not words:
+        return SearchResponse(items=[], page=page, per_page=per_page, has_more=False)
+
+    offset = (page - 1) * per_page
+    # Лишняя строка — признак следующей страницы
+    cursor = await db.execute(
+        "SELECT rowid, content, title, diagnoses FROM chat_fts "
+        f"WHERE chat_fts MATCH ? ORDER BY {_BM25}, rowid DESC LIMIT ? OFFSET ?",
+        (_match_expression(user_id, words), per_page + 1, offset),
+    )
+    found = await cursor.fetchall()
+    has_more = len(found) > per_page
+    found = found[:per_page]
+    if not found:
+        return SearchResponse(items=[], page=page, per_page=per_page, has_more=False)
+
+    # Слова запроса токенизируем так же, как тексты: «J06.9» → j06, 9
+    terms = tuple(dict.fromkeys(t for w in words for t in _TOKEN.findall(w)))
+    page_rowids = [row["rowid"] for row in found]
+    placeholders = ", ".join("?" * len(page_rowids))
+    # Отрицательные rowid — архивированные сообщения (archived_messages)
+    cursor = await db.execute(
+        "SELECT m.rowid, m.id, m.session_id, s.title, m.role, m.created_at "
+        "FROM chat_messages m JOIN diagnosis_sessions s ON s.id = m.session_id "
+        f"WHERE m.rowid IN ({placeholders}) "
+        "UNION ALL "
+        "SELECT a.fts_rowid, a.id, a.session_id, s.title, a.role, a.created_at "
+        "FROM archived_messages a JOIN diagnosis_sessions s ON s.id = a.session_id "
+        f"WHERE a.fts_rowid IN ({placeholders})",
+        page_rowids * 2,
+    )
+    meta = {row["rowid"]: row for row in await cursor.fetchall()}
+    by_rowid = {row["rowid"]: row for row in found}
+
+    items = [
+        SearchHit(
+            message_id=meta[rowid]["id"],
+            session_id=meta[rowid]["session_id"],
+            session_title=meta[rowid]["title"],
+            role=meta[rowid]["role"],
+            snippet=_snippet(by_rowid[rowid], terms),
+            created_at=meta[rowid]["created_at"],
+        )
+        for rowid in page_rowids
+        if rowid in meta
+    ]
+    return SearchResponse(items=items, page=page, per_page=per_page, has_more=has_more)
@@ -0,0 +1,133 @@
+"""
+Спекулятивный вызов ЛЛМ параллельно с реранкингом.
+
+Реранкинг 30 кандидатов на CPU занимает сотни миллисекунд, а плотный поиск
+Qdrant часто уже ставит в топ-K те же чанки, что и реранкер. Поэтому сразу
+после поиска ЛЛМ отправляется запрос по плотному топ-K, а реранкер в это
+время считает свой порядок. Если реранжированный топ-K совпадает с
+отправленным хотя бы на SPECULATIVE_MIN_OVERLAP (доля общих чанков), берётся
+ответ уже летящего запроса. Иначе спекуляция отменяется и ЛЛМ получает
+правильный топ-K.
+
+Синхронный HTTP-вызов уже начатого запроса прервать нельзя: отменяется только
+ещё не начатый, начатый дорабатывает в пуле, а его ответ выбрасывается и
+считается потраченным впустую. Поэтому режим выключен по умолчанию
+(SPECULATIVE_LLM=1 — включить), а пул ограничен SPECULATIVE_LLM_WORKERS.
+Правильный запрос после промаха идёт из потока diagnose(), а не через пул,
+чтобы не ждать за выброшенными.
+
+Долю попаданий, лишние вызовы и выигрыш по задержке на data/test_set меряет
+benchmarks/bench_speculative_llm.py.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "0") == "1"
+SPECULATIVE_MIN_OVERLAP = float(os.getenv("SPECULATIVE_MIN_OVERLAP", "0.8"))
+SPECULATIVE_LLM_WORKERS = int(os.getenv("SPECULATIVE_LLM_WORKERS", "4"))
+
+
+def chunk_key(payload: dict) -> tuple:
+    return payload.get("protocol_id"), payload.get("chunk_type"), payload.get("chunk_index")
+
+
+def topk_overlap(sent: list[dict], ranked: list[dict]) -> float:
+    """Доля чанков реранжированного топ-K, которые были в отправленном."""
+    if not ranked:
+        return 0.0
+    keys = {chunk_key(p) for p in sent}
+    return sum(chunk_key(p) in keys for p in ranked) / len(ranked)
+
+
+@dataclass
+class Speculation:
+    chunks: list[dict]
+    future: Future
+    started: float
+
+
+class SpeculativeLLM:
+    def __init__(
+        self,
+        enabled: bool = SPECULATIVE_LLM,
+        min_overlap: float = SPECULATIVE_MIN_OVERLAP,
+        workers: int = SPECULATIVE_LLM_WORKERS,
+    ):
+        self.enabled = enabled
+        self.min_overlap = min_overlap
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculative-llm")
+        self._lock = threading.Lock()
+        self._stats = {
+            "started": 0, "hits": 0, "misses": 0, "failed": 0,
+            "discarded": 0, "cancelled": 0, "wasted": 0, "head_start_seconds": 0.0,
+        }
+
+    def start(self, call: Callable[[list[dict]], dict], chunks: list[dict]) -> Speculation | None:
+        """Отправляет ЛЛМ плотный топ-K; None, если режим выключен."""
+        if not self.enabled or not chunks:
+            return None
+        with self._lock:
+            self._stats["started"] += 1
+        return Speculation(list(chunks), self._pool.submit(call, chunks), time.perf_counter())
+
+    def resolve(self, speculation: Speculation | None, chunks: list[dict]) -> dict | None:
+        """Ответ спекуляции, если её топ-K достаточно совпал с реранжированным, иначе None.
+
+        Ошибка спекулятивного вызова — тоже None: diagnose() повторит вызов сам.
+        """
+        if speculation is None:
+            return None
+        if topk_overlap(speculation.chunks, chunks) < self.min_overlap:
+            self._drop(speculation, "misses")
+            return None
+        # Сколько ЛЛМ уже работала к моменту, когда реранкер закончил
+        head_start = time.perf_counter() - speculation.started
+        try:
+            result = speculation.future.result()
+        except Exception:
+            self._count("failed")
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["head_start_seconds"] += head_start
+        return result
+
+    def discard(self, speculation: Speculation | None) -> None:
+        """Ответ не понадобился (например, сработал быстрый путь)."""
+        if speculation is not None:
+            self._drop(speculation, "discarded")
+
+    def _drop(self, speculation: Speculation, reason: str) -> None:
+        cancelled = speculation.future.cancel()
+        with self._lock:
+            self._stats[reason] += 1
+            self._stats["cancelled" if cancelled else "wasted"] += 1
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+        resolved = s["hits"] + s["misses"]
+        return {
+            "enabled": self.enabled,
+            "min_overlap": self.min_overlap,
+            "started": s["started"],
+            "hits": s["hits"],
+            "misses": s["misses"],
+            "failed": s["failed"],
+            "discarded": s["discarded"],
+            "cancelled": s["cancelled"],
+            # Вызовы ЛЛМ, ответ которых выброшен
+            "wasted_llm_calls": s["wasted"],
+            "hit_rate": round(s["hits"] / resolved, 3) if resolved else None,
+            # Насколько раньше стартовала ЛЛМ при попадании (верхняя оценка выигрыша)
+            "head_start_ms": round(1000 * s["head_start_seconds"] / s["hits"], 1) if s["hits"] else None,
+        }
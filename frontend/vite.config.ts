@@ -1,12 +1,48 @@
+import fs from "node:fs";
 import path from "path";
-import { defineConfig } from "vite";
+import zlib from "node:zlib";
+import { defineConfig, type Plugin } from "vite";
 import react from "@vitejs/plugin-react";
 import tailwindcss from "@tailwindcss/vite";
 
 const isVercelBuild = process.env.VERCEL === "1";
 
+// Бэкенд отдаёт готовые .br/.gz рядом с файлами сборки (backend/src/api/static_site.py),
+// чтобы не сжимать статику в воркере. Vercel сжимает сам.
+const COMPRESSIBLE = /\.(js|mjs|css|html|svg|json|txt|map|wasm)$/;
+const COMPRESS_MIN_BYTES = 1024;
+
+function precompress(): Plugin {
+  let outDir = "";
+  return {
+    name: "precompress",
+    apply: "build",
+    configResolved(config) {
+      outDir = path.resolve(config.root, config.build.outDir);
+    },
+    closeBundle() {
+      for (const name of fs.readdirSync(outDir, { recursive: true, encoding: "utf8" })) {
+        const file = path.join(outDir, name);
+        if (!COMPRESSIBLE.test(name) || !fs.statSync(file).isFile()) continue;
+        const data = fs.readFileSync(file);
+        if (data.length < COMPRESS_MIN_BYTES) continue;
+        fs.writeFileSync(
+          `${file}.br`,
+          zlib.brotliCompressSync(data, {
+            params: {
+              [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY,
+              [zlib.constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+            },
+          }),
+        );
+        fs.writeFileSync(`${file}.gz`, zlib.gzipSync(data, { level: zlib.constants.Z_BEST_COMPRESSION }));
+      }
+    },
+  };
+}
+
 export default defineConfig({
-  plugins: [react(), tailwindcss()],
+  plugins: [react(), tailwindcss(), ...(isVercelBuild ? [] : [precompress()])],
   resolve: {
     alias: {
       "@": path.resolve(__dirname, "./src"),